@@ -3,9 +3,12 @@
 メインアプリケーションエントリーポイント
 """
 
+import pandas as pd
 import streamlit as st
 
 from db.database import init_db
+from services.screen_cache import get_screen_cache
+from services.screener import ScreeningEngine, field_choices, field_names, parse_conditions
 
 # ─── ページ設定 ───
 st.set_page_config(
@@ -47,7 +50,54 @@ if page == "🏠 ダッシュボード":
 
 elif page == "🔍 スクリーナー":
     st.title("🔍 スクリーナー")
-    st.info("開発中: テクニカル・ファンダメンタル条件でのスクリーニング機能を実装予定。")
+
+    markets = field_choices("market")
+    sectors = field_choices("sector33")
+    col1, col2 = st.columns(2)
+    with col1:
+        selected_markets = st.multiselect(
+            "市場区分", markets["code"], format_func=dict(zip(markets["code"], markets["name"])).get
+        )
+    with col2:
+        selected_sectors = st.multiselect(
+            "33業種", sectors["code"], format_func=dict(zip(sectors["code"], sectors["name"])).get
+        )
+    expression = st.text_area(
+        "条件（and でつなぐ）",
+        placeholder="per < 15 and pbr between (0.5, 1.5) and roe >= 0.08 and return_20 > 0",
+    )
+    with st.expander("使える項目"):
+        st.dataframe(
+            pd.DataFrame(list(field_names().items()), columns=["項目", "説明"]),
+            hide_index=True,
+            use_container_width=True,
+        )
+
+    if st.button("スクリーニング実行", type="primary"):
+        conditions = []
+        if selected_markets:
+            conditions.append(("market", "in", selected_markets))
+        if selected_sectors:
+            conditions.append(("sector33", "in", selected_sectors))
+        try:
+            if expression.strip():
+                conditions.extend(parse_conditions(expression))
+            result = ScreeningEngine().run(conditions)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            st.metric("該当銘柄数", len(result.frame))
+            st.dataframe(result.frame, hide_index=True, use_container_width=True)
+            with st.expander("条件ごとの件数・時間"):
+                st.caption(f"SQL: {result.sql_seconds:.3f}秒 / 合計: {result.seconds:.3f}秒")
+                st.dataframe(result.stats_frame, hide_index=True, use_container_width=True)
+            cache = get_screen_cache()
+            if cache is not None:
+                stats = cache.stats()
+                st.caption(
+                    f"{'キャッシュから表示' if result.cached else '計算して表示'}"
+                    f"（キャッシュのヒット率: {stats['hit_rate']:.0%} / {stats['hits']}件）"
+                )
 
 elif page == "📈 銘柄詳細":
     st.title("📈 銘柄詳細")
@@ -0,0 +1,171 @@
+"""株価テーブルの物理レイアウトのベンチマーク
+
+旧レイアウト（id主キー＋code/date/一意の3インデックス）と
+(code, date) 主キーのWITHOUT ROWIDテーブル＋(date, code) インデックスに
+同じ合成データを保存し、挿入速度・DBサイズ・読み取りレイテンシを比較する。
+
+    python -m benchmarks.bench_daily_prices_layout --codes 4000 --days 245
+
+読み取りは銘柄ごとの全期間（時系列）と、日付ごとの全銘柄（横断）の2種類を計測する。
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_tmpdir = tempfile.mkdtemp(prefix="bench_layout_")
+os.environ["SCREENER_DB_URL"] = f"sqlite:///{_tmpdir}/unused.db"
+os.environ["JQUANTS_CACHE_ENABLED"] = "0"
+
+from sqlalchemy import (  # noqa: E402
+    BigInteger,
+    Column,
+    Date,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    UniqueConstraint,
+    text,
+)
+from sqlalchemy.dialects.sqlite import insert  # noqa: E402
+
+from benchmarks.synthetic import business_days, daily_prices_frame, universe  # noqa: E402
+from db.database import create_tuned_engine  # noqa: E402
+from models.schemas import DailyPrice  # noqa: E402
+from services.datasets import PRICE_COLUMNS, frame_to_records  # noqa: E402
+
+UPSERT_CHUNK_SIZE = 1000
+
+# 旧レイアウト
+legacy_table = Table(
+    "daily_prices",
+    MetaData(),
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("code", String(10), index=True),
+    Column("date", Date, index=True),
+    *[
+        Column(name, BigInteger if name == "volume" else Float)
+        for name in PRICE_COLUMNS.values()
+        if name not in ("code", "date")
+    ],
+    UniqueConstraint("code", "date", name="uix_code_date"),
+)
+
+
+def _percentiles(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+    }
+
+
+def run(name: str, table: Table, codes: list, days: list, n_reads: int) -> dict:
+    path = Path(_tmpdir) / f"{name}.db"
+    engine = create_tuned_engine(f"sqlite:///{path}")
+    table.create(engine)
+
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["code", "date"],
+        set_={
+            "close": stmt.excluded.close,
+            "volume": stmt.excluded.volume,
+            "adjustment_close": stmt.excluded.adjustment_close,
+            "adjustment_factor": stmt.excluded.adjustment_factor,
+        },
+    )
+
+    # 日付ごとに1トランザクション（日次同期と同じ書き込みパターン）
+    rows = 0
+    elapsed = 0.0
+    for d in days:
+        records = frame_to_records(daily_prices_frame(codes, d), PRICE_COLUMNS)
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            for i in range(0, len(records), UPSERT_CHUNK_SIZE):
+                conn.execute(stmt, records[i:i + UPSERT_CHUNK_SIZE])
+        elapsed += time.perf_counter() - start
+        rows += len(records)
+
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    size = path.stat().st_size
+
+    # 読み取りはキャッシュの影響を抑えるため接続を作り直してから計測
+    engine.dispose()
+    rng = random.Random(0)
+    series, cross = [], []
+    with engine.connect() as conn:
+        for code in rng.sample(codes, min(n_reads, len(codes))):
+            start = time.perf_counter()
+            conn.execute(
+                text("SELECT date, adjustment_close, volume FROM daily_prices WHERE code = :code ORDER BY date"),
+                {"code": code},
+            ).all()
+            series.append(time.perf_counter() - start)
+        for d in rng.sample(days, min(n_reads, len(days))):
+            start = time.perf_counter()
+            conn.execute(
+                text("SELECT code, adjustment_close, volume FROM daily_prices WHERE date = :date"),
+                {"date": d},
+            ).all()
+            cross.append(time.perf_counter() - start)
+    engine.dispose()
+
+    return {
+        "rows": rows,
+        "insert_seconds": round(elapsed, 3),
+        "insert_rows_per_sec": round(rows / elapsed, 1),
+        "db_bytes": size,
+        "bytes_per_row": round(size / rows, 1),
+        "read_per_code": _percentiles(series),
+        "read_per_date": _percentiles(cross),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--codes", type=int, default=4000)
+    parser.add_argument("--days", type=int, default=245)
+    parser.add_argument("--reads", type=int, default=200, help="読み取りを計測する銘柄数・日数")
+    parser.add_argument("--output", type=Path, help="結果JSONの保存先")
+    args = parser.parse_args()
+
+    codes = universe(args.codes)
+    days = business_days(date(2023, 1, 4), args.days)
+
+    legacy = run("legacy", legacy_table, codes, days, args.reads)
+    clustered = run("clustered", DailyPrice.__table__, codes, days, args.reads)
+
+    result = {
+        "benchmark": "daily_prices_layout",
+        "codes": args.codes,
+        "days": args.days,
+        "legacy": legacy,
+        "clustered": clustered,
+        "insert_speedup": round(clustered["insert_rows_per_sec"] / legacy["insert_rows_per_sec"], 2),
+        "size_ratio": round(clustered["db_bytes"] / legacy["db_bytes"], 2),
+        "read_per_code_speedup": round(
+            legacy["read_per_code"]["p50_ms"] / clustered["read_per_code"]["p50_ms"], 2
+        ),
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.output:
+        args.output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
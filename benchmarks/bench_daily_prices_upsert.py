@@ -0,0 +1,118 @@
+"""株価保存（_save_daily_prices）のベンチマーク
+
+合成した全銘柄×1年分の株価を、旧実装（iterrowsで1行ずつINSERT）と
+現行のバッチUPSERTで保存し、rows/sec を比較する。
+
+    python -m benchmarks.bench_daily_prices_upsert --days 245 --legacy-days 5
+
+旧実装は遅いため、--legacy-days の日数分だけで速度を計測する。
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_tmpdir = tempfile.mkdtemp(prefix="bench_upsert_")
+os.environ["SCREENER_DB_URL"] = f"sqlite:///{_tmpdir}/bench.db"
+os.environ["JQUANTS_CACHE_ENABLED"] = "0"
+os.environ["SCREENER_CUBE_DIR"] = f"{_tmpdir}/cube"
+os.environ["SCREENER_FUNDAMENTALS_DIR"] = f"{_tmpdir}/fundamentals"
+
+import pandas as pd  # noqa: E402
+from sqlalchemy.dialects.sqlite import insert  # noqa: E402
+
+from benchmarks.synthetic import business_days, daily_prices_frame, universe  # noqa: E402
+from db.database import engine, get_session, init_db  # noqa: E402
+from models.schemas import Base, DailyPrice  # noqa: E402
+from services.sync import SyncService  # noqa: E402
+
+
+def legacy_save_daily_prices(df: pd.DataFrame):
+    """旧実装（1行ずつINSERT ... ON CONFLICT）"""
+    session = get_session()
+    try:
+        for _, row in df.iterrows():
+            row = row.where(pd.notnull(row), None)
+            date_val = row["Date"]
+            if hasattr(date_val, "date"):
+                date_val = date_val.date()
+            stmt = insert(DailyPrice).values(
+                code=row["Code"],
+                date=date_val,
+                open=row["O"],
+                high=row["H"],
+                low=row["L"],
+                close=row["C"],
+                volume=row["Vo"],
+                turnover_value=row["Va"],
+                adjustment_factor=row["AdjFactor"],
+                adjustment_open=row["AdjO"],
+                adjustment_high=row["AdjH"],
+                adjustment_low=row["AdjL"],
+                adjustment_close=row["AdjC"],
+                adjustment_volume=row["AdjVo"],
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["code", "date"],
+                set_={
+                    "close": stmt.excluded.close,
+                    "volume": stmt.excluded.volume,
+                    "adjustment_close": stmt.excluded.adjustment_close,
+                    "adjustment_factor": stmt.excluded.adjustment_factor,
+                },
+            )
+            session.execute(stmt)
+        session.commit()
+    finally:
+        session.close()
+
+
+def run(save, frames) -> dict:
+    Base.metadata.drop_all(engine)
+    init_db()
+    rows = 0
+    start = time.perf_counter()
+    for df in frames:
+        save(df)
+        rows += len(df)
+    elapsed = time.perf_counter() - start
+    return {"rows": rows, "seconds": round(elapsed, 3), "rows_per_sec": round(rows / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--codes", type=int, default=4000)
+    parser.add_argument("--days", type=int, default=245, help="バッチUPSERTで保存する営業日数")
+    parser.add_argument("--legacy-days", type=int, default=5, help="旧実装で保存する営業日数")
+    parser.add_argument("--output", type=Path, help="結果JSONの保存先")
+    args = parser.parse_args()
+
+    codes = universe(args.codes)
+    days = business_days(date(2023, 1, 4), args.days)
+    sync = SyncService()
+
+    legacy = run(legacy_save_daily_prices, (daily_prices_frame(codes, d) for d in days[: args.legacy_days]))
+    batched = run(sync._save_daily_prices, (daily_prices_frame(codes, d) for d in days))
+
+    result = {
+        "benchmark": "daily_prices_upsert",
+        "codes": args.codes,
+        "days": args.days,
+        "legacy": legacy,
+        "batched": batched,
+        "speedup": round(batched["rows_per_sec"] / legacy["rows_per_sec"], 1),
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.output:
+        args.output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""テクニカル指標のベンチマーク
+
+合成した全銘柄×営業日の株価で、services.technical の全銘柄一括の行列計算と、
+銘柄ごとに ta の指標を計算する方法の所要時間を比較する。
+同じ指標の値の差（両方が有効な値の最大絶対誤差）もあわせて出力し、
+PARITY_TOLERANCE を超える指標があれば終了コード1で終わる。
+
+    python -m benchmarks.bench_technical --codes 4000 --days 245
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_tmpdir = tempfile.mkdtemp(prefix="bench_technical_")
+os.environ["SCREENER_DB_URL"] = f"sqlite:///{_tmpdir}/unused.db"
+os.environ["SCREENER_CUBE_DIR"] = f"{_tmpdir}/cube"
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from benchmarks.synthetic import business_days, daily_prices_frame, universe  # noqa: E402
+from services.datasets import PRICE_COLUMNS  # noqa: E402
+from services.technical import (  # noqa: E402
+    ATR_WINDOW,
+    BOLLINGER_DEV,
+    BOLLINGER_WINDOW,
+    EMA_WINDOWS,
+    RSI_WINDOW,
+    SMA_WINDOWS,
+    VOLUME_RATIO_WINDOW,
+    PriceMatrix,
+    compute_indicators,
+    price_matrix_from_frame,
+)
+
+
+# 両方が有効な値の最大絶対誤差の許容値（浮動小数点の丸め誤差のみ許す）
+PARITY_TOLERANCE = 1e-8
+
+
+def synthetic_prices(n_codes: int, n_days: int) -> PriceMatrix:
+    codes = universe(n_codes)
+    days = business_days(date(2023, 1, 4), n_days)
+    df = pd.concat([daily_prices_frame(codes, d) for d in days], ignore_index=True)
+    df = df.rename(columns=PRICE_COLUMNS)
+    df["code"] = df["code"].astype(str)
+    return price_matrix_from_frame(df)
+
+
+def per_stock_ta(prices: PriceMatrix) -> dict:
+    """銘柄ごとに ta で計算し、(営業日, 銘柄) の行列に並べる"""
+    from ta.momentum import RSIIndicator
+    from ta.trend import MACD, EMAIndicator, SMAIndicator
+    from ta.volatility import AverageTrueRange, BollingerBands
+
+    index = pd.DatetimeIndex(prices.dates)
+    out = {}
+
+    def put(name: str, j: int, series: pd.Series):
+        out.setdefault(name, np.full(prices.shape, np.nan))[:, j] = series.to_numpy()
+
+    for j in range(len(prices.codes)):
+        close = pd.Series(prices.close[:, j], index=index)
+        high = pd.Series(prices.high[:, j], index=index)
+        low = pd.Series(prices.low[:, j], index=index)
+        volume = pd.Series(prices.volume[:, j], index=index)
+        for window in SMA_WINDOWS:
+            put(f"sma_{window}", j, SMAIndicator(close, window).sma_indicator())
+        for window in EMA_WINDOWS:
+            put(f"ema_{window}", j, EMAIndicator(close, window).ema_indicator())
+        m = MACD(close)
+        put("macd", j, m.macd())
+        put("macd_signal", j, m.macd_signal())
+        put("macd_diff", j, m.macd_diff())
+        put(f"rsi_{RSI_WINDOW}", j, RSIIndicator(close, RSI_WINDOW).rsi())
+        bb = BollingerBands(close, BOLLINGER_WINDOW, BOLLINGER_DEV)
+        put("bb_mavg", j, bb.bollinger_mavg())
+        put("bb_hband", j, bb.bollinger_hband())
+        put("bb_lband", j, bb.bollinger_lband())
+        put(f"atr_{ATR_WINDOW}", j, AverageTrueRange(high, low, close, ATR_WINDOW).average_true_range())
+        base = volume.rolling(VOLUME_RATIO_WINDOW).mean().shift(1)
+        put(f"volume_ratio_{VOLUME_RATIO_WINDOW}", j, (volume / base).where(base > 0))
+    return out
+
+
+def _timed(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--codes", type=int, default=4000)
+    parser.add_argument("--days", type=int, default=245)
+    parser.add_argument("--repeat", type=int, default=3, help="行列計算の繰り返し回数（最速値を採用）")
+    parser.add_argument("--output", type=Path, help="結果JSONの保存先")
+    args = parser.parse_args()
+
+    prices = synthetic_prices(args.codes, args.days)
+    vectorized_seconds, vectorized = _timed(lambda: compute_indicators(prices), args.repeat)
+    result = {
+        "benchmark": "technical_indicators",
+        "codes": args.codes,
+        "days": args.days,
+        "vectorized_seconds": round(vectorized_seconds, 4),
+    }
+
+    try:
+        ta_seconds, reference = _timed(lambda: per_stock_ta(prices), 1)
+    except ImportError:
+        result["per_stock_ta"] = "ta が未インストールのため省略"
+    else:
+        result["per_stock_ta_seconds"] = round(ta_seconds, 3)
+        result["speedup"] = round(ta_seconds / vectorized_seconds, 1)
+        errors = {}
+        failures = []
+        for name, expected in reference.items():
+            actual = vectorized[name]
+            both = np.isfinite(actual) & np.isfinite(expected)
+            one = np.isfinite(actual) ^ np.isfinite(expected)
+            errors[name] = {
+                "max_abs_error": float(np.max(np.abs(actual[both] - expected[both]), initial=0.0)),
+                "compared": int(both.sum()),
+                "only_one_valid": int(one.sum()),
+            }
+            if errors[name]["max_abs_error"] > PARITY_TOLERANCE:
+                failures.append(name)
+        # ATRで片方だけ有効なのは、こちらの計算開始前（ta は0、または初日が売買不成立
+        # のとき1日早く計算を始める）の位置と、売買不成立の日の後で ta が欠損になる
+        # （こちらは前日の値を持ち越す）位置だけのはず
+        name = f"atr_{ATR_WINDOW}"
+        actual, expected = vectorized[name], reference[name]
+        one = np.isfinite(actual) ^ np.isfinite(expected)
+        started = np.maximum.accumulate(np.isfinite(actual), axis=0)
+        before_seed = one & ~started
+        after_halt = one & started & np.isnan(expected)
+        errors[name]["before_seed"] = int(before_seed.sum())
+        errors[name]["ta_nan_after_halt"] = int(after_halt.sum())
+        if (before_seed | after_halt).sum() != one.sum():
+            failures.append(name)
+        result["errors"] = errors
+        result["parity_failures"] = failures
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.output:
+        args.output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+    if result.get("parity_failures"):
+        sys.exit(f"ta との差が許容値を超えた指標: {', '.join(result['parity_failures'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""ベンチマーク用のJ-Quants API V2スタブ
+
+httpx.MockTransport で動くインプロセスの偽サーバ。
+合成データ（benchmarks.synthetic）を乱数シード固定で生成し、
+実APIと同じ形式（データキー＋pagination_key）のJSONを返す。
+
+    fake = FakeJQuants(n_codes=4000, page_size=1000, requests_per_second=0)
+    client = JQuantsClient(transport=fake.transport(), base_url=FAKE_BASE_URL)
+
+- ページング: page_size 件ごとに pagination_key を付けて分割
+- スロットリング: requests_per_second を超えると 429 + Retry-After を返す
+- 遅延: latency 秒だけ応答を遅らせる（ネットワーク往復の模擬）
+"""
+
+import json
+import threading
+import time
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.synthetic import (
+    UNIVERSE_SIZE,
+    daily_price_records,
+    financial_summary_records,
+    listed_stock_records,
+    trading_calendar_records,
+    universe,
+)
+
+try:
+    import orjson
+except ImportError:  # 未インストールなら標準のjsonを使う
+    orjson = None
+
+FAKE_BASE_URL = "http://fake-jquants.local/v2"
+
+# 対応エンドポイント → レスポンスのデータキー
+DATA_KEYS = {
+    "/equities/master": "equities_master",
+    "/equities/bars/daily": "equities_bars_daily",
+    "/fins/summary": "fins_summary",
+    "/markets/calendar": "trading_calendar",
+}
+
+
+def _dumps(body: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(body)
+    return json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    if not value:
+        return None
+    for fmt in ("%Y%m%d", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"invalid date: {value}")
+
+
+def _days(from_date: date, to_date: date) -> List[date]:
+    return [
+        date.fromordinal(o)
+        for o in range(from_date.toordinal(), to_date.toordinal() + 1)
+        if date.fromordinal(o).weekday() < 5
+    ]
+
+
+class FakeJQuants:
+    """決定的な合成データを返すJ-Quants APIスタブ"""
+
+    def __init__(
+        self,
+        n_codes: int = UNIVERSE_SIZE,
+        page_size: int = 1000,
+        requests_per_second: float = 0,
+        latency: float = 0.0,
+        seed: int = 0,
+    ):
+        self.codes = universe(n_codes)
+        self.page_size = page_size
+        self.requests_per_second = requests_per_second  # 0は無制限
+        self.latency = latency
+        self.seed = seed
+        self.requests = 0
+        self.throttled = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._window_started = time.monotonic()
+        self._window_count = 0
+        self._handlers: Dict[str, Callable[[dict], List[dict]]] = {
+            "/equities/master": self._listed_stocks,
+            "/equities/bars/daily": self._daily_prices,
+            "/fins/summary": self._financial_summary,
+            "/markets/calendar": self._trading_calendar,
+        }
+        # 同じ日付の2ページ目以降で再生成しないよう、直近の結果を保持
+        self._records = lru_cache(maxsize=64)(self._generate)
+
+    # ─── トランスポート ───
+
+    def transport(self) -> httpx.MockTransport:
+        """同期・非同期クライアントのどちらにも渡せるトランスポート"""
+        return httpx.MockTransport(self.handle)
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "throttled": self.throttled, "bytes_sent": self.bytes_sent}
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        with self._lock:
+            self.requests += 1
+            if self._throttle():
+                self.throttled += 1
+                return httpx.Response(429, headers={"Retry-After": "1"}, json={"message": "Rate limit exceeded"})
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        endpoint = request.url.path.split("/v2", 1)[-1]
+        if endpoint not in self._handlers:
+            return httpx.Response(404, json={"message": f"unknown endpoint: {endpoint}"})
+
+        params = dict(request.url.params)
+        offset = int(params.pop("pagination_key", 0) or 0)
+        try:
+            records = self._records(endpoint, tuple(sorted(params.items())))
+        except ValueError as e:
+            return httpx.Response(400, json={"message": str(e)})
+
+        body = {DATA_KEYS[endpoint]: records[offset:offset + self.page_size]}
+        if offset + self.page_size < len(records):
+            body["pagination_key"] = str(offset + self.page_size)
+        content = _dumps(body)
+        with self._lock:
+            self.bytes_sent += len(content)
+        return httpx.Response(200, content=content, headers={"Content-Type": "application/json"})
+
+    def _throttle(self) -> bool:
+        """1秒ごとの固定ウィンドウで上限を超えたか（ロック取得済みで呼ぶ）"""
+        if not self.requests_per_second:
+            return False
+        now = time.monotonic()
+        if now - self._window_started >= 1.0:
+            self._window_started = now
+            self._window_count = 0
+        self._window_count += 1
+        return self._window_count > self.requests_per_second
+
+    # ─── データ生成 ───
+
+    def _generate(self, endpoint: str, params: Tuple[Tuple[str, str], ...]) -> List[dict]:
+        return self._handlers[endpoint](dict(params))
+
+    def _codes(self, params: dict) -> List[str]:
+        code = params.get("code")
+        if not code:
+            return self.codes
+        # 4桁指定は5桁コードに合わせる
+        code = code if len(code) == 5 else f"{code}0"
+        return [code] if code in self.codes else []
+
+    def _date_range(self, params: dict) -> List[date]:
+        target = _parse_date(params.get("date"))
+        if target:
+            return [target] if target.weekday() < 5 else []
+        from_date = _parse_date(params.get("from"))
+        to_date = _parse_date(params.get("to"))
+        if not from_date or not to_date:
+            raise ValueError("date or from/to is required")
+        return _days(from_date, to_date)
+
+    def _listed_stocks(self, params: dict) -> List[dict]:
+        as_of = _parse_date(params.get("date")) or date.today()
+        return listed_stock_records(self._codes(params), as_of)
+
+    def _daily_prices(self, params: dict) -> List[dict]:
+        codes = self._codes(params)
+        records = []
+        for d in self._date_range(params):
+            records.extend(daily_price_records(codes, d, self.seed))
+        return records
+
+    def _financial_summary(self, params: dict) -> List[dict]:
+        codes = self._codes(params)
+        records = []
+        for d in self._date_range(params):
+            records.extend(financial_summary_records(codes, d, self.seed))
+        return records
+
+    def _trading_calendar(self, params: dict) -> List[dict]:
+        from_date = _parse_date(params.get("from")) or date(date.today().year, 1, 1)
+        to_date = _parse_date(params.get("to")) or date.today()
+        return trading_calendar_records(from_date, to_date)
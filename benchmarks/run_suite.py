@@ -0,0 +1,221 @@
+"""同期処理のオフラインベンチマーク
+
+ローカルのJ-Quantsスタブ（benchmarks.fake_jquants）に対して
+SyncService の主要な同期シナリオを実行し、所要時間・件数・リクエスト数を
+JSONで保存する。実APIやAPIキーは不要。
+
+    python -m benchmarks.run_suite                       # 全シナリオ（4,000銘柄×245営業日）
+    python -m benchmarks.run_suite --scenario master_sync --scenario daily_prices_one_day
+    python -m benchmarks.run_suite --throttle 20 --latency 0.02
+    python -m benchmarks.run_suite --compare benchmarks/results/<前回の結果>.json
+
+結果は既定で benchmarks/results/<日時>-<コミット>.json に保存する。
+--compare を指定すると前回の結果とのrows/secの比を表示する。
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+_tmpdir = tempfile.mkdtemp(prefix="bench_suite_")
+os.environ["SCREENER_DB_URL"] = f"sqlite:///{_tmpdir}/bench.db"
+os.environ["JQUANTS_CACHE_ENABLED"] = "0"
+os.environ["SCREENER_CUBE_DIR"] = f"{_tmpdir}/cube"
+os.environ["SCREENER_FUNDAMENTALS_DIR"] = f"{_tmpdir}/fundamentals"
+os.environ["SCREENER_METRICS_ENABLED"] = "1"
+os.environ["SCREENER_METRICS_DIR"] = f"{_tmpdir}/metrics"
+# クライアント側のレート制限はスタブのスロットリングで検証するため実質無効にする
+os.environ.setdefault("JQUANTS_REQUESTS_PER_MINUTE", "1000000")
+
+from sqlalchemy import func, select  # noqa: E402
+
+from benchmarks.fake_jquants import FAKE_BASE_URL, FakeJQuants  # noqa: E402
+from benchmarks.synthetic import business_days  # noqa: E402
+from db.database import engine, get_session, init_db  # noqa: E402
+from models.schemas import Base, DailyPrice, FinancialSummary, Stock  # noqa: E402
+from services.datasets import DATASET_FIN_SUMMARY  # noqa: E402
+from services.jquants import AsyncJQuantsClient, JQuantsClient  # noqa: E402
+from services.metrics import metrics  # noqa: E402
+from services.sync import SyncService  # noqa: E402
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+START_DATE = date(2023, 1, 4)
+SCENARIOS = ("master_sync", "daily_prices_one_day", "backfill_one_year", "financial_ingestion")
+
+
+def _count(model) -> int:
+    session = get_session()
+    try:
+        return session.execute(select(func.count()).select_from(model)).scalar()
+    finally:
+        session.close()
+
+
+def _stage_summary() -> dict:
+    """計測結果をメトリクス名ごとの合計秒数・回数にまとめる"""
+    snapshot = metrics.snapshot()
+    stages = {}
+    for name, series in snapshot["histograms"].items():
+        stages[name] = {
+            "count": sum(s["count"] for s in series),
+            "seconds": round(sum(s["sum"] for s in series), 3),
+        }
+    counters = {
+        name: sum(s["value"] for s in series) for name, series in snapshot["counters"].items()
+    }
+    return {"stages": stages, "counters": counters}
+
+
+class Suite:
+    def __init__(self, args):
+        self.args = args
+        self.codes = args.codes
+        self.days = business_days(START_DATE, args.days)
+
+    def _service(self, fake: FakeJQuants) -> SyncService:
+        transport = fake.transport()
+
+        def async_client_factory(**kwargs):
+            return AsyncJQuantsClient(base_url=FAKE_BASE_URL, transport=transport, **kwargs)
+
+        return SyncService(
+            client=JQuantsClient(base_url=FAKE_BASE_URL, transport=transport),
+            async_client_factory=async_client_factory,
+        )
+
+    def run(self, name: str) -> dict:
+        Base.metadata.drop_all(engine)
+        init_db()
+        fake = FakeJQuants(
+            n_codes=self.codes,
+            page_size=self.args.page_size,
+            requests_per_second=self.args.throttle,
+            latency=self.args.latency,
+        )
+        sync = self._service(fake)
+        metrics.reset()
+
+        start = time.perf_counter()
+        model = getattr(self, name)(sync)
+        elapsed = time.perf_counter() - start
+
+        rows = _count(model)
+        result = {
+            "seconds": round(elapsed, 3),
+            "rows": rows,
+            "rows_per_sec": round(rows / elapsed, 1) if elapsed else 0.0,
+            "failed_units": len(sync.retry_queue),
+            **fake.stats(),
+            **_stage_summary(),
+        }
+        if sync.last_pipeline_stats:
+            result["pipeline"] = {k: v.as_dict() for k, v in sync.last_pipeline_stats.items()}
+        return result
+
+    # ─── シナリオ ───
+
+    def master_sync(self, sync: SyncService):
+        """銘柄マスタの全件取り込み"""
+        sync.sync_stocks()
+        return Stock
+
+    def daily_prices_one_day(self, sync: SyncService):
+        """1営業日分の全銘柄株価"""
+        sync.sync_daily_prices_on_date(self.days[-1])
+        return DailyPrice
+
+    def backfill_one_year(self, sync: SyncService):
+        """株価＋財務サマリのバックフィル（パイプライン経由）"""
+        sync.sync_all_historical_data(self.days[0], self.days[-1], self.args.concurrency)
+        return DailyPrice
+
+    def financial_ingestion(self, sync: SyncService):
+        """財務サマリのみの差分同期"""
+        sync.incremental_sync(
+            datasets=(DATASET_FIN_SUMMARY,),
+            from_date=self.days[0],
+            to_date=self.days[-1],
+            max_concurrency=self.args.concurrency,
+        )
+        return FinancialSummary
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _compare(result: dict, previous_path: Path):
+    previous = json.loads(previous_path.read_text(encoding="utf-8"))
+    print(f"\n前回 ({previous.get('commit')}) との比較:")
+    for name, current in result["scenarios"].items():
+        before = previous.get("scenarios", {}).get(name)
+        if not before or not before.get("seconds"):
+            continue
+        ratio = before["seconds"] / current["seconds"] if current["seconds"] else float("inf")
+        print(f"  {name}: {before['seconds']:.2f}秒 → {current['seconds']:.2f}秒 (x{ratio:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="実行するシナリオ（複数指定可）")
+    parser.add_argument("--codes", type=int, default=4000)
+    parser.add_argument("--days", type=int, default=245, help="バックフィル・財務サマリの営業日数")
+    parser.add_argument("--page-size", type=int, default=1000, help="スタブの1ページあたりの件数")
+    parser.add_argument("--throttle", type=float, default=0, help="スタブのリクエスト上限（回/秒、0は無制限）")
+    parser.add_argument("--latency", type=float, default=0.0, help="スタブの応答遅延（秒）")
+    parser.add_argument("--concurrency", type=int, default=4, help="並列取得数")
+    parser.add_argument("--output", type=Path, help="結果JSONの保存先")
+    parser.add_argument("--compare", type=Path, help="比較する前回の結果JSON")
+    args = parser.parse_args()
+
+    suite = Suite(args)
+    commit = _git_commit()
+    result = {
+        "benchmark": "sync_suite",
+        "commit": commit,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "params": {
+            "codes": args.codes,
+            "days": args.days,
+            "page_size": args.page_size,
+            "throttle": args.throttle,
+            "latency": args.latency,
+            "concurrency": args.concurrency,
+        },
+        "scenarios": {},
+    }
+    for name in args.scenario or SCENARIOS:
+        print(f"{name} ...", flush=True)
+        result["scenarios"][name] = suite.run(name)
+        s = result["scenarios"][name]
+        print(f"  {s['seconds']:.2f}秒 / {s['rows']}件 / {s['rows_per_sec']:.0f}件/秒 / {s['requests']}リクエスト")
+
+    output = args.output
+    if output is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        output = RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json"
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"結果を保存: {output}")
+
+    if args.compare:
+        _compare(result, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""ベンチマーク用の合成データ生成
+
+全銘柄（約4,000銘柄）×営業日の株価などを、乱数シード固定で決定的に生成する。
+"""
+
+from datetime import date, timedelta
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+UNIVERSE_SIZE = 4000
+
+
+def universe(n_codes: int = UNIVERSE_SIZE) -> List[str]:
+    """銘柄コード一覧（5桁コード）"""
+    return [f"{1300 + i * 2:04d}0" for i in range(n_codes)]
+
+
+def business_days(from_date: date, n_days: int) -> List[date]:
+    """from_date以降の平日をn_days日分"""
+    days = []
+    current = from_date
+    while len(days) < n_days:
+        if current.weekday() < 5:
+            days.append(current)
+        current += timedelta(days=1)
+    return days
+
+
+def daily_prices_frame(codes: List[str], target_date: date, seed: int = 0) -> pd.DataFrame:
+    """1営業日分の全銘柄株価（decode_records と同じ列・型）"""
+    rng = np.random.default_rng(seed + target_date.toordinal())
+    n = len(codes)
+    base = 100 + (np.arange(n) % 500) * 10.0
+    close = base * (1 + rng.normal(0, 0.02, n))
+    open_ = close * (1 + rng.normal(0, 0.01, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.005, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.005, n)))
+    volume = rng.integers(0, 1_000_000, n).astype("float64")
+    # 売買不成立の銘柄は四本値が欠損
+    halted = rng.random(n) < 0.01
+    for arr in (open_, high, low, close):
+        arr[halted] = np.nan
+
+    return pd.DataFrame(
+        {
+            "Date": np.full(n, np.datetime64(target_date, "D")),
+            "Code": pd.Categorical(codes),
+            "O": open_,
+            "H": high,
+            "L": low,
+            "C": close,
+            "Vo": volume,
+            "Va": volume * close,
+            "AdjFactor": np.ones(n),
+            "AdjO": open_,
+            "AdjH": high,
+            "AdjL": low,
+            "AdjC": close,
+            "AdjVo": volume,
+        }
+    )
+
+
+# ─── APIレスポンス形式のレコード ───
+
+SECTORS_33 = [f"{(i + 1) * 50:04d}" for i in range(33)]
+MARKETS = [("0111", "プライム"), ("0112", "スタンダード"), ("0113", "グロース")]
+
+# 1営業日あたり決算を開示する銘柄の割合の逆数（約60営業日ごと＝四半期ごとに開示）
+DISCLOSURE_CYCLE = 60
+
+
+def _to_records(df: pd.DataFrame) -> List[dict]:
+    """DataFrameをAPIレスポンスのレコード（欠損はNone）に変換"""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def listed_stock_records(codes: List[str], as_of: date) -> List[dict]:
+    """銘柄マスタ（/equities/master）"""
+    n = len(codes)
+    idx = np.arange(n)
+    market = [MARKETS[i % len(MARKETS)] for i in range(n)]
+    sector33 = [SECTORS_33[i % len(SECTORS_33)] for i in range(n)]
+    df = pd.DataFrame(
+        {
+            "Date": as_of.isoformat(),
+            "Code": codes,
+            "CoName": [f"銘柄{c[:4]}" for c in codes],
+            "CoNameEn": [f"Company {c[:4]}" for c in codes],
+            "S17": [str(i % 17 + 1) for i in idx],
+            "S17Nm": [f"業種17-{i % 17 + 1}" for i in idx],
+            "S33": sector33,
+            "S33Nm": [f"業種33-{s}" for s in sector33],
+            "ScaleCat": "TOPIX Small 1",
+            "Mkt": [m[0] for m in market],
+            "MktNm": [m[1] for m in market],
+            "Mrgn": "2",
+            "MrgnNm": "貸借",
+        }
+    )
+    return _to_records(df)
+
+
+def daily_price_records(codes: List[str], target_date: date, seed: int = 0) -> List[dict]:
+    """1営業日分の全銘柄株価（/equities/bars/daily）"""
+    df = daily_prices_frame(codes, target_date, seed)
+    df["Date"] = target_date.isoformat()
+    df["Code"] = df["Code"].astype(str)
+    return _to_records(df)
+
+
+def disclosing_codes(codes: List[str], target_date: date) -> List[str]:
+    """target_dateに決算を開示する銘柄（銘柄ごとに約60営業日周期）"""
+    offset = target_date.toordinal() % DISCLOSURE_CYCLE
+    return [c for c in codes if int(c[:4]) // 2 % DISCLOSURE_CYCLE == offset]
+
+
+def financial_summary_records(codes: List[str], target_date: date, seed: int = 0) -> List[dict]:
+    """1日分の決算短信サマリ（/fins/summary）"""
+    disclosing = disclosing_codes(codes, target_date)
+    n = len(disclosing)
+    if n == 0:
+        return []
+    rng = np.random.default_rng(seed + target_date.toordinal() * 7)
+    sales = rng.lognormal(10, 1.5, n).round(0) * 1_000_000
+    margin = rng.normal(0.08, 0.05, n)
+    profit = (sales * margin * 0.6).round(0)
+    shares = rng.integers(10, 500, n) * 1_000_000
+    equity = (sales * rng.uniform(0.3, 1.5, n)).round(0)
+    fy_start = date(target_date.year if target_date.month > 3 else target_date.year - 1, 4, 1)
+    quarter = (target_date.month - 4) % 12 // 3 + 1
+    per_type = "FY" if quarter == 1 else f"{quarter - 1}Q"
+    if per_type == "FY":  # 4〜6月の本決算は前年度分
+        fy_start = date(fy_start.year - 1, 4, 1)
+
+    df = pd.DataFrame(
+        {
+            "DiscDate": target_date.isoformat(),
+            "DiscTime": "15:00:00",
+            "Code": disclosing,
+            "DiscNo": [f"{target_date:%Y%m%d}{i:06d}" for i in range(n)],
+            "DocType": f"{per_type}FinancialStatements_Consolidated_JP",
+            "CurPerType": per_type,
+            "CurFYSt": fy_start.isoformat(),
+            "CurFYEn": date(fy_start.year + 1, 3, 31).isoformat(),
+            "Sales": sales.astype(str),
+            "OP": (sales * margin).round(0).astype(str),
+            "OdP": (sales * margin * 1.02).round(0).astype(str),
+            "NP": profit.astype(str),
+            "EPS": (profit / shares).round(2).astype(str),
+            "TA": (equity * 2).astype(str),
+            "Eq": equity.astype(str),
+            "EqAR": "0.5",
+            "BPS": (equity / shares).round(2).astype(str),
+            "DivAnn": (profit / shares * 0.3).round(1).astype(str),
+            "FSales": (sales * 1.05).round(0).astype(str),
+            "FOP": (sales * margin * 1.05).round(0).astype(str),
+            "FNP": (profit * 1.05).round(0).astype(str),
+            "FEPS": (profit * 1.05 / shares).round(2).astype(str),
+            "ShOutFY": shares.astype(str),
+            "TrShFY": (shares * 0.02).astype(int).astype(str),
+        }
+    )
+    return _to_records(df)
+
+
+def trading_calendar_records(from_date: date, to_date: date) -> List[dict]:
+    """取引カレンダー（/markets/calendar、土日を休日とする）"""
+    records = []
+    current = from_date
+    while current <= to_date:
+        records.append({"Date": current.isoformat(), "HolDiv": "1" if current.weekday() < 5 else "0"})
+        current += timedelta(days=1)
+    return records
@@ -2,6 +2,7 @@
 
 import os
 from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -13,12 +14,29 @@ BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / "data"
 PDF_DIR = DATA_DIR / "pdfs"
 CACHE_DIR = DATA_DIR / "cache"
+METRICS_DIR = DATA_DIR / "metrics"
+COLUMNAR_DIR = DATA_DIR / "columnar"
+CUBE_DIR = DATA_DIR / "cube"
 DB_PATH = DATA_DIR / "screener.db"
 
 # ディレクトリの自動作成
 for d in [DATA_DIR, PDF_DIR, CACHE_DIR]:
     d.mkdir(parents=True, exist_ok=True)
 
+# Freeプランのデータ提供遅延（日数）
+FREE_PLAN_DELAY_DAYS = 12 * 7
+
+# J-Quants のデータの日付・公開時刻の基準（日本時間 = UTC+9）
+JST_OFFSET = timedelta(hours=9)
+
+# プラン別のAPIリクエスト上限（回/分）
+PLAN_RATE_LIMITS = {
+    "free": 5,
+    "light": 60,
+    "standard": 120,
+    "premium": 500,
+}
+
 
 @dataclass
 class JQuantsConfig:
@@ -26,12 +44,162 @@ class JQuantsConfig:
 
     api_key: str = field(default_factory=lambda: os.getenv("JQUANTS_API_KEY", ""))
     plan: str = field(default_factory=lambda: os.getenv("JQUANTS_PLAN", "free"))
-    base_url: str = "https://api.jquants.com/v2"
+    base_url: str = field(
+        default_factory=lambda: os.getenv("JQUANTS_BASE_URL", "https://api.jquants.com/v2")
+    )
+    # 同時リクエスト数の上限（非同期クライアント用）
+    max_concurrency: int = field(
+        default_factory=lambda: int(os.getenv("JQUANTS_MAX_CONCURRENCY", "4"))
+    )
+    # リクエスト上限（回/分）。0の場合はプランから自動決定
+    requests_per_minute: int = field(
+        default_factory=lambda: int(os.getenv("JQUANTS_REQUESTS_PER_MINUTE", "0"))
+    )
+    # その営業日のデータ（株価・財務サマリ）が確定する時刻（日本時間 HH:MM）
+    # これより前に取得した営業日は次の実行で取り直す
+    publish_time: str = field(default_factory=lambda: os.getenv("JQUANTS_PUBLISH_TIME", "20:00"))
 
     @property
     def is_free_plan(self) -> bool:
         return self.plan == "free"
 
+    def latest_available_date(self) -> date:
+        """プランで取得可能な最新日付"""
+        if self.is_free_plan:
+            return date.today() - timedelta(days=FREE_PLAN_DELAY_DAYS)
+        return date.today()
+
+    def publish_cutoff(self, target_date: date) -> datetime:
+        """target_date のデータが確定する日時（同期日時と同じUTCのnaive datetime）"""
+        return datetime.combine(target_date, time.fromisoformat(self.publish_time)) - JST_OFFSET
+
+    @property
+    def rate_limit_per_minute(self) -> int:
+        """実効リクエスト上限（回/分）"""
+        if self.requests_per_minute > 0:
+            return self.requests_per_minute
+        return PLAN_RATE_LIMITS.get(self.plan, PLAN_RATE_LIMITS["free"])
+
+
+@dataclass
+class CacheConfig:
+    """APIレスポンスキャッシュ設定"""
+
+    enabled: bool = field(
+        default_factory=lambda: os.getenv("JQUANTS_CACHE_ENABLED", "1") == "1"
+    )
+    max_bytes: int = field(
+        default_factory=lambda: int(os.getenv("JQUANTS_CACHE_MAX_MB", "2048")) * 1024 * 1024
+    )
+    # 直近データのキャッシュ有効期間（秒）
+    ttl_seconds: int = field(
+        default_factory=lambda: int(os.getenv("JQUANTS_CACHE_TTL", str(6 * 60 * 60)))
+    )
+    # この日数より古い日付のデータは確定済み（不変）として扱う
+    immutable_after_days: int = 7
+
+
+@dataclass
+class SQLiteConfig:
+    """SQLiteの接続設定（接続ごとにPRAGMAで適用）"""
+
+    # WALなら書き込み中も読み取りがブロックされない
+    journal_mode: str = field(default_factory=lambda: os.getenv("SCREENER_SQLITE_JOURNAL_MODE", "WAL"))
+    # WALではNORMALでも電源断以外でDBは壊れない（直近のコミットが失われる可能性のみ）
+    synchronous: str = field(default_factory=lambda: os.getenv("SCREENER_SQLITE_SYNCHRONOUS", "NORMAL"))
+    # 接続ごとのページキャッシュ（MB）
+    cache_size_mb: int = field(
+        default_factory=lambda: int(os.getenv("SCREENER_SQLITE_CACHE_MB", "64"))
+    )
+    # メモリマップI/Oの上限（MB、0で無効）
+    mmap_size_mb: int = field(
+        default_factory=lambda: int(os.getenv("SCREENER_SQLITE_MMAP_MB", "256"))
+    )
+    # ロック待ちの上限（ミリ秒）
+    busy_timeout_ms: int = field(
+        default_factory=lambda: int(os.getenv("SCREENER_SQLITE_BUSY_TIMEOUT_MS", "30000"))
+    )
+    # 読み取り専用エンジンの接続プールサイズ
+    read_pool_size: int = field(
+        default_factory=lambda: int(os.getenv("SCREENER_SQLITE_READ_POOL_SIZE", "5"))
+    )
+
+
+@dataclass
+class ColumnarConfig:
+    """株価の列指向ストア（Parquet）設定"""
+
+    # 有効時は同期のたびに data/columnar へも書き込む（pyarrowが必要）
+    enabled: bool = field(
+        default_factory=lambda: os.getenv("SCREENER_COLUMNAR_ENABLED", "0") == "1"
+    )
+    directory: Path = field(
+        default_factory=lambda: Path(os.getenv("SCREENER_COLUMNAR_DIR", str(COLUMNAR_DIR)))
+    )
+
+
+@dataclass
+class CubeConfig:
+    """株価キューブ（営業日×銘柄×項目のメモリマップ配列）設定"""
+
+    # 有効時は同期の実行ごとに data/cube へ追記する
+    enabled: bool = field(
+        default_factory=lambda: os.getenv("SCREENER_CUBE_ENABLED", "1") == "1"
+    )
+    directory: Path = field(
+        default_factory=lambda: Path(os.getenv("SCREENER_CUBE_DIR", str(CUBE_DIR)))
+    )
+
+
+@dataclass
+class FundamentalsConfig:
+    """ファンダメンタル指標の日次パネル設定"""
+
+    # 有効時は同期の実行ごとに data/cache/fundamentals のパネルを更新する
+    enabled: bool = field(
+        default_factory=lambda: os.getenv("SCREENER_FUNDAMENTALS_ENABLED", "1") == "1"
+    )
+    directory: Path = field(
+        default_factory=lambda: Path(os.getenv("SCREENER_FUNDAMENTALS_DIR", str(CACHE_DIR / "fundamentals")))
+    )
+
+
+@dataclass
+class ScreenCacheConfig:
+    """スクリーニング結果のキャッシュ設定"""
+
+    enabled: bool = field(
+        default_factory=lambda: os.getenv("SCREENER_SCREEN_CACHE_ENABLED", "1") == "1"
+    )
+    # メモリに保持する件数・合計サイズの上限
+    max_entries: int = field(
+        default_factory=lambda: int(os.getenv("SCREENER_SCREEN_CACHE_ENTRIES", "128"))
+    )
+    max_memory_bytes: int = field(
+        default_factory=lambda: int(os.getenv("SCREENER_SCREEN_CACHE_MEMORY_MB", "64")) * 1024 * 1024
+    )
+    # ディスク（data/cache/screens）の合計サイズの上限
+    max_disk_bytes: int = field(
+        default_factory=lambda: int(os.getenv("SCREENER_SCREEN_CACHE_DISK_MB", "256")) * 1024 * 1024
+    )
+    directory: Path = field(
+        default_factory=lambda: Path(os.getenv("SCREENER_SCREEN_CACHE_DIR", str(CACHE_DIR / "screens")))
+    )
+
+
+@dataclass
+class MetricsConfig:
+    """同期処理の計測設定"""
+
+    # 無効時は計測呼び出しが即座に戻るため、ほぼオーバーヘッドなし
+    enabled: bool = field(
+        default_factory=lambda: os.getenv("SCREENER_METRICS_ENABLED", "0") == "1"
+    )
+    # 実行ごとのJSONレポートとPrometheusテキストの出力先
+    directory: Path = field(
+        default_factory=lambda: Path(os.getenv("SCREENER_METRICS_DIR", str(METRICS_DIR)))
+    )
+
 
 @dataclass
 class GeminiConfig:
@@ -46,8 +214,17 @@ class AppConfig:
     """アプリケーション全体設定"""
 
     jquants: JQuantsConfig = field(default_factory=JQuantsConfig)
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    metrics: MetricsConfig = field(default_factory=MetricsConfig)
+    sqlite: SQLiteConfig = field(default_factory=SQLiteConfig)
+    columnar: ColumnarConfig = field(default_factory=ColumnarConfig)
+    cube: CubeConfig = field(default_factory=CubeConfig)
+    fundamentals: FundamentalsConfig = field(default_factory=FundamentalsConfig)
+    screen_cache: ScreenCacheConfig = field(default_factory=ScreenCacheConfig)
     gemini: GeminiConfig = field(default_factory=GeminiConfig)
-    db_url: str = field(default_factory=lambda: f"sqlite:///{DB_PATH}")
+    db_url: str = field(
+        default_factory=lambda: os.getenv("SCREENER_DB_URL", f"sqlite:///{DB_PATH}")
+    )
 
 
 config = AppConfig()
@@ -1,21 +1,87 @@
-"""データベース接続・初期化"""
+"""データベース接続・初期化
 
-from sqlalchemy import create_engine
+書き込み用（同期ジョブ）と読み取り専用（UI・分析）のエンジンを分けて持つ。
+SQLiteでは接続ごとにPRAGMAでチューニング（WAL・synchronous=NORMAL・
+ページキャッシュ・mmap・一時領域のメモリ化・ロック待ち）を適用するため、
+バックフィルの書き込み中でも読み取りは待たされない。
+"""
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker, Session
 
-from config import config
+from config import SQLiteConfig, config
+from db.migrations import run_migrations
 from models.schemas import Base
 
 
-engine = create_engine(config.db_url, echo=False)
+def sqlite_pragmas(settings: SQLiteConfig, read_only: bool = False) -> list:
+    """接続時に実行するPRAGMA"""
+    pragmas = [
+        f"PRAGMA busy_timeout = {settings.busy_timeout_ms}",
+        # 負の値はKiB単位の指定
+        f"PRAGMA cache_size = -{settings.cache_size_mb * 1024}",
+        f"PRAGMA mmap_size = {settings.mmap_size_mb * 1024 * 1024}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    else:
+        # journal_mode はDBファイルに保存されるため書き込み側で設定する
+        pragmas.insert(0, f"PRAGMA journal_mode = {settings.journal_mode}")
+        pragmas.append(f"PRAGMA synchronous = {settings.synchronous}")
+    return pragmas
+
+
+def _is_memory_db(url: str) -> bool:
+    return make_url(url).database in (None, "", ":memory:")
+
+
+def create_tuned_engine(
+    url: str, read_only: bool = False, settings: SQLiteConfig = config.sqlite
+) -> Engine:
+    """チューニング済みのエンジンを作成（SQLite以外はそのまま）"""
+    if not make_url(url).drivername.startswith("sqlite"):
+        return create_engine(url, echo=False)
+
+    options = {"connect_args": {"timeout": settings.busy_timeout_ms / 1000}}
+    if read_only:
+        options["pool_size"] = settings.read_pool_size
+    new_engine = create_engine(url, echo=False, **options)
+    pragmas = sqlite_pragmas(settings, read_only=read_only)
+
+    @event.listens_for(new_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return new_engine
+
+
+# 書き込み用（同期ジョブ）
+engine = create_tuned_engine(config.db_url)
+# 読み取り専用（UI・分析）。インメモリDBは接続ごとに別DBになるため書き込み用と共有する
+read_engine = engine if _is_memory_db(config.db_url) else create_tuned_engine(config.db_url, read_only=True)
+
 SessionLocal = sessionmaker(bind=engine)
+ReadSessionLocal = sessionmaker(bind=read_engine)
 
 
 def init_db():
-    """テーブル作成"""
+    """テーブル作成・既存DBの移行"""
     Base.metadata.create_all(engine)
+    run_migrations(engine)
 
 
 def get_session() -> Session:
-    """セッション取得"""
+    """セッション取得（書き込み用）"""
     return SessionLocal()
+
+
+def get_read_session() -> Session:
+    """読み取り専用セッション取得（UI・分析用）"""
+    return ReadSessionLocal()
@@ -0,0 +1,154 @@
+"""既存DBのスキーマ移行
+
+create_all は既存テーブルに制約・インデックスを追加しないため、
+スキーマ変更はここで冪等な移行処理として適用する。
+
+    python -m db.migrations
+"""
+
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+
+def _has_index(conn: Connection, name: str) -> bool:
+    row = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"),
+        {"name": name},
+    ).first()
+    return row is not None
+
+
+def _has_column(conn: Connection, table: str, column: str) -> bool:
+    rows = conn.execute(text(f"PRAGMA table_info({table})")).all()
+    return any(row[1] == column for row in rows)
+
+
+def dedupe_financial_summaries(conn: Connection):
+    """財務サマリの重複行を削除し、自然キーの一意インデックスを作成"""
+    if _has_index(conn, "uix_fin_natural_key"):
+        return
+
+    # 一意インデックスではNULL同士が重複扱いにならないため空文字に揃える
+    conn.execute(text(
+        "UPDATE financial_summaries SET disclosed_time = '' WHERE disclosed_time IS NULL"
+    ))
+    conn.execute(text(
+        "UPDATE financial_summaries SET type_of_document = '' WHERE type_of_document IS NULL"
+    ))
+    # 同一キーの行は最後に保存されたもの（idが最大）を残す
+    result = conn.execute(text("""
+        DELETE FROM financial_summaries
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM financial_summaries
+            GROUP BY code, disclosed_date, disclosed_time, type_of_document
+        )
+    """))
+    conn.execute(text("""
+        CREATE UNIQUE INDEX uix_fin_natural_key
+        ON financial_summaries (code, disclosed_date, disclosed_time, type_of_document)
+    """))
+    logger.info(f"財務サマリの重複削除: {result.rowcount}件")
+
+
+def add_stock_content_hash(conn: Connection):
+    """銘柄マスタに差分判定用のハッシュ列を追加"""
+    if _has_column(conn, "stocks", "content_hash"):
+        return
+    conn.execute(text("ALTER TABLE stocks ADD COLUMN content_hash VARCHAR(40)"))
+    logger.info("stocks.content_hash を追加")
+
+
+def cluster_daily_prices(conn: Connection):
+    """株価テーブルを (code, date) 主キーのWITHOUT ROWIDテーブルに作り直す
+
+    旧テーブル（id主キー＋code/date/一意の3インデックス）の行を
+    (code, date) 順にコピーする。コピー後のファイルの空き領域は VACUUM で回収できる。
+    """
+    from models.schemas import DailyPrice
+
+    row = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'daily_prices'")
+    ).first()
+    if row is None or "WITHOUT ROWID" in row[0].upper():
+        return
+
+    conn.execute(text("ALTER TABLE daily_prices RENAME TO daily_prices_old"))
+    # 旧テーブルのインデックス名が新テーブルと衝突しないよう先に削除
+    for name in ("ix_daily_prices_code", "ix_daily_prices_date"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    DailyPrice.__table__.create(conn)
+
+    columns = ", ".join(c.name for c in DailyPrice.__table__.columns)
+    # 主キー順に挿入してB木の分割を抑える（同一キーはidが最大の行を残す）
+    result = conn.execute(text(f"""
+        INSERT OR REPLACE INTO daily_prices ({columns})
+        SELECT {columns} FROM daily_prices_old
+        WHERE code IS NOT NULL AND date IS NOT NULL
+        ORDER BY code, date, id
+    """))
+    conn.execute(text("DROP TABLE daily_prices_old"))
+    logger.info(f"daily_prices を (code, date) クラスタ化テーブルに移行: {result.rowcount}件")
+
+
+def add_financial_summary_shares(conn: Connection):
+    """財務サマリに株式数（期末発行済株式数・期末自己株式数）の列を追加"""
+    for column in ("shares_outstanding", "treasury_shares"):
+        if not _has_column(conn, "financial_summaries", column):
+            conn.execute(text(f"ALTER TABLE financial_summaries ADD COLUMN {column} FLOAT"))
+            logger.info(f"financial_summaries.{column} を追加")
+
+
+def build_latest_snapshot(conn: Connection):
+    """最新スナップショットが空なら既存の株価・財務から作る（以降は同期時に差分更新）"""
+    from services.snapshot import rebuild_snapshot
+
+    if conn.execute(text("SELECT 1 FROM latest_snapshot LIMIT 1")).first() is not None:
+        return
+    written = rebuild_snapshot(conn)
+    if written:
+        logger.info(f"latest_snapshot を作成: {written}銘柄")
+
+
+def add_screening_indexes(conn: Connection):
+    """スクリーニングの条件（市場・業種・時価総額・PER・PBR）用の索引を追加"""
+    indexes = {
+        "ix_stocks_market_sector33": "stocks (market_code, sector33_code)",
+        "ix_stocks_sector33": "stocks (sector33_code)",
+        "ix_latest_snapshot_market_cap": "latest_snapshot (market_cap)",
+        "ix_latest_snapshot_per": "latest_snapshot (per)",
+        "ix_latest_snapshot_pbr": "latest_snapshot (pbr)",
+    }
+    for name, target in indexes.items():
+        if not _has_index(conn, name):
+            conn.execute(text(f"CREATE INDEX {name} ON {target}"))
+            logger.info(f"索引 {name} を追加")
+
+
+# 適用順に並べる（各処理は冪等であること）
+MIGRATIONS = [
+    dedupe_financial_summaries,
+    add_stock_content_hash,
+    cluster_daily_prices,
+    add_financial_summary_shares,
+    build_latest_snapshot,
+    add_screening_indexes,
+]
+
+
+def run_migrations(engine: Engine):
+    """全ての移行処理を適用"""
+    with engine.begin() as conn:
+        for migration in MIGRATIONS:
+            migration(conn)
+
+
+if __name__ == "__main__":
+    from db.database import init_db
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    print("移行完了", flush=True)
@@ -9,7 +9,9 @@ from sqlalchemy import (
     Date,
     DateTime,
     Float,
+    Index,
     Integer,
+    LargeBinary,
     String,
     Text,
     BigInteger,
@@ -41,17 +43,24 @@ class Stock(Base):
     margin_code = Column(String(10))  # 信用区分
     fiscal_year_end = Column(String(10))  # 決算月
     is_active = Column(Boolean, default=True)
+    content_hash = Column(String(40))  # 同期時の差分判定用ハッシュ
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # スクリーニングの市場・業種の条件用
+        Index("ix_stocks_market_sector33", "market_code", "sector33_code"),
+        Index("ix_stocks_sector33", "sector33_code"),
+    )
+
 
 class DailyPrice(Base):
     """日足株価データ"""
 
     __tablename__ = "daily_prices"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    code = Column(String(10), index=True)  # 銘柄コード
-    date = Column(Date, index=True)  # 日付
+    # (code, date) を主キーにしたWITHOUT ROWIDテーブル（銘柄ごとの時系列が連続して格納される）
+    code = Column(String(10), primary_key=True)  # 銘柄コード
+    date = Column(Date, primary_key=True)  # 日付
     open = Column(Float)  # 始値
     high = Column(Float)  # 高値
     low = Column(Float)  # 安値
@@ -66,7 +75,9 @@ class DailyPrice(Base):
     adjustment_volume = Column(Float)  # 調整済出来高
 
     __table_args__ = (
-        UniqueConstraint("code", "date", name="uix_code_date"),
+        # 日付指定の横断的な読み取り用
+        Index("ix_daily_prices_date_code", "date", "code"),
+        {"sqlite_with_rowid": False},
     )
 
 
@@ -109,6 +120,268 @@ class FinancialSummary(Base):
     result_dividend_per_share_annual = Column(Float)  # 年間配当（実績）
     forecast_dividend_per_share_annual = Column(Float)  # 年間配当（予想）
 
+    shares_outstanding = Column(Float)  # 期末発行済株式数（自己株式を含む）
+    treasury_shares = Column(Float)  # 期末自己株式数
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # 自然キー（開示時刻・書類種別の欠損は空文字で保存する）
+        Index(
+            "uix_fin_natural_key",
+            "code",
+            "disclosed_date",
+            "disclosed_time",
+            "type_of_document",
+            unique=True,
+        ),
+    )
+
+
+class FinancialDetail(Base):
+    """財務諸表（BS/PL/CF）"""
+
+    __tablename__ = "financial_details"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    code = Column(String(10), index=True)
+    disclosed_date = Column(Date)  # 開示日
+    disclosed_time = Column(String(10))  # 開示時刻
+    type_of_document = Column(String(50))  # 書類種別
+    statements = Column(Text)  # 財務諸表の各項目 (JSON)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index(
+            "uix_fin_detail_natural_key",
+            "code",
+            "disclosed_date",
+            "disclosed_time",
+            "type_of_document",
+            unique=True,
+        ),
+    )
+
+
+class Dividend(Base):
+    """配当金情報"""
+
+    __tablename__ = "dividends"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    code = Column(String(10), index=True)
+    announcement_date = Column(Date)  # 通知日
+    announcement_time = Column(String(10))  # 通知時刻
+    reference_number = Column(String(20))  # リファレンスナンバー
+    record_date = Column(Date)  # 基準日
+    ex_date = Column(Date)  # 権利落日
+    payable_date = Column(Date)  # 支払開始予定日
+    dividend_rate = Column(Float)  # 1株当たり配当金額
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index(
+            "uix_dividend_natural_key",
+            "code",
+            "announcement_date",
+            "reference_number",
+            unique=True,
+        ),
+    )
+
+
+class EarningsAnnouncement(Base):
+    """決算発表予定日"""
+
+    __tablename__ = "earnings_announcements"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    code = Column(String(10))
+    date = Column(Date, index=True)  # 発表予定日
+    company_name = Column(String(200))  # 会社名
+    fiscal_year = Column(String(20))  # 決算期末
+    sector_name = Column(String(100))  # 業種名
+    fiscal_quarter = Column(String(20))  # 決算種別
+    section = Column(String(50))  # 市場区分
+
+    __table_args__ = (
+        UniqueConstraint("code", "date", name="uix_earnings_code_date"),
+    )
+
+
+class MarginInterest(Base):
+    """信用取引週末残高"""
+
+    __tablename__ = "margin_interests"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    code = Column(String(10))
+    date = Column(Date, index=True)  # 申込日
+    short_volume = Column(Float)  # 売合計信用残高
+    long_volume = Column(Float)  # 買合計信用残高
+    short_negotiable_volume = Column(Float)  # 売一般信用残高
+    long_negotiable_volume = Column(Float)  # 買一般信用残高
+    short_standardized_volume = Column(Float)  # 売制度信用残高
+    long_standardized_volume = Column(Float)  # 買制度信用残高
+    issue_type = Column(String(10))  # 銘柄区分
+
+    __table_args__ = (
+        UniqueConstraint("code", "date", name="uix_margin_code_date"),
+    )
+
+
+class ShortRatio(Base):
+    """業種別空売り比率"""
+
+    __tablename__ = "short_ratios"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    date = Column(Date)  # 日付
+    sector33_code = Column(String(10))  # 33業種コード
+    selling_excluding_short_value = Column(Float)  # 実注文の売買代金
+    short_with_restrictions_value = Column(Float)  # 価格規制有りの空売り売買代金
+    short_without_restrictions_value = Column(Float)  # 価格規制無しの空売り売買代金
+
+    __table_args__ = (
+        UniqueConstraint("date", "sector33_code", name="uix_short_date_sector"),
+    )
+
+
+class IndexPrice(Base):
+    """指数四本値"""
+
+    __tablename__ = "index_prices"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    code = Column(String(10))  # 指数コード
+    date = Column(Date, index=True)  # 日付
+    open = Column(Float)  # 始値
+    high = Column(Float)  # 高値
+    low = Column(Float)  # 安値
+    close = Column(Float)  # 終値
+
+    __table_args__ = (
+        UniqueConstraint("code", "date", name="uix_index_code_date"),
+    )
+
+
+class LatestSnapshot(Base):
+    """銘柄ごとの最新の株価・財務（同期時に差分更新するスクリーニング用の集約）"""
+
+    __tablename__ = "latest_snapshot"
+
+    code = Column(String(10), primary_key=True)  # 銘柄コード
+
+    # 最新の株価
+    price_date = Column(Date)  # 株価の日付
+    close = Column(Float)  # 終値
+    adjustment_close = Column(Float)  # 調整後終値
+    volume = Column(BigInteger)  # 出来高
+    turnover_value = Column(Float)  # 売買代金
+
+    # 最新の開示（項目ごとに直近の開示で値のあるもの）
+    disclosed_date = Column(Date)  # 直近の開示日
+    type_of_document = Column(String(50))  # 直近の書類種別
+    net_sales = Column(Float)  # 売上高
+    operating_profit = Column(Float)  # 営業利益
+    ordinary_profit = Column(Float)  # 経常利益
+    profit = Column(Float)  # 当期純利益
+    earnings_per_share = Column(Float)  # EPS
+    total_assets = Column(Float)  # 総資産
+    equity = Column(Float)  # 純資産
+    equity_to_asset_ratio = Column(Float)  # 自己資本比率
+    book_value_per_share = Column(Float)  # BPS
+    result_dividend_per_share_annual = Column(Float)  # 年間配当（実績）
+    forecast_net_sales = Column(Float)  # 売上高予想
+    forecast_operating_profit = Column(Float)  # 営業利益予想
+    forecast_ordinary_profit = Column(Float)  # 経常利益予想
+    forecast_profit = Column(Float)  # 純利益予想
+    forecast_earnings_per_share = Column(Float)  # EPS予想
+    forecast_dividend_per_share_annual = Column(Float)  # 年間配当（予想）
+
+    # 株式数から求める項目
+    shares_outstanding = Column(Float)  # 期末発行済株式数（自己株式を含む）
+    treasury_shares = Column(Float)  # 期末自己株式数
+    market_cap = Column(Float)  # 時価総額（終値 × 自己株式を除く株式数）
+    per = Column(Float)  # PER（予想EPS基準）
+    pbr = Column(Float)  # PBR
+    dividend_yield = Column(Float)  # 予想配当利回り
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # スクリーニングでよく使う範囲条件用
+        Index("ix_latest_snapshot_market_cap", "market_cap"),
+        Index("ix_latest_snapshot_per", "per"),
+        Index("ix_latest_snapshot_pbr", "pbr"),
+    )
+
+
+class IndicatorState(Base):
+    """テクニカル指標の差分更新用の状態（銘柄×状態の種類）"""
+
+    __tablename__ = "indicator_state"
+
+    code = Column(String(10), primary_key=True)  # 銘柄コード
+    indicator = Column(String(30), primary_key=True)  # 状態の種類（ema_12, close_window など）
+    as_of = Column(Date)  # 反映済みの最終営業日
+    state = Column(LargeBinary)  # 状態の値（float64の配列）
+
+
+class TechnicalIndicator(Base):
+    """銘柄ごとの最新のテクニカル指標（差分更新の結果）"""
+
+    __tablename__ = "technical_indicators"
+
+    code = Column(String(10), primary_key=True)  # 銘柄コード
+    date = Column(Date)  # 指標の日付
+    sma_5 = Column(Float)  # 5日移動平均
+    sma_25 = Column(Float)  # 25日移動平均
+    sma_75 = Column(Float)  # 75日移動平均
+    ema_12 = Column(Float)  # 12日指数移動平均
+    ema_26 = Column(Float)  # 26日指数移動平均
+    macd = Column(Float)  # MACD
+    macd_signal = Column(Float)  # MACDシグナル
+    macd_diff = Column(Float)  # MACDヒストグラム
+    rsi_14 = Column(Float)  # RSI(14)
+    bb_mavg = Column(Float)  # ボリンジャーバンド中心線(20)
+    bb_hband = Column(Float)  # ボリンジャーバンド上限(+2σ)
+    bb_lband = Column(Float)  # ボリンジャーバンド下限(-2σ)
+    atr_14 = Column(Float)  # ATR(14)
+    volume_ratio_20 = Column(Float)  # 出来高倍率（前日までの20日平均比）
+
+
+class SyncState(Base):
+    """同期状態（データセット×日付ごとの完了記録）"""
+
+    __tablename__ = "sync_state"
+
+    dataset = Column(String(50), primary_key=True)  # データセット名（テーブル名）
+    date = Column(Date, primary_key=True)  # 対象日
+    row_count = Column(Integer)  # 取得件数
+    synced_at = Column(DateTime)  # 同期日時
+
+
+class DataVersion(Base):
+    """データセットごとの版数（書き込みのコミットごとに1つ進める）"""
+
+    __tablename__ = "data_versions"
+
+    dataset = Column(String(50), primary_key=True)  # データセット名（テーブル名）
+    version = Column(Integer, nullable=False, default=0)  # 版数
+    updated_at = Column(DateTime)  # 最終更新日時
+
+
+class SyncJob(Base):
+    """バックフィルのジョブジャーナル（データセット×日付の作業単位ごとの状態）"""
+
+    __tablename__ = "sync_jobs"
+
+    dataset = Column(String(50), primary_key=True)  # データセット名
+    date = Column(Date, primary_key=True)  # 対象日
+    status = Column(String(10), index=True)  # pending / running / done / failed
+    attempts = Column(Integer, default=0)  # 実行回数
+    last_error = Column(Text)  # 直近のエラー
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
@@ -0,0 +1,249 @@
+"""APIレスポンスのディスクキャッシュ
+
+エンドポイント＋正規化したパラメータのハッシュをキーに、
+ページングされたレスポンスの全ページをまとめてgzip圧縮し data/cache に保存する。
+（ページ単位で保存すると続きのページだけが追い出されたとき、
+キャッシュにあった古い pagination_key を実APIへ送ってしまうため）
+
+- 確定済みの過去日付を対象とするレスポンスは無期限（不変）
+- 直近日付や日付指定のないレスポンスはTTLで失効
+- 合計サイズが上限を超えたら最終アクセスの古い順に削除（LRU）
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+from config import CACHE_DIR, config
+from services.decoding import loads
+
+logger = logging.getLogger(__name__)
+
+# 過去データが変化しないエンドポイント
+IMMUTABLE_ENDPOINTS = {
+    "/equities/bars/daily",
+    "/fins/summary",
+    "/fins/details",
+    "/fins/dividend",
+    "/indices/bars/daily",
+    "/markets/margin-interest",
+    "/markets/short-ratio",
+}
+
+# エントリの形式を変えたら上げる（古い形式のエントリはキーが一致せずLRUで消える）
+KEY_VERSION = 2
+
+
+def _normalize_params(params: Optional[dict]) -> dict:
+    """キー順・値の型を揃えたパラメータを返す"""
+    if not params:
+        return {}
+    return {k: str(v) for k, v in sorted(params.items()) if v is not None}
+
+
+def _parse_date(value: str) -> Optional[date]:
+    for fmt in ("%Y%m%d", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+class ResponseCache:
+    """圧縮・コンテンツアドレス方式のレスポンスキャッシュ"""
+
+    def __init__(
+        self,
+        directory: Path = CACHE_DIR / "responses",
+        max_bytes: int = config.cache.max_bytes,
+        ttl_seconds: int = config.cache.ttl_seconds,
+        immutable_after_days: int = config.cache.immutable_after_days,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.immutable_after_days = immutable_after_days
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._total_bytes = sum(p.stat().st_size for p in self._iter_files())
+
+    # ─── キー ───
+
+    def key(self, endpoint: str, params: Optional[dict] = None) -> str:
+        """エンドポイント＋正規化パラメータのハッシュ"""
+        payload = json.dumps(
+            {"version": KEY_VERSION, "endpoint": endpoint, "params": _normalize_params(params)},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json.gz"
+
+    def _iter_files(self):
+        return self.directory.glob("*/*.json.gz")
+
+    def is_immutable(self, endpoint: str, params: Optional[dict] = None) -> bool:
+        """確定済みの過去日付のみを対象とするリクエストか"""
+        if endpoint not in IMMUTABLE_ENDPOINTS or not params:
+            return False
+        # 単日指定ならその日、期間指定なら終了日で判定（終了日なしは未確定）
+        value = params.get("date") or params.get("to")
+        if not value:
+            return False
+        last_date = _parse_date(str(value))
+        if last_date is None:
+            return False
+        return last_date <= date.today() - timedelta(days=self.immutable_after_days)
+
+    # ─── 読み書き ───
+
+    def get(self, endpoint: str, params: Optional[dict] = None) -> Optional[List[dict]]:
+        """キャッシュからレスポンスの全ページを取得（なければNone）"""
+        path = self._path(self.key(endpoint, params))
+        try:
+            with gzip.open(path, "rb") as f:
+                entry = loads(f.read())
+        except FileNotFoundError:
+            self._count(hit=False)
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"キャッシュ破損のため削除: {path.name} ({e})")
+            self._remove(path)
+            self._count(hit=False)
+            return None
+
+        expires_at = entry.get("expires_at")
+        if expires_at is not None and expires_at < time.time():
+            self._remove(path)
+            self._count(hit=False)
+            return None
+
+        # LRU判定用に最終アクセス時刻を更新
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count(hit=True)
+        return entry["body"]
+
+    def put(self, endpoint: str, params: Optional[dict], pages: List[dict]):
+        """レスポンスの全ページをキャッシュに保存（params は最初のページのもの）"""
+        expires_at = None
+        if not self.is_immutable(endpoint, params):
+            if self.ttl_seconds <= 0:
+                return
+            expires_at = time.time() + self.ttl_seconds
+
+        entry = {
+            "endpoint": endpoint,
+            "params": _normalize_params(params),
+            "expires_at": expires_at,
+            "body": pages,
+        }
+        data = gzip.compress(
+            json.dumps(entry, ensure_ascii=False).encode("utf-8"), compresslevel=6
+        )
+
+        path = self._path(self.key(endpoint, params))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".tmp{threading.get_ident()}")
+        old_size = path.stat().st_size if path.exists() else 0
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._total_bytes += len(data) - old_size
+            over = self._total_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self):
+        """合計サイズが上限の90%以下になるまで古いエントリから削除"""
+        target = int(self.max_bytes * 0.9)
+        files = []
+        for p in self._iter_files():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        files.sort()
+
+        with self._lock:
+            total = sum(size for _, size, _ in files)
+            for _, size, p in files:
+                if total <= target:
+                    break
+                try:
+                    p.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self.evictions += 1
+            self._total_bytes = total
+
+    def clear(self):
+        """キャッシュを全削除"""
+        for p in self._iter_files():
+            p.unlink(missing_ok=True)
+        with self._lock:
+            self._total_bytes = 0
+
+    def _remove(self, path: Path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._total_bytes -= size
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    # ─── 統計 ───
+
+    def stats(self) -> dict:
+        """ヒット/ミス数とサイズ"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_shared_cache: Optional[ResponseCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """プロセス共有のレスポンスキャッシュを取得（無効時はNone）"""
+    global _shared_cache
+    if not config.cache.enabled:
+        return None
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache()
+        return _shared_cache
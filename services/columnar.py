@@ -0,0 +1,217 @@
+"""株価の列指向ストア（Parquet）
+
+日足株価を data/columnar/daily_prices/year=YYYY/month=MM/YYYY-MM-DD.parquet に
+1営業日1ファイルで保存する。読み取りは必要な列だけを読み（列の射影）、
+日付・銘柄コードの条件をファイル（パーティション）と行グループの統計で絞り込む。
+
+pyarrow は任意の依存。未インストールの場合は available() が False になり、
+SyncService からの書き込みは行われない。
+"""
+
+import logging
+import os
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+from config import config
+from services.corporate_actions import register_invalidator
+from services.datasets import frame_to_records
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # 未インストールなら列指向ストアは無効
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# 株価の列（DailyPriceの列名と同じ）
+PRICE_FIELDS = (
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "turnover_value",
+    "adjustment_factor",
+    "adjustment_open",
+    "adjustment_high",
+    "adjustment_low",
+    "adjustment_close",
+    "adjustment_volume",
+)
+
+
+def available() -> bool:
+    """pyarrow が使えるか"""
+    return pa is not None
+
+
+def _schema():
+    return pa.schema(
+        [("code", pa.string()), ("date", pa.date32())]
+        + [(name, pa.float64()) for name in PRICE_FIELDS]
+    )
+
+
+class PriceStore:
+    """年月パーティションのParquetに保存する株価ストア"""
+
+    def __init__(self, directory: Optional[Path] = None):
+        if not available():
+            raise ImportError("列指向ストアには pyarrow が必要です（pip install pyarrow）")
+        self.directory = Path(directory or config.columnar.directory) / "daily_prices"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.schema = _schema()
+        self._lock = threading.Lock()
+
+    def _path(self, target_date: date) -> Path:
+        return (
+            self.directory
+            / f"year={target_date.year}"
+            / f"month={target_date.month:02d}"
+            / f"{target_date.isoformat()}.parquet"
+        )
+
+    # ─── 書き込み ───
+
+    def write(self, records: List[dict]) -> int:
+        """株価レコード（DailyPriceの列名）を日付ごとのファイルに反映
+
+        同じ日付・銘柄の行は新しい値で置き換えるため、再同期しても重複しない。
+        """
+        if not records:
+            return 0
+        table = pa.Table.from_pylist(
+            [{name: r.get(name) for name in self.schema.names} for r in records],
+            schema=self.schema,
+        )
+        written = 0
+        with self._lock:
+            dates = pc.unique(table["date"]).to_pylist()
+            for target_date in dates:
+                if target_date is None:
+                    continue
+                part = table.filter(pc.equal(table["date"], pa.scalar(target_date, pa.date32())))
+                self._write_date(target_date, part)
+                written += part.num_rows
+        return written
+
+    def _write_date(self, target_date: date, part):
+        path = self._path(target_date)
+        if path.exists():
+            # 既存ファイルの行のうち、今回の銘柄以外を残してマージする
+            existing = pq.read_table(path, schema=self.schema)
+            keep = pc.invert(pc.is_in(existing["code"], value_set=part["code"]))
+            part = pa.concat_tables([existing.filter(keep), part])
+
+        # 銘柄コード順に並べると、コード条件で行グループを読み飛ばせる
+        part = part.sort_by("code")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # "." 始まりのファイルはデータセットの探索対象外になる
+        tmp = path.parent / f".{path.name}.tmp{threading.get_ident()}"
+        pq.write_table(part, tmp, compression="zstd", row_group_size=1000)
+        os.replace(tmp, path)
+
+    # ─── 読み取り ───
+
+    def dataset(self):
+        """Arrowのデータセット（year/month のHiveパーティション）"""
+        return ds.dataset(
+            self.directory,
+            format="parquet",
+            partitioning=ds.partitioning(
+                pa.schema([("year", pa.int16()), ("month", pa.int8())]), flavor="hive"
+            ),
+        )
+
+    def read_table(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        codes: Optional[Iterable[str]] = None,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+    ):
+        """条件に合う株価をArrowのテーブルで返す
+
+        columns は code・date 以外に読む列（省略時は全列）。
+        日付条件は年月パーティションの絞り込みと行の絞り込みの両方に使う。
+        """
+        names = ["code", "date"] + [c for c in (columns or PRICE_FIELDS) if c not in ("code", "date")]
+        unknown = set(names) - set(self.schema.names)
+        if unknown:
+            raise ValueError(f"未知の列: {sorted(unknown)}")
+
+        expr = None
+
+        def _and(cond):
+            nonlocal expr
+            expr = cond if expr is None else expr & cond
+
+        year, month = ds.field("year"), ds.field("month")
+        if from_date is not None:
+            _and((year > from_date.year) | ((year == from_date.year) & (month >= from_date.month)))
+            _and(ds.field("date") >= pa.scalar(from_date, pa.date32()))
+        if to_date is not None:
+            _and((year < to_date.year) | ((year == to_date.year) & (month <= to_date.month)))
+            _and(ds.field("date") <= pa.scalar(to_date, pa.date32()))
+        if codes is not None:
+            _and(ds.field("code").isin(list(codes)))
+
+        if not any(self.directory.rglob("*.parquet")):
+            return self.schema.empty_table().select(names)
+        return self.dataset().to_table(columns=names, filter=expr)
+
+    def read_frame(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        codes: Optional[Iterable[str]] = None,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+    ) -> pd.DataFrame:
+        """条件に合う株価をDataFrameで返す（code, date 順）"""
+        table = self.read_table(columns, codes, from_date, to_date)
+        df = table.to_pandas()
+        if df.empty:
+            return df
+        df["date"] = pd.to_datetime(df["date"])
+        return df.sort_values(["code", "date"], ignore_index=True)
+
+    def dates(self) -> List[date]:
+        """保存済みの日付"""
+        return sorted(date.fromisoformat(p.stem) for p in self.directory.rglob("*.parquet"))
+
+
+_shared_store: Optional[PriceStore] = None
+_shared_lock = threading.Lock()
+
+
+def get_price_store() -> Optional[PriceStore]:
+    """プロセス共有の株価ストアを取得（無効・pyarrow未インストール時はNone）"""
+    global _shared_store
+    if not config.columnar.enabled:
+        return None
+    if not available():
+        logger.warning("列指向ストアが有効ですが pyarrow が未インストールのため無効化します")
+        config.columnar.enabled = False
+        return None
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = PriceStore()
+        return _shared_store
+
+
+def _refresh_adjusted(codes: List[str], prices: pd.DataFrame):
+    """調整後株価を計算し直した銘柄の行を日付ごとのファイルで置き換える"""
+    store = get_price_store()
+    if store is not None and not prices.empty:
+        store.write(frame_to_records(prices))
+
+
+register_invalidator("columnar", _refresh_adjusted)
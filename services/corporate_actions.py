@@ -0,0 +1,265 @@
+"""コーポレートアクション（株式分割・併合）への対応
+
+株価の日足は、衝突時に終値・出来高・調整後終値・調整係数だけを更新する。
+そのため分割・併合（調整係数 != 1）の日が取り込まれても、それより前の日の
+調整後始値・高値・安値・出来高は古い基準のまま残る。
+
+ここでは株価の書き込み時に、DBにまだない調整係数（この取り込みで新しく現れた
+分割・併合）をイベントとして扱い、その銘柄のイベント日より前の保存済みの行を
+最新の基準にそろえる。各行がどの基準で保存されているかは実行ごとの状態ではなく
+保存済みの値から判定する。
+
+    期待する比率(d) = 基準比率 × Π 係数(e)   （d < e ≦ 最新のイベント日の保存済み・取り込み中の係数）
+    保存済みの比率(d) = 調整後終値(d) / 終値(d)
+
+基準比率は取り込み中のイベント日の行（APIの最新の基準）の 調整後終値 / 終値。
+保存済みの比率が期待する比率に一致する行（すでに最新の基準）と、新しいイベントの
+係数の分だけずれている行（イベントより前に取得した行）は、未調整の値から調整後OHLCVを
+計算し直す。どちらでもない行（間に未取得の期間があり係数が分からないなど）は触らない。
+保存済みの値から判定するため、再開・リトライ・複数回に分けたバックフィルで同じ分割を
+二重に反映することはない。書き込みと同じトランザクションで行い、保存済みの係数の
+再取り込みは何もしない。調整後株価を更新した銘柄は実行の最後に登録された派生データ
+（株価キューブなど）へ通知する。
+"""
+
+import logging
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, bindparam, or_, select, update
+from sqlalchemy.engine import Connection
+
+from db.database import get_read_session
+from models.schemas import DailyPrice
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 調整後の列 → 未調整の列
+ADJUSTED_PRICE_COLUMNS = {
+    "adjustment_open": "open",
+    "adjustment_high": "high",
+    "adjustment_low": "low",
+    "adjustment_close": "close",
+}
+ADJUSTED_VOLUME_COLUMNS = {"adjustment_volume": "volume"}
+
+PRICE_COLUMNS = (
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "turnover_value",
+    "adjustment_factor",
+    *ADJUSTED_PRICE_COLUMNS,
+    *ADJUSTED_VOLUME_COLUMNS,
+)
+
+# 1回のSELECTで扱う銘柄数・イベント数
+CODE_CHUNK_SIZE = 200
+
+# 保存済みの比率と期待する比率を同じとみなす相対誤差
+BASIS_TOLERANCE = 1e-6
+
+# 派生データの無効化フック: 名前 → fn(codes, prices)
+# prices は更新後の該当銘柄の全期間（code, date, PRICE_COLUMNS の縦持ち）
+Invalidator = Callable[[List[str], pd.DataFrame], None]
+INVALIDATORS: Dict[str, Invalidator] = {}
+
+
+def register_invalidator(name: str, fn: Invalidator):
+    """調整後株価を更新した銘柄の派生データを無効化する関数を登録"""
+    INVALIDATORS[name] = fn
+
+
+def detect_adjustments(records: Iterable[dict]) -> List[Tuple[str, date, float]]:
+    """調整係数が 1 以外の行の (銘柄コード, 日付, 調整係数)"""
+    events = []
+    for r in records:
+        factor = r.get("adjustment_factor")
+        if factor is not None and factor == factor and factor != 1:  # NaNを除く
+            events.append((r["code"], r["date"], float(factor)))
+    return sorted(events)
+
+
+def stored_factors(conn: Connection, events: List[Tuple[str, date, float]]) -> Dict[Tuple[str, date], float]:
+    """イベントの (銘柄コード, 日付) について保存済みの調整係数"""
+    stored = {}
+    for start in range(0, len(events), CODE_CHUNK_SIZE):
+        chunk = events[start:start + CODE_CHUNK_SIZE]
+        keys = or_(*(and_(DailyPrice.code == code, DailyPrice.date == day) for code, day, _ in chunk))
+        rows = conn.execute(
+            select(DailyPrice.code, DailyPrice.date, DailyPrice.adjustment_factor).where(keys)
+        ).all()
+        stored.update({(row.code, row.date): row.adjustment_factor for row in rows})
+    return stored
+
+
+def _suffix_products(factors: List[float]) -> np.ndarray:
+    """各位置以降の係数の積（末尾に 1 を付けた長さ len+1）"""
+    out = np.ones(len(factors) + 1)
+    for i in range(len(factors) - 1, -1, -1):
+        out[i] = out[i + 1] * factors[i]
+    return out
+
+
+def _close_to(values: np.ndarray, expected: np.ndarray) -> np.ndarray:
+    """相対誤差 BASIS_TOLERANCE 以内か（NaNは False）"""
+    with np.errstate(invalid="ignore"):
+        return np.abs(values - expected) <= BASIS_TOLERANCE * np.abs(expected)
+
+
+def _nullable(value: float):
+    return float(value) if np.isfinite(value) else None
+
+
+class CorporateActionHandler:
+    """新しく現れた調整係数で保存済みの調整後株価をそろえ、派生データへ通知する"""
+
+    def rescale(self, conn: Connection, records: List[dict]) -> List[str]:
+        """書き込む株価レコードのうちDBにない調整係数をイベントとして反映し、銘柄コードを返す
+
+        レコードのUPSERTより前に、同じトランザクションで呼ぶ（コミットは呼び出し側）。
+        """
+        events = detect_adjustments(records)
+        if not events:
+            return []
+        stored = stored_factors(conn, events)
+        events = [(code, day, f) for code, day, f in events if stored.get((code, day)) != f]
+        if not events:
+            return []
+
+        incoming: Dict[str, Dict[date, dict]] = {}
+        for r in records:
+            incoming.setdefault(r["code"], {})[r["date"]] = r
+        new_events: Dict[str, List[Tuple[date, float]]] = {}
+        for code, day, f in events:
+            new_events.setdefault(code, []).append((day, f))
+
+        rows = 0
+        with metrics.timer("corporate_action_seconds"):
+            for code, code_events in new_events.items():
+                rows += self._rebase(conn, code, code_events, incoming[code])
+        codes = sorted(new_events)
+        metrics.inc("corporate_action_codes_total", len(codes))
+        logger.info(f"分割・併合を反映: {len(events)}件 / {len(codes)}銘柄 / {rows}行")
+        return codes
+
+    def _rebase(
+        self, conn: Connection, code: str, new_events: List[Tuple[date, float]], incoming: Dict[date, dict]
+    ) -> int:
+        """1銘柄の最新のイベント日より前の保存済みの行を最新の基準にそろえ、更新した行数を返す"""
+        latest = max(day for day, _ in new_events)
+        anchor = incoming[latest]
+        if not anchor.get("close") or anchor.get("adjustment_close") is None:
+            logger.warning(f"分割・併合の基準比率を決められないため反映しません: {code} {latest}")
+            return 0
+        base = anchor["adjustment_close"] / anchor["close"]
+
+        # 最新のイベント日までの係数（保存済み＋取り込み中）
+        chain = dict(
+            conn.execute(
+                select(DailyPrice.date, DailyPrice.adjustment_factor).where(
+                    DailyPrice.code == code,
+                    DailyPrice.date < latest,
+                    DailyPrice.adjustment_factor.isnot(None),
+                    DailyPrice.adjustment_factor != 1,
+                )
+            ).all()
+        )
+        chain.update({day: f for _, day, f in detect_adjustments(incoming.values()) if day <= latest})
+        chain_days = sorted(chain)
+        chain_products = _suffix_products([chain[d] for d in chain_days])
+        # 新しいイベントは取得時点で未反映だった可能性がある（未反映なのは日付の遅い側から）
+        new_days = sorted(day for day, _ in new_events)
+        new_factors = dict(new_events)
+        new_products = _suffix_products([new_factors[d] for d in new_days])
+
+        adjusted = [*ADJUSTED_PRICE_COLUMNS, *ADJUSTED_VOLUME_COLUMNS]
+        raw = [*ADJUSTED_PRICE_COLUMNS.values(), *ADJUSTED_VOLUME_COLUMNS.values()]
+        result = conn.execute(
+            select(DailyPrice.date, *(getattr(DailyPrice, c) for c in raw + adjusted))
+            .where(DailyPrice.code == code, DailyPrice.date < latest)
+            .order_by(DailyPrice.date)
+        )
+        stored = pd.DataFrame(result.all(), columns=list(result.keys()))
+        if stored.empty:
+            return 0
+        stored[raw + adjusted] = stored[raw + adjusted].astype(float)
+
+        days = np.array(stored["date"].tolist(), dtype="datetime64[D]")
+        after = np.searchsorted(np.array(chain_days, dtype="datetime64[D]"), days, side="right")
+        expected = base * chain_products[after]
+        first_new = np.searchsorted(np.array(new_days, dtype="datetime64[D]"), days, side="right")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = stored["adjustment_close"].to_numpy() / stored["close"].to_numpy()
+        matched = np.zeros(len(stored), dtype=bool)
+        for k, missing in enumerate(new_products):
+            matched |= (k >= first_new) & _close_to(ratio * missing, expected)
+
+        values = {c: stored[c].to_numpy() * expected for c in ADJUSTED_PRICE_COLUMNS.values()}
+        values.update({c: stored[c].to_numpy() / expected for c in ADJUSTED_VOLUME_COLUMNS.values()})
+        changed = np.zeros(len(stored), dtype=bool)
+        for adj, col in zip(adjusted, raw):
+            current = stored[adj].to_numpy()
+            changed |= ~(_close_to(current, values[col]) | (np.isnan(current) & np.isnan(values[col])))
+        update_rows = matched & changed
+
+        skipped = int((~matched & np.isfinite(ratio)).sum())
+        if skipped:
+            logger.warning(f"分割・併合の反映で基準を判定できない行をそのままにしました: {code} {skipped}行")
+        if not update_rows.any():
+            return 0
+
+        stmt = (
+            update(DailyPrice)
+            .where(DailyPrice.code == bindparam("b_code"), DailyPrice.date == bindparam("b_date"))
+            .values({adj: bindparam(f"b_{adj}") for adj in adjusted})
+        )
+        params = [
+            {
+                "b_code": code,
+                "b_date": stored["date"].iat[i],
+                **{f"b_{adj}": _nullable(values[col][i]) for adj, col in zip(adjusted, raw)},
+            }
+            for i in np.flatnonzero(update_rows)
+        ]
+        conn.execute(stmt, params)
+        return len(params)
+
+    def notify(self, codes: Iterable[str]) -> pd.DataFrame:
+        """調整後株価を更新した銘柄の全期間を読み込んで派生データへ通知し、その株価を返す"""
+        codes = sorted(set(codes))
+        if not codes:
+            return pd.DataFrame(columns=["code", "date", *PRICE_COLUMNS])
+
+        columns = [DailyPrice.code, DailyPrice.date] + [getattr(DailyPrice, c) for c in PRICE_COLUMNS]
+        frames = []
+        session = get_read_session()
+        try:
+            conn = session.connection()
+            for start in range(0, len(codes), CODE_CHUNK_SIZE):
+                chunk = codes[start:start + CODE_CHUNK_SIZE]
+                frames.append(
+                    pd.read_sql(
+                        select(*columns).where(DailyPrice.code.in_(chunk)).order_by(DailyPrice.code, DailyPrice.date),
+                        conn,
+                    )
+                )
+        finally:
+            session.close()
+
+        prices = pd.concat(frames, ignore_index=True)
+        self.invalidate(codes, prices)
+        return prices
+
+    def invalidate(self, codes: List[str], prices: pd.DataFrame):
+        """登録された派生データへ通知（DBが正のため失敗は警告のみ）"""
+        for name, fn in list(INVALIDATORS.items()):
+            try:
+                fn(codes, prices)
+            except Exception as e:
+                logger.warning(f"派生データ {name} の無効化に失敗: {e}")
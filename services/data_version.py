@@ -0,0 +1,65 @@
+"""データセットの版数（data_versions）
+
+SyncService が書き込みをコミットするたびに、データセットごとの版数を1つ進める。
+読み取り側は版数を比べるだけで元データが変わったかを判定できる
+（スクリーニング結果のキャッシュのキーに使う）。
+
+版数はコミットの後に進める。先に進めると、その間に読み取った古いデータが
+新しい版数で保存されてしまうため。
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Iterable
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from db.database import get_read_session, get_session
+from models.schemas import DataVersion
+
+logger = logging.getLogger(__name__)
+
+# 同期で作り直す派生データ（元データのテーブル名と並ぶデータセット名）
+DATASET_STOCKS = "stocks"
+DATASET_LATEST_SNAPSHOT = "latest_snapshot"
+DATASET_PRICE_CUBE = "price_cube"
+DATASET_TECHNICAL_INDICATORS = "technical_indicators"
+DATASET_FUNDAMENTALS = "fundamentals"
+
+
+def bump_versions(datasets: Iterable[str]):
+    """データセットの版数を1つ進める（コミットの後に呼ぶ）"""
+    datasets = sorted(set(datasets))
+    if not datasets:
+        return
+    now = datetime.utcnow()
+    stmt = insert(DataVersion)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["dataset"],
+        set_={"version": DataVersion.version + 1, "updated_at": now},
+    )
+    session = get_session()
+    try:
+        session.execute(stmt, [{"dataset": d, "version": 1, "updated_at": now} for d in datasets])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_versions(datasets: Iterable[str]) -> Dict[str, int]:
+    """データセットの版数（一度も書き込まれていなければ0）"""
+    datasets = sorted(set(datasets))
+    session = get_read_session()
+    try:
+        rows = session.execute(
+            select(DataVersion.dataset, DataVersion.version).where(DataVersion.dataset.in_(datasets))
+        ).all()
+    finally:
+        session.close()
+    versions = dict.fromkeys(datasets, 0)
+    versions.update({dataset: version for dataset, version in rows})
+    return versions
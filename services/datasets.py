@@ -0,0 +1,327 @@
+"""同期対象データセットの定義
+
+J-Quants APIのエンドポイントとDBテーブルの対応を宣言的に登録する。
+各データセットは取得先エンドポイント・保存先モデル・自然キー・列の対応・
+日付軸を持ち、SyncService の汎用エンジンが同じ書き込み経路
+（一括変換＋チャンク単位のUPSERT）と差分同期で処理する。
+"""
+
+import json
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from models.schemas import (
+    DailyPrice,
+    Dividend,
+    EarningsAnnouncement,
+    FinancialDetail,
+    FinancialSummary,
+    IndexPrice,
+    MarginInterest,
+    ShortRatio,
+)
+
+# データセット名（保存先のテーブル名と同じ）
+DATASET_DAILY_PRICES = "daily_prices"
+DATASET_FIN_SUMMARY = "financial_summaries"
+DATASET_FIN_DETAILS = "financial_details"
+DATASET_DIVIDENDS = "dividends"
+DATASET_EARNINGS_CALENDAR = "earnings_announcements"
+DATASET_MARGIN_INTEREST = "margin_interests"
+DATASET_SHORT_RATIO = "short_ratios"
+DATASET_INDEX_PRICES = "index_prices"
+
+# 日付軸
+DATE_AXIS_DAILY = "daily"  # date=YYYYMMDD で1日分ずつ取得
+DATE_AXIS_SNAPSHOT = "snapshot"  # 日付指定なしで現時点の全件を取得
+
+# 株価APIの列名 → DailyPriceの列名
+PRICE_COLUMNS = {
+    "Code": "code",
+    "Date": "date",
+    "O": "open",
+    "H": "high",
+    "L": "low",
+    "C": "close",
+    "Vo": "volume",
+    "Va": "turnover_value",
+    "AdjFactor": "adjustment_factor",
+    "AdjO": "adjustment_open",
+    "AdjH": "adjustment_high",
+    "AdjL": "adjustment_low",
+    "AdjC": "adjustment_close",
+    "AdjVo": "adjustment_volume",
+}
+
+# 財務サマリAPIの数値列名 → FinancialSummaryの列名
+FIN_SUMMARY_NUMERIC_COLUMNS = {
+    "Sales": "net_sales",
+    "OP": "operating_profit",
+    "OdP": "ordinary_profit",
+    "NP": "profit",
+    "EPS": "earnings_per_share",
+    "FSales": "forecast_net_sales",
+    "FOP": "forecast_operating_profit",
+    "FOdP": "forecast_ordinary_profit",
+    "FNP": "forecast_profit",
+    "FEPS": "forecast_earnings_per_share",
+    "TA": "total_assets",
+    "Eq": "equity",
+    "EqAR": "equity_to_asset_ratio",
+    "BPS": "book_value_per_share",
+    "CFO": "cash_flows_from_operating",
+    "CFI": "cash_flows_from_investing",
+    "CFF": "cash_flows_from_financing",
+    "DivTotalAnn": "result_dividend_per_share_annual",
+    "FDivTotalAnn": "forecast_dividend_per_share_annual",
+    "ShOutFY": "shares_outstanding",
+    "TrShFY": "treasury_shares",
+}
+
+
+# ─── 変換ヘルパー ───
+
+
+def column_values(series: pd.Series) -> list:
+    """列をDBに渡せる値のリストに変換（NaN/NaTはNone、日時はdate）"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        series = series.dt.date
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def frame_to_records(df: pd.DataFrame, columns: Optional[Dict[str, str]] = None) -> List[dict]:
+    """APIの列名をDBの列名に変換したレコードのリストを作る（列単位で一括変換）
+
+    columns を省略した場合は列名をそのまま使う。
+    """
+    if columns is None:
+        columns = {c: c for c in df.columns}
+    names = []
+    values = []
+    for src, dst in columns.items():
+        names.append(dst)
+        if src in df.columns:
+            values.append(column_values(df[src]))
+        else:
+            values.append([None] * len(df))
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def text_column(df: pd.DataFrame, name: str) -> pd.Series:
+    """文字列列（欠損は空文字）"""
+    if name not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[name].astype(object).where(df[name].notna(), "").astype(str)
+
+
+def financial_summary_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """財務サマリAPIの結果をFinancialSummaryの列に変換（列単位で一括変換）"""
+    out = pd.DataFrame(index=df.index)
+    out["code"] = df["Code"].astype(str)
+    out["disclosed_date"] = pd.to_datetime(df.get("DiscDate"), errors="coerce")
+    # 自然キーの列はNULLにしない（一意インデックスでNULLは重複扱いにならないため）
+    out["disclosed_time"] = text_column(df, "DiscTime")
+    out["type_of_document"] = text_column(df, "DocType")
+
+    fy_start = pd.to_datetime(df.get("CurFYSt"), errors="coerce")
+    out["fiscal_year"] = pd.Series(fy_start, index=df.index).dt.strftime("%Y")
+    # "1Q"〜"4Q" → 1〜4（FYなどは欠損）
+    out["fiscal_quarter"] = (
+        text_column(df, "CurPerType").str.extract(r"([1-4])Q", expand=False).astype(float)
+    )
+
+    for src, dst in FIN_SUMMARY_NUMERIC_COLUMNS.items():
+        if src in df.columns:
+            out[dst] = pd.to_numeric(df[src], errors="coerce")
+        else:
+            out[dst] = float("nan")
+
+    return out
+
+
+def financial_details_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """財務諸表APIの結果をFinancialDetailの列に変換（諸表の項目はJSONで保存）"""
+    out = pd.DataFrame(index=df.index)
+    out["code"] = df["Code"].astype(str)
+    out["disclosed_date"] = pd.to_datetime(df.get("DiscDate"), errors="coerce")
+    out["disclosed_time"] = text_column(df, "DiscTime")
+    out["type_of_document"] = text_column(df, "DocType")
+    statements = df["FS"] if "FS" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    out["statements"] = statements.map(
+        lambda v: json.dumps(v, ensure_ascii=False) if v is not None else None
+    )
+    return out
+
+
+# ─── 登録 ───
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    """エンドポイントとテーブルの対応定義"""
+
+    name: str  # データセット名（＝テーブル名）
+    endpoint: str  # APIエンドポイント
+    data_key: str  # レスポンス中のデータのキー
+    model: type  # 保存先モデル
+    natural_key: Tuple[str, ...]  # UPSERTの衝突判定に使う列
+    columns: Optional[Dict[str, str]] = None  # APIの列名 → DBの列名
+    transform: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None  # columns の代わりの変換処理
+    date_axis: str = DATE_AXIS_DAILY
+    update_columns: Optional[Tuple[str, ...]] = None  # 衝突時に更新する列（None は自然キー以外の全列）
+    empty_means_missing: bool = False  # 営業日に0件なら未提供とみなし、完了記録を残さない
+
+    def params_for(self, target_date: date) -> dict:
+        """作業単位の取得パラメータ"""
+        if self.date_axis == DATE_AXIS_DAILY:
+            return {"date": target_date.strftime("%Y%m%d")}
+        return {}
+
+    def to_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """取得結果をDBの列名のDataFrameに変換"""
+        if self.transform is not None:
+            out = self.transform(df)
+        else:
+            out = pd.DataFrame(index=df.index)
+            for src, dst in self.columns.items():
+                out[dst] = df[src] if src in df.columns else None
+
+        # 文字列の自然キーは空文字で埋め、日付などが欠損した行は捨てる
+        for key in self.natural_key:
+            if not pd.api.types.is_datetime64_any_dtype(out[key]):
+                out[key] = text_column(out, key)
+        return out.dropna(subset=list(self.natural_key))
+
+    def to_records(self, df: pd.DataFrame) -> List[dict]:
+        """取得結果をDB書き込み用のレコードに変換"""
+        if df.empty:
+            return []
+        return frame_to_records(self.to_frame(df))
+
+
+DATASETS: Dict[str, DatasetSpec] = {
+    spec.name: spec
+    for spec in (
+        DatasetSpec(
+            name=DATASET_DAILY_PRICES,
+            endpoint="/equities/bars/daily",
+            data_key="equities_bars_daily",
+            model=DailyPrice,
+            natural_key=("code", "date"),
+            columns=PRICE_COLUMNS,
+            update_columns=("close", "volume", "adjustment_close", "adjustment_factor"),
+            empty_means_missing=True,
+        ),
+        DatasetSpec(
+            name=DATASET_FIN_SUMMARY,
+            endpoint="/fins/summary",
+            data_key="fins_summary",
+            model=FinancialSummary,
+            natural_key=("code", "disclosed_date", "disclosed_time", "type_of_document"),
+            transform=financial_summary_frame,
+        ),
+        DatasetSpec(
+            name=DATASET_FIN_DETAILS,
+            endpoint="/fins/details",
+            data_key="fins_details",
+            model=FinancialDetail,
+            natural_key=("code", "disclosed_date", "disclosed_time", "type_of_document"),
+            transform=financial_details_frame,
+        ),
+        DatasetSpec(
+            name=DATASET_DIVIDENDS,
+            endpoint="/fins/dividend",
+            data_key="fins_dividend",
+            model=Dividend,
+            natural_key=("code", "announcement_date", "reference_number"),
+            columns={
+                "Code": "code",
+                "PubDate": "announcement_date",
+                "PubTime": "announcement_time",
+                "RefNo": "reference_number",
+                "RecDate": "record_date",
+                "ExDate": "ex_date",
+                "PayDate": "payable_date",
+                "DivRate": "dividend_rate",
+            },
+        ),
+        DatasetSpec(
+            name=DATASET_EARNINGS_CALENDAR,
+            endpoint="/equities/earnings-calendar",
+            data_key="earnings_calendar",
+            model=EarningsAnnouncement,
+            natural_key=("code", "date"),
+            columns={
+                "Code": "code",
+                "Date": "date",
+                "CoName": "company_name",
+                "FY": "fiscal_year",
+                "SectorNm": "sector_name",
+                "FQ": "fiscal_quarter",
+                "Section": "section",
+            },
+            date_axis=DATE_AXIS_SNAPSHOT,
+        ),
+        DatasetSpec(
+            name=DATASET_MARGIN_INTEREST,
+            endpoint="/markets/margin-interest",
+            data_key="margin_interest",
+            model=MarginInterest,
+            natural_key=("code", "date"),
+            columns={
+                "Code": "code",
+                "Date": "date",
+                "ShrtVol": "short_volume",
+                "LongVol": "long_volume",
+                "ShrtNegVol": "short_negotiable_volume",
+                "LongNegVol": "long_negotiable_volume",
+                "ShrtStdVol": "short_standardized_volume",
+                "LongStdVol": "long_standardized_volume",
+                "IssType": "issue_type",
+            },
+        ),
+        DatasetSpec(
+            name=DATASET_SHORT_RATIO,
+            endpoint="/markets/short-ratio",
+            data_key="short_ratio",
+            model=ShortRatio,
+            natural_key=("date", "sector33_code"),
+            columns={
+                "Date": "date",
+                "S33": "sector33_code",
+                "SellExShortVa": "selling_excluding_short_value",
+                "ShrtWithResVa": "short_with_restrictions_value",
+                "ShrtNoResVa": "short_without_restrictions_value",
+            },
+        ),
+        DatasetSpec(
+            name=DATASET_INDEX_PRICES,
+            endpoint="/indices/bars/daily",
+            data_key="indices_bars_daily",
+            model=IndexPrice,
+            natural_key=("code", "date"),
+            columns={
+                "Code": "code",
+                "Date": "date",
+                "O": "open",
+                "H": "high",
+                "L": "low",
+                "C": "close",
+            },
+        ),
+    )
+}
+
+# 全データセット（incremental_sync(datasets=ALL_DATASETS) で全て差分同期）
+ALL_DATASETS = tuple(DATASETS)
+
+
+def get_dataset(name: str) -> DatasetSpec:
+    """データセット定義を取得"""
+    try:
+        return DATASETS[name]
+    except KeyError:
+        raise ValueError(f"未対応のデータセット: {name}") from None
@@ -0,0 +1,222 @@
+"""APIレスポンスの型付きデコード
+
+エンドポイントごとのスキーマに従い、レコード(dict)のリストを
+列ごとのNumPy配列へ直接変換してDataFrameを組み立てる。
+pandasの型推論（object型の中間DataFrame）を経由しないため、
+全銘柄×長期間のデータでもデコードが速く、メモリも小さい。
+"""
+
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from services.metrics import metrics
+
+try:
+    import orjson
+except ImportError:  # 未インストールなら標準のjsonを使う
+    orjson = None
+
+
+def loads(data: bytes):
+    """JSONをデコード（orjsonがあれば優先）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# 列の型
+# category: カテゴリ型 / str: 文字列 / date: datetime64[D]
+# float64: 浮動小数 / int64: 整数（出来高・株式数など。欠損があれば Int64）
+_PRICE_COLUMNS = {
+    "Date": "date",
+    "Code": "category",
+    "O": "float64",
+    "H": "float64",
+    "L": "float64",
+    "C": "float64",
+    "UL": "category",
+    "LL": "category",
+    "Vo": "int64",
+    "Va": "float64",
+    "AdjFactor": "float64",
+    "AdjO": "float64",
+    "AdjH": "float64",
+    "AdjL": "float64",
+    "AdjC": "float64",
+    "AdjVo": "float64",
+}
+
+_FINS_SUMMARY_COLUMNS = {
+    "DiscDate": "date",
+    "DiscTime": "str",
+    "Code": "category",
+    "DiscNo": "str",
+    "DocType": "category",
+    "CurPerType": "category",
+    "CurPerSt": "date",
+    "CurPerEn": "date",
+    "CurFYSt": "date",
+    "CurFYEn": "date",
+    "NxtFYSt": "date",
+    "NxtFYEn": "date",
+    **{
+        name: "float64"
+        for name in (
+            "Sales", "OP", "OdP", "NP", "EPS", "DEPS",
+            "TA", "Eq", "EqAR", "BPS", "CFO", "CFI", "CFF", "CashEq",
+            "Div1Q", "Div2Q", "Div3Q", "DivFY", "DivAnn", "DivTotalAnn", "PayoutRatioAnn",
+            "FDiv1Q", "FDiv2Q", "FDiv3Q", "FDivFY", "FDivAnn", "FDivTotalAnn", "FPayoutRatioAnn",
+            "FSales", "FOP", "FOdP", "FNP", "FEPS",
+            "NxFSales", "NxFOP", "NxFOdP", "NxFNp", "NxFEPS",
+            "AvgSh",  # 期中平均株式数（端数あり）
+        )
+    },
+    "ShOutFY": "int64",
+    "TrShFY": "int64",
+}
+
+SCHEMAS: Dict[str, Dict[str, str]] = {
+    "equities_bars_daily": _PRICE_COLUMNS,
+    "fins_summary": _FINS_SUMMARY_COLUMNS,
+    "equities_master": {
+        "Date": "date",
+        "Code": "str",
+        "CoName": "str",
+        "CoNameEn": "str",
+        "S17": "category",
+        "S17Nm": "category",
+        "S33": "category",
+        "S33Nm": "category",
+        "ScaleCat": "category",
+        "Mkt": "category",
+        "MktNm": "category",
+        "Mrgn": "category",
+        "MrgnNm": "category",
+    },
+    "fins_details": {
+        "DiscDate": "date",
+        "DiscTime": "str",
+        "Code": "category",
+        "DocType": "category",
+    },
+    "fins_dividend": {
+        "Code": "category",
+        "PubDate": "date",
+        "PubTime": "str",
+        "RefNo": "str",
+        "RecDate": "date",
+        "ExDate": "date",
+        "PayDate": "date",
+        "DivRate": "float64",
+    },
+    "earnings_calendar": {
+        "Date": "date",
+        "Code": "str",
+        "CoName": "str",
+        "FY": "category",
+        "SectorNm": "category",
+        "FQ": "category",
+        "Section": "category",
+    },
+    "margin_interest": {
+        "Date": "date",
+        "Code": "category",
+        "ShrtVol": "int64",
+        "LongVol": "int64",
+        "ShrtNegVol": "int64",
+        "LongNegVol": "int64",
+        "ShrtStdVol": "int64",
+        "LongStdVol": "int64",
+        "IssType": "category",
+    },
+    "short_ratio": {
+        "Date": "date",
+        "S33": "category",
+        "SellExShortVa": "float64",
+        "ShrtWithResVa": "float64",
+        "ShrtNoResVa": "float64",
+    },
+    "trading_calendar": {
+        "Date": "date",
+        "HolDiv": "category",
+    },
+    "indices_bars_daily": {
+        "Date": "date",
+        "Code": "category",
+        "O": "float64",
+        "H": "float64",
+        "L": "float64",
+        "C": "float64",
+    },
+}
+
+
+def _to_float(values: list) -> np.ndarray:
+    try:
+        # 数値・数値文字列・Noneのみなら一括変換（NoneはNaN）
+        return np.array(values, dtype="float64")
+    except (ValueError, TypeError):
+        # 空文字や"-"などを含む場合は欠損扱い
+        return pd.to_numeric(
+            pd.Series(values, dtype=object), errors="coerce"
+        ).to_numpy(dtype="float64")
+
+
+def _to_int(values: list):
+    arr = _to_float(values)
+    mask = np.isnan(arr)
+    if not mask.any():
+        return arr.astype(np.int64)
+    return pd.arrays.IntegerArray(np.where(mask, 0, arr).astype(np.int64), mask)
+
+
+def _to_date(values: list) -> np.ndarray:
+    sample = next((v for v in values if v), None)
+    # ISO形式（YYYY-MM-DD）ならNumPyで直接変換（NoneはNaT）
+    if isinstance(sample, str) and len(sample) == 10 and sample[4] == "-":
+        try:
+            return np.array(values, dtype="datetime64[D]")
+        except ValueError:
+            pass
+    return (
+        pd.to_datetime(pd.Series(values, dtype=object), format="mixed", errors="coerce")
+        .to_numpy(dtype="datetime64[D]")
+    )
+
+
+def _decode_column(values: list, kind: Optional[str]):
+    if kind == "category":
+        return pd.Categorical(values)
+    if kind == "date":
+        return _to_date(values)
+    if kind == "float64":
+        return _to_float(values)
+    if kind == "int64":
+        return _to_int(values)
+    if kind == "str":
+        return np.array(values, dtype=object)
+    # スキーマ外の列は型推論に任せる
+    return pd.Series(values).to_numpy()
+
+
+def decode_records(items: List[dict], dataset: str) -> pd.DataFrame:
+    """レコードのリストをスキーマに従って型付きDataFrameに変換"""
+    if not items:
+        return pd.DataFrame()
+
+    schema = SCHEMAS.get(dataset, {})
+    # 列は先頭・末尾レコードのキーの和集合（ページ内でキーは揃っている前提）
+    keys = list(items[0])
+    keys += [k for k in items[-1] if k not in items[0]]
+
+    with metrics.timer("decode_seconds", dataset=dataset):
+        columns = {}
+        for key in keys:
+            values = [r.get(key) for r in items]
+            columns[key] = _decode_column(values, schema.get(key))
+        df = pd.DataFrame(columns, copy=False)
+    metrics.inc("rows_decoded_total", len(df), dataset=dataset)
+    return df
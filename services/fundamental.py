@@ -0,0 +1,456 @@
+"""ファンダメンタル指標の日次パネル（PER・PBR・ROE・配当利回り）
+
+各営業日・各銘柄について「その日までに開示された直近の財務サマリ」を
+as-of結合し、(営業日, 銘柄) 行列のパネルを作る。銘柄ごとの
+pandas.merge_asof(by="code") と同じ結合を、開示を行列に散布して
+営業日方向に前方補完する形で全銘柄まとめて行う。
+
+- 開示日より前の営業日には使わない（開示日当日の終値から反映・先読みなし）
+- 項目ごとに値のある直近の開示を使う（予想の修正のみの開示でも実績が欠けない）
+- 実績EPS・ROEは通期の開示、予想EPS・BPS・予想配当は全ての開示から取る
+- 1株当たりの値は調整係数の累積で各営業日の株数基準に揃え、未調整の終値と比べる
+  （開示後の株式分割でも過去の営業日の値は変わらない）
+
+パネルは data/cache/fundamentals/ に保存し、refresh_fundamentals() で
+新しい営業日は保存済みの最終状態から追記、新しい開示のあった銘柄と
+パネルの最終営業日以前の株価が実際に変わった銘柄はその銘柄だけ計算し直す。
+
+    panel = get_fundamentals()
+    panel.frame("per")          # 営業日 × 銘柄 のDataFrame
+    panel.latest()              # 銘柄ごとの最終営業日の値
+"""
+
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+
+from config import config
+from db.database import get_read_session
+from models.schemas import FinancialSummary
+from services.technical import load_fields
+
+logger = logging.getLogger(__name__)
+
+# 1株当たりの値（調整係数で株数基準を揃える）→ 通期の開示に限るか
+PER_SHARE_INPUTS: Dict[str, bool] = {
+    "earnings_per_share": True,
+    "forecast_earnings_per_share": False,
+    "book_value_per_share": False,
+    "forecast_dividend_per_share_annual": False,
+}
+# 開示ごとに求める比率（株数基準の影響を受けない）
+ROE_INPUT = "roe"
+INPUTS = (*PER_SHARE_INPUTS, ROE_INPUT)
+
+# パネルの指標
+METRICS = ("per", "per_actual", "pbr", "roe", "dividend_yield")
+
+PANEL_FILE = "panel.npz"
+
+# 計算し直す銘柄がこの割合を超えたら全銘柄を作り直す
+FULL_REBUILD_RATIO = 0.5
+
+
+@dataclass
+class FundamentalPanel:
+    """(営業日, 銘柄) 行列のファンダメンタル指標"""
+
+    dates: np.ndarray  # datetime64[D]、昇順
+    codes: List[str]
+    values: Dict[str, np.ndarray]  # 指標名 → (営業日数, 銘柄数)
+    # 追記用の最終状態: 入力項目ごとの直近の値（累積調整係数で割った値）と累積調整係数
+    last_inputs: Dict[str, np.ndarray] = field(default_factory=dict)
+    last_factor: Optional[np.ndarray] = None
+    watermark: Optional[datetime] = None  # 反映済みの財務サマリの最終更新日時
+
+    @property
+    def code_index(self) -> Dict[str, int]:
+        return {c: i for i, c in enumerate(self.codes)}
+
+    @property
+    def as_of(self) -> Optional[date]:
+        return self.dates[-1].astype(object) if len(self.dates) else None
+
+    def frame(self, metric: str) -> pd.DataFrame:
+        """指標を 営業日 × 銘柄 のDataFrameで返す"""
+        return pd.DataFrame(self.values[metric], index=pd.DatetimeIndex(self.dates), columns=self.codes)
+
+    def on(self, target_date: date) -> pd.DataFrame:
+        """指定日（休業日なら直前の営業日）の全指標を銘柄ごとに返す"""
+        row = int(np.searchsorted(self.dates, np.datetime64(target_date, "D"), side="right")) - 1
+        if row < 0:
+            return pd.DataFrame(columns=list(METRICS), index=pd.Index([], name="code"))
+        return pd.DataFrame(
+            {m: self.values[m][row] for m in METRICS}, index=pd.Index(self.codes, name="code")
+        )
+
+    def latest(self) -> pd.DataFrame:
+        """最終営業日の全指標を銘柄ごとに返す"""
+        if not len(self.dates):
+            return self.on(date.min)
+        return self.on(self.as_of)
+
+
+# ─── as-of結合 ───
+
+
+def as_of_matrix(
+    dates: np.ndarray,
+    codes: Sequence[str],
+    disclosed: np.ndarray,
+    disclosed_codes: Sequence[str],
+    values: np.ndarray,
+    initial: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """開示を各営業日時点で開示済みの直近の値の (営業日, 銘柄) 行列にする
+
+    開示は開示順に並んでいること。開示日以降の最初の営業日に置き、
+    営業日方向に前方補完する。欠損値の開示は飛ばす（直前の値が残る）。
+    initial は最初の開示より前の行の値（追記時の前回の最終状態）。
+    """
+    n_dates, n_codes = len(dates), len(codes)
+    rows = np.searchsorted(dates, disclosed, side="left")
+    cols = pd.Index(codes).get_indexer(pd.Index(disclosed_codes))
+    ok = (cols >= 0) & (rows < n_dates) & np.isfinite(values)
+
+    # 同じ営業日・銘柄に複数の開示があれば後の開示を使う
+    cells = pd.DataFrame({"row": rows[ok], "col": cols[ok], "value": values[ok]})
+    cells = cells.drop_duplicates(["row", "col"], keep="last")
+    scattered = np.full((n_dates, n_codes), np.nan)
+    scattered[cells["row"].to_numpy(), cells["col"].to_numpy()] = cells["value"].to_numpy()
+
+    # 各セルについて直近の開示のある行を求めて前方補完
+    source = np.where(np.isfinite(scattered), np.arange(n_dates)[:, None], -1)
+    source = np.maximum.accumulate(source, axis=0)
+    out = np.take_along_axis(scattered, np.maximum(source, 0), axis=0)
+    before = source < 0
+    if initial is not None:
+        out[before] = np.broadcast_to(initial, out.shape)[before]
+    else:
+        out[before] = np.nan
+    return out
+
+
+def cumulative_factor(factor: np.ndarray, initial: Optional[np.ndarray] = None) -> np.ndarray:
+    """調整係数の累積積（欠損は1、initial は前回の最終行の累積）"""
+    out = np.cumprod(np.where(np.isfinite(factor) & (factor > 0), factor, 1.0), axis=0)
+    if initial is not None:
+        out *= initial
+    return out
+
+
+def _factor_at(
+    dates: np.ndarray,
+    codes: Sequence[str],
+    cumulative: np.ndarray,
+    disclosed: np.ndarray,
+    disclosed_codes: Sequence[str],
+    initial: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """開示日時点（開示日以前の最後の営業日）の累積調整係数"""
+    rows = np.searchsorted(dates, disclosed, side="right") - 1
+    cols = pd.Index(codes).get_indexer(pd.Index(disclosed_codes))
+    out = np.ones(len(disclosed))
+    if initial is not None:
+        out[cols >= 0] = initial[cols[cols >= 0]]
+    inside = (rows >= 0) & (cols >= 0)
+    out[inside] = cumulative[rows[inside], cols[inside]]
+    return out
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """分母が正の場合だけの比率（それ以外は欠損）"""
+    out = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=np.isfinite(denominator) & (denominator > 0))
+    return out
+
+
+def compute_panel(
+    dates: np.ndarray,
+    codes: List[str],
+    close: np.ndarray,
+    factor: np.ndarray,
+    disclosures: pd.DataFrame,
+    last_inputs: Optional[Dict[str, np.ndarray]] = None,
+    last_factor: Optional[np.ndarray] = None,
+) -> FundamentalPanel:
+    """未調整の終値・調整係数の行列と開示からパネルを作る
+
+    last_inputs・last_factor を渡すと、その状態（直前の営業日の最終状態）から続けて計算する。
+    """
+    cumulative = cumulative_factor(factor, last_factor)
+    disclosed = disclosures["disclosed_date"].to_numpy(dtype="datetime64[D]")
+    disclosed_codes = disclosures["code"].to_numpy()
+    annual = disclosures["fiscal_quarter"].isna().to_numpy()
+    base = _factor_at(dates, codes, cumulative, disclosed, disclosed_codes, last_factor)
+
+    inputs = {}
+    for name, annual_only in PER_SHARE_INPUTS.items():
+        values = disclosures[name].to_numpy(dtype="float64") / base
+        if annual_only:
+            values = np.where(annual, values, np.nan)
+        initial = last_inputs.get(name) if last_inputs else None
+        inputs[name] = as_of_matrix(dates, codes, disclosed, disclosed_codes, values, initial)
+    roe = _ratio(disclosures["profit"].to_numpy(dtype="float64"), disclosures["equity"].to_numpy(dtype="float64"))
+    initial = last_inputs.get(ROE_INPUT) if last_inputs else None
+    inputs[ROE_INPUT] = as_of_matrix(
+        dates, codes, disclosed, disclosed_codes, np.where(annual, roe, np.nan), initial
+    )
+
+    # 累積調整係数で割った値に各営業日の累積を掛けて、その日の株数基準に揃える
+    eps = inputs["earnings_per_share"] * cumulative
+    forecast_eps = inputs["forecast_earnings_per_share"] * cumulative
+    bps = inputs["book_value_per_share"] * cumulative
+    dps = inputs["forecast_dividend_per_share_annual"] * cumulative
+    values = {
+        "per": _ratio(close, forecast_eps),
+        "per_actual": _ratio(close, eps),
+        "pbr": _ratio(close, bps),
+        "roe": inputs[ROE_INPUT],
+        "dividend_yield": _ratio(dps, close),
+    }
+
+    n_codes = len(codes)
+    return FundamentalPanel(
+        dates=dates,
+        codes=list(codes),
+        values={m: v.astype("float32") for m, v in values.items()},
+        last_inputs={
+            name: (m[-1].copy() if len(dates) else _initial(last_inputs, name, n_codes))
+            for name, m in inputs.items()
+        },
+        last_factor=cumulative[-1].copy() if len(dates) else (
+            last_factor if last_factor is not None else np.ones(n_codes)
+        ),
+    )
+
+
+def _initial(last_inputs: Optional[Dict[str, np.ndarray]], name: str, n_codes: int) -> np.ndarray:
+    if last_inputs and name in last_inputs:
+        return last_inputs[name]
+    return np.full(n_codes, np.nan)
+
+
+# ─── 読み込み ───
+
+
+def load_disclosures(
+    codes: Optional[Sequence[str]] = None, after: Optional[date] = None
+) -> pd.DataFrame:
+    """財務サマリを開示順に読み込む（after を指定するとその日より後の開示だけ）"""
+    stmt = select(
+        FinancialSummary.code,
+        FinancialSummary.disclosed_date,
+        FinancialSummary.disclosed_time,
+        FinancialSummary.fiscal_quarter,
+        FinancialSummary.profit,
+        FinancialSummary.equity,
+        *[getattr(FinancialSummary, c) for c in PER_SHARE_INPUTS],
+    ).where(FinancialSummary.disclosed_date.is_not(None))
+    if codes is not None:
+        stmt = stmt.where(FinancialSummary.code.in_(list(codes)))
+    if after is not None:
+        stmt = stmt.where(FinancialSummary.disclosed_date > after)
+    stmt = stmt.order_by(FinancialSummary.disclosed_date, FinancialSummary.disclosed_time)
+    session = get_read_session()
+    try:
+        df = pd.read_sql(stmt, session.connection())
+    finally:
+        session.close()
+    df["disclosed_date"] = pd.to_datetime(df["disclosed_date"])
+    return df
+
+
+def _watermark() -> Optional[datetime]:
+    session = get_read_session()
+    try:
+        return session.execute(select(func.max(FinancialSummary.updated_at))).scalar()
+    finally:
+        session.close()
+
+
+def _changed_codes(since: Optional[datetime]) -> List[str]:
+    """since より後に書き込まれた財務サマリの銘柄"""
+    stmt = select(FinancialSummary.code).distinct()
+    if since is not None:
+        stmt = stmt.where(FinancialSummary.updated_at > since)
+    session = get_read_session()
+    try:
+        return [row[0] for row in session.execute(stmt)]
+    finally:
+        session.close()
+
+
+def build_fundamentals() -> FundamentalPanel:
+    """全銘柄・全営業日のパネルを作る"""
+    watermark = _watermark()
+    dates, codes, prices = load_fields(("close", "adjustment_factor"))
+    panel = compute_panel(dates, codes, prices["close"], prices["adjustment_factor"], load_disclosures())
+    panel.watermark = watermark
+    return panel
+
+
+# ─── キャッシュ ───
+
+
+def panel_path() -> Path:
+    return config.fundamentals.directory / PANEL_FILE
+
+
+def save_panel(panel: FundamentalPanel, path: Optional[Path] = None):
+    """パネルを保存（書き込み後に置き換えるため読み取り側は常に完全なファイルを見る）"""
+    path = path or panel_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    arrays = {
+        "dates": panel.dates.astype("datetime64[D]"),
+        "codes": np.asarray(panel.codes, dtype=str),
+        "last_factor": panel.last_factor,
+        "watermark": np.asarray(panel.watermark.isoformat() if panel.watermark else ""),
+    }
+    arrays.update({f"value_{m}": v for m, v in panel.values.items()})
+    arrays.update({f"input_{n}": v for n, v in panel.last_inputs.items()})
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def load_panel(path: Optional[Path] = None) -> Optional[FundamentalPanel]:
+    """保存済みのパネル（未作成・指標の定義が変わった場合はNone）"""
+    path = path or panel_path()
+    if not path.exists():
+        return None
+    with np.load(path) as data:
+        if any(f"value_{m}" not in data for m in METRICS) or any(f"input_{n}" not in data for n in INPUTS):
+            return None
+        watermark = str(data["watermark"])
+        return FundamentalPanel(
+            dates=data["dates"].astype("datetime64[D]"),
+            codes=data["codes"].tolist(),
+            values={m: data[f"value_{m}"] for m in METRICS},
+            last_inputs={n: data[f"input_{n}"] for n in INPUTS},
+            last_factor=data["last_factor"],
+            watermark=datetime.fromisoformat(watermark) if watermark else None,
+        )
+
+
+# ─── 差分更新 ───
+
+
+def _widen(panel: FundamentalPanel, codes: List[str]) -> FundamentalPanel:
+    """銘柄の列を追加（値は欠損、累積調整係数は1）"""
+    new = [c for c in codes if c not in panel.code_index]
+    if not new:
+        return panel
+    n_dates = len(panel.dates)
+    panel.codes = panel.codes + new
+    panel.values = {
+        m: np.hstack([v, np.full((n_dates, len(new)), np.nan, dtype=v.dtype)]) for m, v in panel.values.items()
+    }
+    panel.last_inputs = {n: np.concatenate([v, np.full(len(new), np.nan)]) for n, v in panel.last_inputs.items()}
+    panel.last_factor = np.concatenate([panel.last_factor, np.ones(len(new))])
+    return panel
+
+
+def _recompute_codes(panel: FundamentalPanel, codes: List[str]) -> int:
+    """指定した銘柄の列をパネルの全営業日について計算し直す"""
+    codes = [c for c in codes if c in panel.code_index]
+    if not codes:
+        return 0
+    dates, selected, prices = load_fields(("close", "adjustment_factor"), to_date=panel.as_of, codes=codes)
+    if len(dates) != len(panel.dates) or not np.array_equal(dates, panel.dates):
+        raise ValueError("株価の営業日がパネルと一致しません")
+    part = compute_panel(dates, selected, prices["close"], prices["adjustment_factor"], load_disclosures(selected))
+    cols = np.array([panel.code_index[c] for c in selected], dtype=np.int64)
+    for m in METRICS:
+        panel.values[m][:, cols] = part.values[m]
+    for n in INPUTS:
+        panel.last_inputs[n][cols] = part.last_inputs[n]
+    panel.last_factor[cols] = part.last_factor
+    return len(selected)
+
+
+def _extend(panel: FundamentalPanel) -> int:
+    """パネルの最終営業日より後の営業日を保存済みの最終状態から追記"""
+    as_of = panel.as_of
+    dates, codes, prices = load_fields(("close", "adjustment_factor"), from_date=as_of + timedelta(days=1))
+    if not len(dates):
+        return 0
+    new = [c for c in codes if c not in panel.code_index]
+    _widen(panel, codes)
+    cols = np.array([panel.code_index[c] for c in codes], dtype=np.int64)
+    close = np.full((len(dates), len(panel.codes)), np.nan)
+    factor = np.full((len(dates), len(panel.codes)), np.nan)
+    close[:, cols] = prices["close"]
+    factor[:, cols] = prices["adjustment_factor"]
+
+    # 既存の銘柄は前回の最終営業日より後の開示だけで足りる（それ以前の開示は最終状態に含まれる）
+    disclosures = load_disclosures(after=as_of)
+    if new:
+        disclosures = pd.concat(
+            [disclosures[~disclosures["code"].isin(new)], load_disclosures(new)], ignore_index=True
+        ).sort_values(["disclosed_date", "disclosed_time"], kind="mergesort")
+    part = compute_panel(
+        dates, panel.codes, close, factor, disclosures,
+        last_inputs=panel.last_inputs, last_factor=panel.last_factor,
+    )
+    panel.dates = np.concatenate([panel.dates, dates])
+    panel.values = {m: np.vstack([panel.values[m], part.values[m]]) for m in METRICS}
+    panel.last_inputs = part.last_inputs
+    panel.last_factor = part.last_factor
+    return len(dates)
+
+
+def refresh_fundamentals(
+    price_dates: Iterable[date] = (), changed: Optional[Dict[str, date]] = None
+) -> FundamentalPanel:
+    """保存済みのパネルを最新の株価・開示に合わせて更新して保存する
+
+    price_dates は同期で書き込んだ営業日、changed は株価の行が変わった銘柄 → 最も古い営業日。
+    パネルの最終営業日以前が変わった銘柄と新しい開示のあった銘柄だけを計算し直し、
+    新しい営業日を追記する。保存済みのパネルがない場合・大半の銘柄が変わった場合・
+    営業日が増えた場合は全銘柄を作り直す。changed=None は変わった行が分からないものとして、
+    最終営業日以前の営業日を含めば全銘柄を作り直す。
+    """
+    price_dates = sorted(set(price_dates))
+    panel = load_panel()
+    stale: List[str] = []
+    if panel is not None and panel.as_of is not None:
+        if changed is None:
+            stale = list(panel.codes) if price_dates and price_dates[0] <= panel.as_of else []
+        else:
+            stale = sorted(code for code, day in changed.items() if day <= panel.as_of)
+    if panel is None or panel.as_of is None or len(stale) > FULL_REBUILD_RATIO * len(panel.codes):
+        panel = build_fundamentals()
+        logger.info(f"ファンダメンタル指標を全期間で計算: {len(panel.dates)}営業日 × {len(panel.codes)}銘柄")
+    else:
+        watermark = _watermark()
+        disclosed = _changed_codes(panel.watermark) if watermark != panel.watermark else []
+        # パネルにない銘柄の過去の営業日が追加された場合は列を足してから計算する
+        _widen(panel, stale)
+        try:
+            recomputed = _recompute_codes(panel, sorted(set(disclosed) | set(stale)))
+        except ValueError as e:
+            logger.info(f"ファンダメンタル指標を全期間で計算し直します: {e}")
+            panel = build_fundamentals()
+        else:
+            appended = _extend(panel)
+            panel.watermark = watermark
+            logger.info(f"ファンダメンタル指標を差分更新: 計算し直し{recomputed}銘柄 / 追記{appended}営業日")
+    save_panel(panel)
+    return panel
+
+
+def get_fundamentals() -> FundamentalPanel:
+    """保存済みのパネル（なければ作成して保存）"""
+    panel = load_panel()
+    if panel is None:
+        panel = build_fundamentals()
+        save_panel(panel)
+    return panel
@@ -0,0 +1,388 @@
+"""テクニカル指標の差分更新
+
+EMA・MACD・RSI・ATR は漸化式、SMA・ボリンジャーバンド・出来高倍率は直近の
+一定期間だけで決まるため、銘柄ごとに次の状態を保存しておけば、
+新しい営業日の反映は全履歴ではなく銘柄数に比例する計算で済む。
+
+- 指数移動平均（EMA・MACDシグナル・RSIの上昇/下落幅）: 加重平均・直前の重み・観測数
+- ATR: ATR・計算開始前の合計・有効日数・経過日数
+- SMA・ボリンジャーバンド・出来高倍率: 直近の終値・出来高のリングバッファ
+
+状態は indicator_state テーブル（銘柄×状態の種類）、最新の指標値は
+technical_indicators テーブルに保存する。保存は状態が変わった銘柄だけのUPSERTで、
+変わらなかった銘柄（上場廃止後など）の行は古い反映日のまま残す。計算は services.technical の
+全履歴の計算と同じ定義（同じ漸化式の関数）を使う。
+
+反映済みの営業日以前の株価の行が実際に変わった銘柄（修正・過去の営業日の追加）と、
+調整係数の変化で状態が破棄された銘柄は、その銘柄だけを全履歴から計算し直す
+（反映済みの最終営業日の書き直しもその銘柄の置き換えになる）。同じ値の再取得では
+計算し直さない。大半の銘柄が変わった場合は全銘柄を全履歴から計算し直す。
+"""
+
+import logging
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from db.database import get_session
+from models.schemas import IndicatorState, TechnicalIndicator
+from services.corporate_actions import register_invalidator
+from services.technical import (
+    ATR_WINDOW,
+    BOLLINGER_DEV,
+    BOLLINGER_WINDOW,
+    EMA_WINDOWS,
+    MACD_FAST,
+    MACD_SIGNAL,
+    MACD_SLOW,
+    RSI_WINDOW,
+    SMA_WINDOWS,
+    VOLUME_RATIO_WINDOW,
+    PriceMatrix,
+    _true_range,
+    atr_init,
+    atr_step,
+    ewm_init,
+    ewm_step,
+    load_prices,
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSE_WINDOW = max(*SMA_WINDOWS, BOLLINGER_WINDOW)
+VOLUME_WINDOW = VOLUME_RATIO_WINDOW + 1  # 前日までの期間＋当日
+
+INSERT_CHUNK_SIZE = 1000
+
+# 計算し直す銘柄がこの割合を超えたら全銘柄を全履歴から計算する
+FULL_RECOMPUTE_RATIO = 0.5
+
+
+def _ema_alpha(window: int) -> float:
+    return 2.0 / (window + 1)
+
+
+def _initial_state(n_codes: int) -> Dict[str, np.ndarray]:
+    """状態の種類 → (状態の値の数, 銘柄数) の初期値"""
+    state = {
+        "close_window": np.full((CLOSE_WINDOW, n_codes), np.nan),  # 古い順
+        "volume_window": np.full((VOLUME_WINDOW, n_codes), np.nan),
+        "rsi_started": np.zeros((1, n_codes)),  # 終値が一度でもあれば1
+        "rsi_up": ewm_init(n_codes),
+        "rsi_down": ewm_init(n_codes),
+        "macd_signal": ewm_init(n_codes),
+        f"atr_{ATR_WINDOW}": atr_init(n_codes),
+    }
+    for window in {*EMA_WINDOWS, MACD_FAST, MACD_SLOW}:
+        state[f"ema_{window}"] = ewm_init(n_codes)
+    return state
+
+
+def _full_window_mean(window: np.ndarray) -> np.ndarray:
+    """期間内に欠損がない銘柄だけの平均"""
+    complete = ~np.isnan(window).any(axis=0)
+    return np.where(complete, np.where(complete, window, 0.0).mean(axis=0), np.nan)
+
+
+def _push(buffer: np.ndarray, values: np.ndarray):
+    """リングバッファの末尾に1営業日分を追加（先頭の最古の行を捨てる）"""
+    buffer[:-1] = buffer[1:]
+    buffer[-1] = values
+
+
+class IncrementalIndicators:
+    """銘柄ごとの指標の状態と、1営業日ずつの更新"""
+
+    def __init__(
+        self,
+        codes: Iterable[str] = (),
+        state: Optional[Dict[str, np.ndarray]] = None,
+        as_of: Optional[date] = None,
+    ):
+        self.codes: List[str] = list(codes)
+        self.code_index = {code: i for i, code in enumerate(self.codes)}
+        self.state = state if state is not None else _initial_state(len(self.codes))
+        self.as_of = as_of
+        self.latest: Dict[str, np.ndarray] = {}
+        # 保存が必要な銘柄（None は全銘柄＝全履歴からの計算結果）
+        self.changed: Optional[Set[str]] = None if state is None else set()
+
+    # ─── 更新 ───
+
+    def step(
+        self, close: np.ndarray, high: np.ndarray, low: np.ndarray, volume: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        """1営業日分の株価（self.codes の順）を反映し、その日の指標値を返す"""
+        s = self.state
+        prev_close = s["close_window"][-1].copy()
+        _push(s["close_window"], close)
+        out: Dict[str, np.ndarray] = {}
+
+        for window in SMA_WINDOWS:
+            out[f"sma_{window}"] = _full_window_mean(s["close_window"][-window:])
+
+        emas = {
+            window: ewm_step(s[f"ema_{window}"], close, _ema_alpha(window), window)
+            for window in {*EMA_WINDOWS, MACD_FAST, MACD_SLOW}
+        }
+        for window in EMA_WINDOWS:
+            out[f"ema_{window}"] = emas[window]
+        line = emas[MACD_FAST] - emas[MACD_SLOW]
+        out["macd"] = line
+        out["macd_signal"] = ewm_step(s["macd_signal"], line, _ema_alpha(MACD_SIGNAL), MACD_SIGNAL)
+        out["macd_diff"] = line - out["macd_signal"]
+
+        # RSI（終値が一度もない銘柄＝上場前は計算しない）
+        started = s["rsi_started"][0]
+        started[~np.isnan(close)] = 1.0
+        diff = close - prev_close
+        up = np.where(diff > 0, diff, 0.0)
+        down = np.where(diff < 0, -diff, 0.0)
+        up[started == 0] = np.nan
+        down[started == 0] = np.nan
+        ema_up = ewm_step(s["rsi_up"], up, 1.0 / RSI_WINDOW, RSI_WINDOW)
+        ema_down = ewm_step(s["rsi_down"], down, 1.0 / RSI_WINDOW, RSI_WINDOW)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = 100.0 - 100.0 / (1.0 + ema_up / ema_down)
+        out[f"rsi_{RSI_WINDOW}"] = np.where(ema_down == 0, 100.0, rsi)
+
+        window = s["close_window"][-BOLLINGER_WINDOW:]
+        mavg = _full_window_mean(window)
+        std = np.sqrt(_full_window_mean((window - mavg) ** 2))
+        out["bb_mavg"] = mavg
+        out["bb_hband"] = mavg + BOLLINGER_DEV * std
+        out["bb_lband"] = mavg - BOLLINGER_DEV * std
+
+        tr = _true_range(high, low, prev_close)
+        out[f"atr_{ATR_WINDOW}"] = atr_step(s[f"atr_{ATR_WINDOW}"], tr, ATR_WINDOW)
+
+        _push(s["volume_window"], volume)
+        base = _full_window_mean(s["volume_window"][:-1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[f"volume_ratio_{VOLUME_RATIO_WINDOW}"] = np.where(base > 0, volume / base, np.nan)
+
+        self.latest = out
+        return out
+
+    def apply(self, prices: PriceMatrix):
+        """PriceMatrix の営業日を順に反映（銘柄の並びは self.codes に揃える）"""
+        self.add_codes(prices.codes)
+        cols = np.array([self.code_index[c] for c in prices.codes], dtype=np.int64)
+        n = len(self.codes)
+        before = {key: values.copy() for key, values in self.state.items()} if self.changed is not None else None
+        for i, day in enumerate(prices.dates):
+            row = {}
+            for name in ("close", "high", "low", "volume"):
+                values = np.full(n, np.nan)
+                values[cols] = getattr(prices, name)[i]
+                row[name] = values
+            self.step(**row)
+            self.as_of = pd.Timestamp(day).date()
+        if before is not None:
+            self._mark_changed(before)
+
+    def _mark_changed(self, before: Dict[str, np.ndarray]):
+        """before から状態の値が変わった銘柄を保存対象に加える"""
+        changed = np.zeros(len(self.codes), dtype=bool)
+        for key, values in self.state.items():
+            old = before[key]
+            same = (old == values) | (np.isnan(old) & np.isnan(values))
+            changed |= ~same.all(axis=0)
+        self.changed.update(self.codes[j] for j in np.flatnonzero(changed))
+
+    def add_codes(self, codes: Iterable[str]):
+        """未登録の銘柄を初期状態で追加"""
+        new = [c for c in codes if c not in self.code_index]
+        if not new:
+            return
+        initial = _initial_state(len(new))
+        for key, values in initial.items():
+            self.state[key] = np.concatenate([self.state[key], values], axis=1)
+        for name, values in self.latest.items():
+            self.latest[name] = np.concatenate([values, np.full(len(new), np.nan)])
+        self.codes.extend(new)
+        self.code_index = {code: i for i, code in enumerate(self.codes)}
+        if self.changed is not None:
+            self.changed.update(new)
+
+    def replace_codes(self, other: "IncrementalIndicators"):
+        """other の銘柄の状態・最新の指標値で置き換える（銘柄単位の再計算結果の取り込み）"""
+        self.add_codes(other.codes)
+        cols = np.array([self.code_index[c] for c in other.codes], dtype=np.int64)
+        for key, values in other.state.items():
+            self.state[key][:, cols] = values
+        for name, values in other.latest.items():
+            latest = self.latest.setdefault(name, np.full(len(self.codes), np.nan))
+            latest[cols] = values
+        if self.changed is not None:
+            self.changed.update(other.codes)
+
+    @classmethod
+    def from_history(cls, prices: PriceMatrix) -> "IncrementalIndicators":
+        """全履歴から状態を作る"""
+        engine = cls()
+        engine.apply(prices)
+        return engine
+
+    # ─── 保存・読み込み ───
+
+    @classmethod
+    def load(cls, session: Session) -> Optional["IncrementalIndicators"]:
+        """保存済みの状態を読み込む（なければNone）
+
+        反映日は全銘柄の最新の日とする。状態が変わらず保存されなかった銘柄は
+        古い反映日のままだが、その後の営業日を反映しても状態は同じなのでそのまま使う。
+        状態の種類・反映日が揃っていない銘柄・状態の大きさが今の定義と違う銘柄は
+        読み込まない（次の更新で全履歴から計算し直される）。
+        """
+        rows = session.execute(
+            select(IndicatorState.code, IndicatorState.indicator, IndicatorState.as_of, IndicatorState.state)
+        ).all()
+        if not rows:
+            return None
+        as_of = max(row.as_of for row in rows)
+        expected = _initial_state(0)
+        nbytes = {key: initial.shape[0] * 8 for key, initial in expected.items()}
+        by_code: Dict[str, Dict[str, bytes]] = {}
+        as_of_by_code: Dict[str, set] = {}
+        for row in rows:
+            as_of_by_code.setdefault(row.code, set()).add(row.as_of)
+            if len(row.state) == nbytes.get(row.indicator):
+                by_code.setdefault(row.code, {})[row.indicator] = row.state
+        codes = sorted(
+            code
+            for code, values in by_code.items()
+            if len(values) == len(expected) and len(as_of_by_code[code]) == 1
+        )
+
+        state = {}
+        for key, initial in expected.items():
+            size = initial.shape[0]
+            values = np.empty((size, len(codes)))
+            for j, code in enumerate(codes):
+                values[:, j] = np.frombuffer(by_code[code][key], dtype="float64", count=size)
+            state[key] = values
+        return cls(codes, state, as_of)
+
+    def save(self, session: Session):
+        """状態が変わった銘柄の状態と最新の指標値をUPSERT（コミットは呼び出し側）
+
+        全履歴から計算した場合は全銘柄を書き込み、計算対象にない銘柄の行を削除する。
+        """
+        conn = session.connection()
+        if self.changed is None:
+            codes = list(self.codes)
+            for model in (IndicatorState, TechnicalIndicator):
+                stored = set(conn.execute(select(model.code).distinct()).scalars())
+                self._delete_codes(conn, model, sorted(stored - set(codes)))
+        else:
+            codes = [c for c in self.codes if c in self.changed]
+        if not codes:
+            return
+        cols = np.array([self.code_index[c] for c in codes], dtype=np.int64)
+
+        stmt = insert(IndicatorState)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["code", "indicator"],
+            set_={"as_of": stmt.excluded.as_of, "state": stmt.excluded.state},
+        )
+        records = [
+            {"code": code, "indicator": key, "as_of": self.as_of, "state": values[:, j].tobytes()}
+            for key, values in self.state.items()
+            for code, j in zip(codes, cols)
+        ]
+        for start in range(0, len(records), INSERT_CHUNK_SIZE):
+            conn.execute(stmt, records[start:start + INSERT_CHUNK_SIZE])
+
+        if not self.latest:
+            self.changed = set()
+            return
+        latest = pd.DataFrame({name: values[cols] for name, values in self.latest.items()})
+        latest = latest.astype(object).where(latest.notna(), None)
+        latest.insert(0, "date", self.as_of)
+        latest.insert(0, "code", codes)
+        # 全指標が欠損の銘柄（上場前・上場廃止など）は保存しない
+        indicators = [c for c in latest.columns if c not in ("code", "date")]
+        valid = latest[indicators].notna().any(axis=1)
+        self._delete_codes(conn, TechnicalIndicator, latest.loc[~valid, "code"].tolist())
+        stmt = insert(TechnicalIndicator)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["code"],
+            set_={c: stmt.excluded[c] for c in latest.columns if c != "code"},
+        )
+        records = latest[valid].to_dict("records")
+        for start in range(0, len(records), INSERT_CHUNK_SIZE):
+            conn.execute(stmt, records[start:start + INSERT_CHUNK_SIZE])
+        self.changed = set()
+
+    @staticmethod
+    def _delete_codes(conn, model, codes: List[str]):
+        for start in range(0, len(codes), INSERT_CHUNK_SIZE):
+            conn.execute(delete(model).where(model.code.in_(codes[start:start + INSERT_CHUNK_SIZE])))
+
+
+def refresh_indicators(dates: Iterable[date], changed: Optional[Dict[str, date]] = None) -> int:
+    """同期でコミットした営業日をテクニカル指標に反映し、反映した営業日数を返す
+
+    保存済みの状態から最終反映日より後の営業日を1日ずつ進める。changed（株価の行が
+    変わった銘柄 → 最も古い営業日）のうち最終反映日以前が変わった銘柄は全履歴から
+    計算し直す。changed=None は変わった行が分からないものとして、最終反映日以前の
+    営業日を含めば全銘柄を計算し直す。
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return 0
+    session = get_session()
+    try:
+        engine = IncrementalIndicators.load(session)
+        stale: List[str] = []
+        if engine is not None and engine.as_of is not None:
+            if changed is None:
+                stale = list(engine.codes) if dates[0] <= engine.as_of else []
+            else:
+                stale = sorted(code for code, day in changed.items() if day <= engine.as_of)
+        if engine is None or engine.as_of is None or len(stale) > FULL_RECOMPUTE_RATIO * len(engine.codes):
+            prices = load_prices()
+            engine = IncrementalIndicators.from_history(prices)
+            logger.info(f"テクニカル指標を全履歴から計算: {len(prices.dates)}営業日 × {len(prices.codes)}銘柄")
+        else:
+            prices = load_prices(from_date=engine.as_of + timedelta(days=1))
+            # 状態のない銘柄（新規上場・調整係数の変化で破棄）と反映済みの日以前が変わった銘柄は
+            # 反映済みの日まで計算し直す
+            missing = [c for c in prices.codes if c not in engine.code_index]
+            recompute = sorted(set(missing) | set(stale))
+            if recompute:
+                engine.replace_codes(
+                    IncrementalIndicators.from_history(load_prices(codes=recompute, to_date=engine.as_of))
+                )
+            engine.apply(prices)
+            logger.info(
+                f"テクニカル指標を差分更新: {len(prices.dates)}営業日 × {len(engine.codes)}銘柄"
+                f"（計算し直し{len(recompute)}銘柄）"
+            )
+        engine.save(session)
+        session.commit()
+        return len(prices.dates)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _discard_adjusted(codes: List[str], prices: pd.DataFrame):
+    """調整後株価を計算し直した銘柄の状態を破棄（次の更新で全履歴から計算し直す）"""
+    session = get_session()
+    try:
+        session.execute(delete(IndicatorState).where(IndicatorState.code.in_(codes)))
+        session.commit()
+    finally:
+        session.close()
+
+
+register_invalidator("indicator_state", _discard_adjusted)
@@ -4,70 +4,185 @@ V2ではAPIキーを x-api-key ヘッダーに付与するだけで認証完了
 V1のメール/パスワードによるトークン認証フローは不要。
 """
 
-import time
+import asyncio
 import logging
+import time
 from datetime import date
-from typing import Optional
+from typing import AsyncIterator, Awaitable, Iterable, Iterator, List, Optional, Union
 
 import httpx
 import pandas as pd
 
 from config import config
+from services.cache import ResponseCache, get_response_cache
+from services.datasets import get_dataset
+from services.decoding import decode_records, loads
+from services.metrics import metrics
+from services.ratelimit import TokenBucket, get_rate_limiter
+from services.retry import RetryPolicy, is_retryable_status
 
 logger = logging.getLogger(__name__)
 
 
+def _build_params(
+    code: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    date: Optional[date] = None,
+) -> dict:
+    """クエリパラメータを組み立てる"""
+    params = {}
+    if code:
+        params["code"] = code
+    if from_date:
+        params["from"] = from_date.strftime("%Y%m%d")
+    if to_date:
+        params["to"] = to_date.strftime("%Y%m%d")
+    if date:
+        params["date"] = date.strftime("%Y%m%d")
+    return params
+
+
+def _resolve_cache(cache: Union[ResponseCache, bool, None]) -> Optional[ResponseCache]:
+    """クライアントが使うキャッシュ（None・True はプロセス共有、False はキャッシュなし）"""
+    if cache is False:
+        return None
+    if cache is None or cache is True:
+        return get_response_cache()
+    return cache
+
+
+def _merge_page(all_data: dict, data: dict):
+    """ページのデータを結果にマージ"""
+    for key, value in data.items():
+        if key == "pagination_key":
+            continue
+        if isinstance(value, list):
+            all_data.setdefault(key, []).extend(value)
+        else:
+            all_data[key] = value
+
+
 class JQuantsClient:
     """J-Quants API V2 のHTTPクライアント
 
     認証:
     - x-api-key ヘッダーにAPIキーを付与するだけでOK
+
+    キャッシュ:
+    - 既定はプロセス共有のレスポンスキャッシュ、cache=False でこのクライアントだけ使わない
     """
 
-    def __init__(self):
-        self.base_url = config.jquants.base_url
+    def __init__(
+        self,
+        limiter: Optional[TokenBucket] = None,
+        cache: Union[ResponseCache, bool, None] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        base_url: Optional[str] = None,
+        transport: Optional[httpx.BaseTransport] = None,
+    ):
+        self.base_url = base_url or config.jquants.base_url
         self.api_key = config.jquants.api_key
+        self._limiter = limiter or get_rate_limiter()
+        self._cache = _resolve_cache(cache)
+        self.retry_policy = retry_policy or RetryPolicy()
         self._client = httpx.Client(
             timeout=30.0,
             headers={"x-api-key": self.api_key},
+            transport=transport,
         )
 
-    def _get(self, endpoint: str, params: Optional[dict] = None) -> dict:
-        """GETリクエスト（ページング対応）"""
-        all_data = {}
-        next_token = None
+    def _request(self, endpoint: str, params: dict) -> dict:
+        """1ページ分のGETリクエスト（429・5xx・通信エラーはリトライ）"""
+        url = f"{self.base_url}{endpoint}"
+        max_attempts = self.retry_policy.max_attempts
+
+        for attempt in range(max_attempts):
+            # レートリミット対策（プロセス共有のトークンバケット）
+            with metrics.timer("ratelimit_wait_seconds"):
+                self._limiter.acquire()
+            try:
+                with metrics.timer("http_request_seconds", endpoint=endpoint):
+                    resp = self._client.get(url, params=params)
+            except httpx.TransportError as e:
+                if attempt + 1 >= max_attempts:
+                    raise
+                metrics.inc("http_retries_total", endpoint=endpoint, reason="transport")
+                delay = self.retry_policy.backoff(attempt)
+                logger.warning(f"通信エラー {attempt + 1}/{max_attempts}: {endpoint} {e} ({delay:.1f}秒後に再試行)")
+                time.sleep(delay)
+                continue
+
+            if is_retryable_status(resp.status_code) and attempt + 1 < max_attempts:
+                metrics.inc("http_retries_total", endpoint=endpoint, reason=resp.status_code)
+                retry_after = self.retry_policy.retry_after(resp)
+                if resp.status_code == 429:
+                    self._limiter.on_throttle(retry_after)
+                delay = retry_after if retry_after is not None else self.retry_policy.backoff(attempt)
+                logger.warning(f"HTTP {resp.status_code} {attempt + 1}/{max_attempts}: {endpoint} ({delay:.1f}秒後に再試行)")
+                time.sleep(delay)
+                continue
 
+            resp.raise_for_status()
+            self._limiter.on_success()
+            metrics.inc("http_response_bytes_total", len(resp.content), endpoint=endpoint)
+            with metrics.timer("json_decode_seconds", endpoint=endpoint):
+                return loads(resp.content)
+
+    def _iter_pages(self, endpoint: str, params: Optional[dict] = None) -> Iterator[dict]:
+        """GETリクエスト（ページ単位で逐次返す）
+
+        キャッシュは全ページを1件として扱い、最後のページまで取得できたときだけ保存する。
+        """
+        cached = self._cache.get(endpoint, params) if self._cache else None
+        if cached is not None:
+            for data in cached:
+                metrics.inc("pages_total", endpoint=endpoint, source="cache")
+                yield data
+            return
+
+        pages = []
+        next_token = None
         while True:
             request_params = params.copy() if params else {}
             if next_token:
                 request_params["pagination_key"] = next_token
 
-            resp = self._client.get(
-                f"{self.base_url}{endpoint}",
-                params=request_params,
-            )
-            resp.raise_for_status()
-            data = resp.json()
+            data = self._request(endpoint, request_params)
+            metrics.inc("pages_total", endpoint=endpoint, source="api")
+            if self._cache:
+                pages.append(data)
 
-            # データをマージ
-            for key, value in data.items():
-                if key == "pagination_key":
-                    continue
-                if isinstance(value, list):
-                    all_data.setdefault(key, []).extend(value)
-                else:
-                    all_data[key] = value
+            yield data
 
             # 次ページがあるか確認
             next_token = data.get("pagination_key")
             if not next_token:
                 break
 
-            # レートリミット対策
-            time.sleep(0.5)
+        if self._cache:
+            self._cache.put(endpoint, params, pages)
 
+    def _get(self, endpoint: str, params: Optional[dict] = None) -> dict:
+        """GETリクエスト（全ページをマージして返す）"""
+        all_data = {}
+        for data in self._iter_pages(endpoint, params):
+            _merge_page(all_data, data)
         return all_data
 
+    def iter_frames(
+        self, endpoint: str, data_key: str, params: Optional[dict] = None
+    ) -> Iterator[pd.DataFrame]:
+        """ページごとのレコードをDataFrameで逐次返す（ストリーミング）
+
+        全件を保持しないため、期間が長くてもメモリ使用量はページサイズで頭打ちになる
+        （レスポンスキャッシュが有効な場合は保存のため取得したページを保持する）。
+        """
+        for data in self._iter_pages(endpoint, params):
+            items = data.get(data_key) or data.get("data") or []
+            if items:
+                yield decode_records(items, data_key)
+
     # ─── 銘柄マスタ ───
 
     # ─── 銘柄マスタ ───
@@ -76,7 +191,7 @@ class JQuantsClient:
         """上場銘柄一覧を取得"""
         data = self._get("/equities/master")
         items = data.get("equities_master") or data.get("data") or []
-        return pd.DataFrame(items)
+        return decode_records(items, "equities_master")
 
     # ─── 株価 ───
 
@@ -90,24 +205,22 @@ class JQuantsClient:
         date: Optional[date] = None,  # 追加: 指定日全銘柄
     ) -> pd.DataFrame:
         """株価四本値を取得"""
-        params = {}
-        if code:
-            params["code"] = code
-        if from_date:
-            params["from"] = from_date.strftime("%Y%m%d")
-        if to_date:
-            params["to"] = to_date.strftime("%Y%m%d")
-        if date:
-            params["date"] = date.strftime("%Y%m%d")
+        params = _build_params(code=code, from_date=from_date, to_date=to_date, date=date)
 
         data = self._get("/equities/bars/daily", params)
         items = data.get("equities_bars_daily") or data.get("data") or []
-        df = pd.DataFrame(items)
-
-        if not df.empty and "Date" in df.columns:
-            df["Date"] = pd.to_datetime(df["Date"])
+        return decode_records(items, "equities_bars_daily")
 
-        return df
+    def iter_daily_prices(
+        self,
+        code: Optional[str] = None,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        date: Optional[date] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """株価四本値をページ単位で取得"""
+        params = _build_params(code=code, from_date=from_date, to_date=to_date, date=date)
+        yield from self.iter_frames("/equities/bars/daily", "equities_bars_daily", params)
 
     # ─── 財務情報 ───
 
@@ -119,19 +232,22 @@ class JQuantsClient:
         date: Optional[date] = None,  # 追加: 指定日全銘柄
     ) -> pd.DataFrame:
         """財務サマリを取得"""
-        params = {}
-        if code:
-            params["code"] = code
-        if from_date:
-            params["from"] = from_date.strftime("%Y%m%d")
-        if to_date:
-            params["to"] = to_date.strftime("%Y%m%d")
-        if date:
-            params["date"] = date.strftime("%Y%m%d")
+        params = _build_params(code=code, from_date=from_date, to_date=to_date, date=date)
 
         data = self._get("/fins/summary", params)
         items = data.get("fins_summary") or data.get("data") or []
-        return pd.DataFrame(items)
+        return decode_records(items, "fins_summary")
+
+    def iter_financial_summary(
+        self,
+        code: Optional[str] = None,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        date: Optional[date] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """財務サマリをページ単位で取得"""
+        params = _build_params(code=code, from_date=from_date, to_date=to_date, date=date)
+        yield from self.iter_frames("/fins/summary", "fins_summary", params)
 
     def get_financial_details(
         self,
@@ -140,17 +256,11 @@ class JQuantsClient:
         to_date: Optional[date] = None,
     ) -> pd.DataFrame:
         """財務諸表(BS/PL/CF)を取得"""
-        params = {}
-        if code:
-            params["code"] = code
-        if from_date:
-            params["from"] = from_date.strftime("%Y%m%d")
-        if to_date:
-            params["to"] = to_date.strftime("%Y%m%d")
+        params = _build_params(code=code, from_date=from_date, to_date=to_date)
 
         data = self._get("/fins/details", params)
         items = data.get("fins_details") or data.get("data") or []
-        return pd.DataFrame(items)
+        return decode_records(items, "fins_details")
 
     # ─── 配当 ───
 
@@ -161,17 +271,11 @@ class JQuantsClient:
         to_date: Optional[date] = None,
     ) -> pd.DataFrame:
         """配当金情報を取得"""
-        params = {}
-        if code:
-            params["code"] = code
-        if from_date:
-            params["from"] = from_date.strftime("%Y%m%d")
-        if to_date:
-            params["to"] = to_date.strftime("%Y%m%d")
+        params = _build_params(code=code, from_date=from_date, to_date=to_date)
 
         data = self._get("/fins/dividend", params)
         items = data.get("fins_dividend") or data.get("data") or []
-        return pd.DataFrame(items)
+        return decode_records(items, "fins_dividend")
 
     # ─── 決算予定 ───
 
@@ -181,15 +285,11 @@ class JQuantsClient:
         to_date: Optional[date] = None,
     ) -> pd.DataFrame:
         """決算発表予定日を取得"""
-        params = {}
-        if from_date:
-            params["from"] = from_date.strftime("%Y%m%d")
-        if to_date:
-            params["to"] = to_date.strftime("%Y%m%d")
+        params = _build_params(from_date=from_date, to_date=to_date)
 
         data = self._get("/equities/earnings-calendar", params)
         items = data.get("earnings_calendar") or data.get("data") or []
-        return pd.DataFrame(items)
+        return decode_records(items, "earnings_calendar")
 
     # ─── 市場情報 ───
 
@@ -200,17 +300,11 @@ class JQuantsClient:
         to_date: Optional[date] = None,
     ) -> pd.DataFrame:
         """信用取引週末残高を取得"""
-        params = {}
-        if code:
-            params["code"] = code
-        if from_date:
-            params["from"] = from_date.strftime("%Y%m%d")
-        if to_date:
-            params["to"] = to_date.strftime("%Y%m%d")
+        params = _build_params(code=code, from_date=from_date, to_date=to_date)
 
         data = self._get("/markets/margin-interest", params)
         items = data.get("margin_interest") or data.get("data") or []
-        return pd.DataFrame(items)
+        return decode_records(items, "margin_interest")
 
     def get_short_ratio(
         self,
@@ -218,15 +312,11 @@ class JQuantsClient:
         to_date: Optional[date] = None,
     ) -> pd.DataFrame:
         """業種別空売り比率を取得"""
-        params = {}
-        if from_date:
-            params["from"] = from_date.strftime("%Y%m%d")
-        if to_date:
-            params["to"] = to_date.strftime("%Y%m%d")
+        params = _build_params(from_date=from_date, to_date=to_date)
 
         data = self._get("/markets/short-ratio", params)
         items = data.get("short_ratio") or data.get("data") or []
-        return pd.DataFrame(items)
+        return decode_records(items, "short_ratio")
 
     def get_trading_calendar(
         self,
@@ -234,15 +324,11 @@ class JQuantsClient:
         to_date: Optional[date] = None,
     ) -> pd.DataFrame:
         """取引カレンダーを取得"""
-        params = {}
-        if from_date:
-            params["from"] = from_date.strftime("%Y%m%d")
-        if to_date:
-            params["to"] = to_date.strftime("%Y%m%d")
+        params = _build_params(from_date=from_date, to_date=to_date)
 
         data = self._get("/markets/calendar", params)
         items = data.get("trading_calendar") or data.get("data") or []
-        return pd.DataFrame(items)
+        return decode_records(items, "trading_calendar")
 
     # ─── 指数 ───
 
@@ -252,15 +338,11 @@ class JQuantsClient:
         to_date: Optional[date] = None,
     ) -> pd.DataFrame:
         """指数四本値を取得"""
-        params = {}
-        if from_date:
-            params["from"] = from_date.strftime("%Y%m%d")
-        if to_date:
-            params["to"] = to_date.strftime("%Y%m%d")
+        params = _build_params(from_date=from_date, to_date=to_date)
 
         data = self._get("/indices/bars/daily", params)
         items = data.get("indices_bars_daily") or data.get("data") or []
-        return pd.DataFrame(items)
+        return decode_records(items, "indices_bars_daily")
 
     def close(self):
         """クライアントを閉じる"""
@@ -271,3 +353,213 @@ class JQuantsClient:
 
     def __exit__(self, *args):
         self.close()
+
+
+class AsyncJQuantsClient:
+    """J-Quants API V2 の非同期HTTPクライアント
+
+    日付・銘柄・エンドポイントをまたいだリクエストを並列に発行する。
+    同時実行数はセマフォで、リクエスト頻度はプロセス共有の
+    トークンバケットで制御する。
+
+    専用のメソッドは銘柄マスタ・株価・財務サマリ・取引カレンダーだけで、
+    それ以外のエンドポイント（財務諸表・配当・信用取引残高など）は
+    services.datasets の登録（DatasetSpec）から get_dataset_frame / fetch_unit で取得する。
+    レスポンスキャッシュの指定は JQuantsClient と同じ（cache=False で使わない）。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        limiter: Optional[TokenBucket] = None,
+        cache: Union[ResponseCache, bool, None] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        base_url: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url or config.jquants.base_url
+        self.api_key = config.jquants.api_key
+        self.max_concurrency = max_concurrency or config.jquants.max_concurrency
+        self._limiter = limiter or get_rate_limiter()
+        self._cache = _resolve_cache(cache)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=30.0,
+            headers={"x-api-key": self.api_key},
+            limits=httpx.Limits(max_connections=self.max_concurrency),
+            transport=transport,
+        )
+
+    async def _request(self, endpoint: str, params: dict) -> dict:
+        """1ページ分のGETリクエスト（429・5xx・通信エラーはリトライ）"""
+        url = f"{self.base_url}{endpoint}"
+        max_attempts = self.retry_policy.max_attempts
+
+        for attempt in range(max_attempts):
+            try:
+                async with self._semaphore:
+                    with metrics.timer("ratelimit_wait_seconds"):
+                        await self._limiter.acquire_async()
+                    with metrics.timer("http_request_seconds", endpoint=endpoint):
+                        resp = await self._client.get(url, params=params)
+            except httpx.TransportError as e:
+                if attempt + 1 >= max_attempts:
+                    raise
+                metrics.inc("http_retries_total", endpoint=endpoint, reason="transport")
+                delay = self.retry_policy.backoff(attempt)
+                logger.warning(f"通信エラー {attempt + 1}/{max_attempts}: {endpoint} {e} ({delay:.1f}秒後に再試行)")
+                await asyncio.sleep(delay)
+                continue
+
+            if is_retryable_status(resp.status_code) and attempt + 1 < max_attempts:
+                metrics.inc("http_retries_total", endpoint=endpoint, reason=resp.status_code)
+                retry_after = self.retry_policy.retry_after(resp)
+                if resp.status_code == 429:
+                    self._limiter.on_throttle(retry_after)
+                delay = retry_after if retry_after is not None else self.retry_policy.backoff(attempt)
+                logger.warning(f"HTTP {resp.status_code} {attempt + 1}/{max_attempts}: {endpoint} ({delay:.1f}秒後に再試行)")
+                await asyncio.sleep(delay)
+                continue
+
+            resp.raise_for_status()
+            self._limiter.on_success()
+            metrics.inc("http_response_bytes_total", len(resp.content), endpoint=endpoint)
+            with metrics.timer("json_decode_seconds", endpoint=endpoint):
+                return loads(resp.content)
+
+    async def _iter_pages(
+        self, endpoint: str, params: Optional[dict] = None
+    ) -> AsyncIterator[dict]:
+        """GETリクエスト（ページ単位で逐次返す）
+
+        キャッシュは全ページを1件として扱い、最後のページまで取得できたときだけ保存する。
+        """
+        cached = self._cache.get(endpoint, params) if self._cache else None
+        if cached is not None:
+            for data in cached:
+                metrics.inc("pages_total", endpoint=endpoint, source="cache")
+                yield data
+            return
+
+        pages = []
+        next_token = None
+        while True:
+            request_params = params.copy() if params else {}
+            if next_token:
+                request_params["pagination_key"] = next_token
+
+            data = await self._request(endpoint, request_params)
+            metrics.inc("pages_total", endpoint=endpoint, source="api")
+            if self._cache:
+                pages.append(data)
+
+            yield data
+
+            next_token = data.get("pagination_key")
+            if not next_token:
+                break
+
+        if self._cache:
+            self._cache.put(endpoint, params, pages)
+
+    async def _get(self, endpoint: str, params: Optional[dict] = None) -> dict:
+        """GETリクエスト（全ページをマージして返す）"""
+        all_data = {}
+        async for data in self._iter_pages(endpoint, params):
+            _merge_page(all_data, data)
+        return all_data
+
+    async def iter_frames(
+        self, endpoint: str, data_key: str, params: Optional[dict] = None
+    ) -> AsyncIterator[pd.DataFrame]:
+        """ページごとのレコードをDataFrameで逐次返す（ストリーミング）"""
+        async for data in self._iter_pages(endpoint, params):
+            items = data.get(data_key) or data.get("data") or []
+            if items:
+                yield decode_records(items, data_key)
+
+    async def fetch_frame(
+        self, endpoint: str, data_key: str, params: Optional[dict] = None
+    ) -> pd.DataFrame:
+        """エンドポイントを取得してDataFrameで返す"""
+        data = await self._get(endpoint, params)
+        items = data.get(data_key) or data.get("data") or []
+        return decode_records(items, data_key)
+
+    async def gather(self, requests: Iterable[Awaitable]) -> List:
+        """複数リクエストを並列実行（同時実行数はクライアント側で制限）"""
+        return await asyncio.gather(*requests)
+
+    # ─── 銘柄マスタ ───
+
+    async def get_listed_stocks(self) -> pd.DataFrame:
+        """上場銘柄一覧を取得"""
+        return await self.fetch_frame("/equities/master", "equities_master")
+
+    # ─── 株価 ───
+
+    async def get_daily_prices(
+        self,
+        code: Optional[str] = None,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        date: Optional[date] = None,
+    ) -> pd.DataFrame:
+        """株価四本値を取得"""
+        params = _build_params(code=code, from_date=from_date, to_date=to_date, date=date)
+        return await self.fetch_frame("/equities/bars/daily", "equities_bars_daily", params)
+
+    # ─── 財務情報 ───
+
+    async def get_financial_summary(
+        self,
+        code: Optional[str] = None,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        date: Optional[date] = None,
+    ) -> pd.DataFrame:
+        """財務サマリを取得"""
+        params = _build_params(code=code, from_date=from_date, to_date=to_date, date=date)
+        return await self.fetch_frame("/fins/summary", "fins_summary", params)
+
+    # ─── 市場情報 ───
+
+    async def get_trading_calendar(
+        self,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+    ) -> pd.DataFrame:
+        """取引カレンダーを取得"""
+        params = _build_params(from_date=from_date, to_date=to_date)
+        return await self.fetch_frame("/markets/calendar", "trading_calendar", params)
+
+    # ─── 登録済みのデータセット ───
+
+    async def get_dataset_frame(
+        self,
+        name: str,
+        code: Optional[str] = None,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        date: Optional[date] = None,
+    ) -> pd.DataFrame:
+        """services.datasets に登録したデータセットを取得（APIの列名のまま）"""
+        spec = get_dataset(name)
+        params = _build_params(code=code, from_date=from_date, to_date=to_date, date=date)
+        return await self.fetch_frame(spec.endpoint, spec.data_key, params)
+
+    async def fetch_unit(self, name: str, target_date: date) -> pd.DataFrame:
+        """データセットの作業単位（1営業日分、日付指定のないものは全件）を取得"""
+        spec = get_dataset(name)
+        return await self.fetch_frame(spec.endpoint, spec.data_key, spec.params_for(target_date))
+
+    async def aclose(self):
+        """クライアントを閉じる"""
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
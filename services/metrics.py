@@ -0,0 +1,289 @@
+"""同期処理の計測
+
+HTTPリクエスト・デコード・DB書き込みなどのホットパスで
+レイテンシのヒストグラムと件数・バイト数のカウンタを記録し、
+実行ごとのJSONレポートとPrometheusテキスト形式のファイルに出力する。
+
+計測が無効（既定）の場合、各呼び出しはフラグを見て即座に戻る。
+"""
+
+import functools
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# 秒単位のヒストグラムの境界（Prometheusのデフォルトに長めの区間を追加）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# メトリクス名の接頭辞
+PREFIX = "screener_"
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """累積しないバケット数・合計・件数を持つヒストグラム"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 末尾は +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """バケット境界から求めた分位点の上限の目安"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class _Timer:
+    """経過時間をヒストグラムに記録するコンテキストマネージャ"""
+
+    __slots__ = ("registry", "name", "labels", "started")
+
+    def __init__(self, registry: "MetricsRegistry", name: str, labels: dict):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class _NullTimer:
+    """計測無効時のタイマー（何もしない）"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _label_key(labels: dict) -> _LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: _LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class MetricsRegistry:
+    """カウンタとヒストグラムの集計（スレッドセーフ）"""
+
+    def __init__(self, enabled: bool = False, directory: Optional[Path] = None):
+        self.enabled = enabled
+        self.directory = Path(directory) if directory else config.metrics.directory
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[_LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[_LabelKey, Histogram]] = {}
+        self._run_depth = 0
+        self._run_name: Optional[str] = None
+        self._run_started: Optional[datetime] = None
+        self._run_perf = 0.0
+
+    # ─── 記録 ───
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """カウンタを加算"""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """ヒストグラムに値を記録"""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram()
+            hist.observe(value)
+
+    def timer(self, name: str, **labels):
+        """with ブロックの経過時間をヒストグラムに記録"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # ─── 出力 ───
+
+    def snapshot(self) -> dict:
+        """現在の集計値（JSONレポート用）"""
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [{"labels": dict(key), **hist.as_dict()} for key, hist in series.items()]
+                for name, series in self._histograms.items()
+            }
+            derived = self._derived()
+        return {"counters": counters, "histograms": histograms, "derived": derived}
+
+    def _derived(self) -> dict:
+        """行数と所要時間から求めるスループット（ロック取得済みで呼ぶ）"""
+        derived = {}
+        rows = self._counters.get("rows_written_total", {})
+        seconds = self._histograms.get("upsert_seconds", {})
+        for key, value in rows.items():
+            hist = seconds.get(key)
+            if hist is not None and hist.sum > 0:
+                dataset = dict(key).get("dataset", "")
+                derived[f"rows_written_per_sec:{dataset}"] = round(value / hist.sum, 1)
+        return derived
+
+    def to_prometheus(self) -> str:
+        """Prometheusのテキスト形式"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                metric = PREFIX + name
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in series.items():
+                    lines.append(f"{metric}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                metric = PREFIX + name
+                lines.append(f"# TYPE {metric} histogram")
+                for key, hist in series.items():
+                    cumulative = 0
+                    for bound, n in zip(hist.buckets, hist.counts):
+                        cumulative += n
+                        lines.append(f"{metric}_bucket{_format_labels(key, ('le', str(bound)))} {cumulative}")
+                    lines.append(f"{metric}_bucket{_format_labels(key, ('le', '+Inf'))} {hist.count}")
+                    lines.append(f"{metric}_sum{_format_labels(key)} {hist.sum}")
+                    lines.append(f"{metric}_count{_format_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    # ─── 実行単位 ───
+
+    @contextmanager
+    def run(self, name: str):
+        """1回の同期実行を計測し、終了時にレポートを書き出す
+
+        入れ子で呼ばれた場合は最も外側の実行だけがレポートを出力する。
+        """
+        if not self.enabled:
+            yield
+            return
+        with self._lock:
+            self._run_depth += 1
+            outermost = self._run_depth == 1
+        if outermost:
+            self.reset()
+            self._run_name = name
+            self._run_started = datetime.now()
+            self._run_perf = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._run_depth -= 1
+            if outermost:
+                try:
+                    self.write_reports()
+                except OSError as e:
+                    logger.warning(f"計測レポートの出力に失敗: {e}")
+
+    def report(self) -> dict:
+        """直近の実行のレポート"""
+        return {
+            "run": self._run_name,
+            "started_at": self._run_started.isoformat() if self._run_started else None,
+            "elapsed_seconds": round(time.perf_counter() - self._run_perf, 3) if self._run_started else None,
+            **self.snapshot(),
+        }
+
+    def write_reports(self) -> Tuple[Path, Path]:
+        """実行ごとのJSONレポートとPrometheusテキスト（最新で上書き）を書き出す"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        report = self.report()
+        stamp = (self._run_started or datetime.now()).strftime("%Y%m%d-%H%M%S-%f")
+        json_path = self.directory / f"{self._run_name or 'run'}-{stamp}.json"
+        json_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        # node_exporter の textfile collector が途中の内容を読まないよう置き換えで書く
+        prom_path = self.directory / "screener.prom"
+        tmp = prom_path.with_suffix(".prom.tmp")
+        tmp.write_text(self.to_prometheus(), encoding="utf-8")
+        tmp.replace(prom_path)
+
+        logger.info(f"計測レポート出力: {json_path}")
+        return json_path, prom_path
+
+
+metrics = MetricsRegistry(enabled=config.metrics.enabled)
+
+
+def measured_run(name: str):
+    """関数の呼び出しを1回の実行として計測するデコレータ"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.run(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,245 @@
+"""同期パイプライン
+
+バックフィルを「取得 → 変換 → 書き込み」のステージに分けて並行に動かす。
+複数の取得ワーカーが有界キューへ結果を流し込み、
+単一のSQLite書き込みスレッドが大きなトランザクションでまとめてコミットする。
+キューが満杯になると取得側が待機する（バックプレッシャー）ため、
+メモリ使用量は queue_size と commit_rows で頭打ちになる。
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+from config import config
+from db.database import get_session
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 取得ワーカーの終了を書き込み側へ知らせる番兵
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    """ステージごとの処理統計"""
+
+    name: str
+    items: int = 0  # 処理した作業単位数
+    rows: int = 0  # 処理した行数
+    batches: int = 0  # コミット回数（書き込みステージのみ）
+    busy_seconds: float = 0.0  # 処理時間（ワーカー合計）
+    blocked_seconds: float = 0.0  # キュー待ち時間（取得: 満杯で待機 / 書き込み: 空で待機）
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.busy_seconds if self.busy_seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "busy_seconds": round(self.busy_seconds, 3),
+            "blocked_seconds": round(self.blocked_seconds, 3),
+            "rows_per_sec": round(self.rows_per_sec, 1),
+        }
+
+
+class BackfillPipeline:
+    """取得ワーカー群 → 有界キュー → 単一書き込みスレッドのパイプライン
+
+    service は SyncService（_fetch_unit / _prepare_unit / _write_unit /
+    _complete_unit / _on_committed / _on_batch_committed / _record_failure /
+    async_client_factory を使う）。
+    """
+
+    def __init__(
+        self,
+        service,
+        fetch_workers: Optional[int] = None,
+        queue_size: int = 16,
+        commit_rows: int = 100_000,
+        commit_interval: float = 5.0,
+    ):
+        self.service = service
+        self.fetch_workers = fetch_workers or config.jquants.max_concurrency
+        self.queue_size = queue_size  # 取得済み・未書き込みの作業単位の上限
+        self.commit_rows = commit_rows  # 1トランザクションの目安行数
+        self.commit_interval = commit_interval  # 未コミットのまま保持する最大秒数
+        self.stats: Dict[str, StageStats] = {
+            name: StageStats(name) for name in ("fetch", "transform", "write")
+        }
+
+    async def run(self, units: List[tuple], prev_attempts: Optional[dict] = None) -> Dict[str, StageStats]:
+        """作業単位（データセット, 日付）を処理してステージ別統計を返す"""
+        if not units:
+            return self.stats
+        prev_attempts = prev_attempts or {}
+
+        work: asyncio.Queue = asyncio.Queue()
+        for unit in units:
+            work.put_nowait(unit)
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer") as writer_executor:
+            async with self.service.async_client_factory(max_concurrency=self.fetch_workers) as client:
+                workers = [
+                    asyncio.create_task(self._fetch_worker(client, work, results, prev_attempts))
+                    for _ in range(min(self.fetch_workers, len(units)))
+                ]
+                writer = asyncio.create_task(self._writer(results, writer_executor, prev_attempts))
+                try:
+                    await asyncio.gather(*workers)
+                    await results.put(_DONE)
+                    await writer
+                except BaseException:
+                    for task in workers + [writer]:
+                        task.cancel()
+                    raise
+
+        elapsed = time.perf_counter() - started
+        write = self.stats["write"]
+        logger.info(
+            f"パイプライン完了: {write.items}単位 / {write.rows}件 / {elapsed:.1f}秒 "
+            f"({write.rows / elapsed if elapsed else 0:.0f}件/秒)"
+        )
+        for stage in self.stats.values():
+            logger.info(f"  {stage.name}: {stage.as_dict()}")
+        return self.stats
+
+    # ─── 取得・変換 ───
+
+    async def _fetch_worker(self, client, work: asyncio.Queue, results: asyncio.Queue, prev_attempts: dict):
+        loop = asyncio.get_running_loop()
+        fetch = self.stats["fetch"]
+        transform = self.stats["transform"]
+
+        while True:
+            try:
+                dataset, target_date = work.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            attempts = prev_attempts.get((dataset, target_date), 0)
+
+            t0 = time.perf_counter()
+            try:
+                df = await self.service._fetch_unit(client, dataset, target_date)
+            except Exception as e:
+                self.service._record_failure(dataset, target_date, e, attempts)
+                continue
+            finally:
+                fetch.busy_seconds += time.perf_counter() - t0
+            fetch.items += 1
+            fetch.rows += len(df)
+
+            # 変換はイベントループを塞がないよう別スレッドで行う
+            t0 = time.perf_counter()
+            try:
+                records = await loop.run_in_executor(None, self.service._prepare_unit, dataset, df)
+            except Exception as e:
+                self.service._record_failure(dataset, target_date, e, attempts)
+                continue
+            finally:
+                transform.busy_seconds += time.perf_counter() - t0
+            transform.items += 1
+            transform.rows += len(records)
+
+            # キューが満杯なら書き込みが追いつくまで待つ（バックプレッシャー）
+            t0 = time.perf_counter()
+            await results.put((dataset, target_date, records))
+            fetch.blocked_seconds += time.perf_counter() - t0
+
+    # ─── 書き込み ───
+
+    async def _writer(self, results: asyncio.Queue, executor: ThreadPoolExecutor, prev_attempts: dict):
+        loop = asyncio.get_running_loop()
+        write = self.stats["write"]
+        batch: List[tuple] = []
+        batch_rows = 0
+        batch_started = 0.0
+        done = False
+
+        while not done:
+            timeout = None
+            if batch:
+                timeout = max(0.0, self.commit_interval - (time.perf_counter() - batch_started))
+
+            t0 = time.perf_counter()
+            try:
+                item = await asyncio.wait_for(results.get(), timeout)
+            except asyncio.TimeoutError:
+                item = None
+            write.blocked_seconds += time.perf_counter() - t0
+
+            if item is _DONE:
+                done = True
+            elif item is not None:
+                if not batch:
+                    batch_started = time.perf_counter()
+                batch.append(item)
+                batch_rows += len(item[2])
+
+            # 行数が閾値に達したか、一定時間経過したか、終了時にまとめてコミット
+            if batch and (
+                done
+                or item is None
+                or batch_rows >= self.commit_rows
+                or time.perf_counter() - batch_started >= self.commit_interval
+            ):
+                await loop.run_in_executor(executor, self._commit_batch, batch, prev_attempts)
+                batch = []
+                batch_rows = 0
+
+    def _commit_batch(self, batch: List[tuple], prev_attempts: dict):
+        """複数の作業単位を1トランザクションで書き込む（書き込みスレッドで実行）"""
+        write = self.stats["write"]
+        t0 = time.perf_counter()
+        session = get_session()
+        try:
+            for dataset, target_date, records in batch:
+                self.service._write_unit(session, dataset, records)
+                self.service._complete_unit(session, dataset, target_date, len(records))
+            session.commit()
+            metrics.observe("transaction_seconds", time.perf_counter() - t0, dataset="pipeline")
+            for dataset, _, records in batch:
+                self.service._on_committed(dataset, records)
+            self.service._on_batch_committed({dataset for dataset, _, records in batch if records})
+            write.items += len(batch)
+            write.rows += sum(len(records) for _, _, records in batch)
+            write.batches += 1
+            logger.info(f"書き込み完了: {len(batch)}単位 / {sum(len(r) for _, _, r in batch)}件")
+        except Exception as e:
+            session.rollback()
+            logger.warning(f"一括書き込みに失敗したため作業単位ごとに再試行: {e}")
+            self._commit_each(batch, prev_attempts)
+        finally:
+            session.close()
+            write.busy_seconds += time.perf_counter() - t0
+
+    def _commit_each(self, batch: List[tuple], prev_attempts: dict):
+        write = self.stats["write"]
+        committed = set()
+        for dataset, target_date, records in batch:
+            session = get_session()
+            try:
+                self.service._write_unit(session, dataset, records)
+                self.service._complete_unit(session, dataset, target_date, len(records))
+                session.commit()
+                self.service._on_committed(dataset, records)
+                if records:
+                    committed.add(dataset)
+                write.items += 1
+                write.rows += len(records)
+                write.batches += 1
+            except Exception as e:
+                session.rollback()
+                self.service._record_failure(
+                    dataset, target_date, e, prev_attempts.get((dataset, target_date), 0)
+                )
+            finally:
+                session.close()
+        self.service._on_batch_committed(committed)
@@ -0,0 +1,318 @@
+"""メモリマップの株価キューブ（営業日 × 銘柄 × 項目）
+
+全銘柄の横断的な計算向けに、項目ごとの (営業日, 銘柄) 行列を
+data/cube/ にNumPyの生配列として保存し、np.memmap でゼロコピーに開く。
+行列の軸（営業日・銘柄コード）は index.json（サイドカー）に持つ。
+
+- 営業日は昇順。新しい営業日は末尾への追記、既存の営業日は上書き
+- 過去の営業日の挿入や銘柄数の上限超過は新しい世代のファイルに作り直す
+  （DBからの反映は先に全営業日・銘柄の軸を確保し、作り直しは1回で済ませる）
+- index.json はデータの書き込み後に置き換えるため、読み取り側は常に
+  書き込み済みの範囲だけを見る（reload() で最新の範囲に更新）
+
+    cube = PriceCube.open()
+    close = cube.field("adjustment_close")   # (営業日数, 銘柄数) のゼロコピーのビュー
+    cube.codes, cube.dates                   # 軸
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from config import config
+from db.database import get_read_session
+from models.schemas import DailyPrice
+from services.corporate_actions import register_invalidator
+
+logger = logging.getLogger(__name__)
+
+# 項目と型（価格はfloat32、桁の大きい出来高・売買代金はfloat64）
+FIELDS: Dict[str, str] = {
+    "open": "float32",
+    "high": "float32",
+    "low": "float32",
+    "close": "float32",
+    "volume": "float64",
+    "turnover_value": "float64",
+    "adjustment_factor": "float32",
+    "adjustment_open": "float32",
+    "adjustment_high": "float32",
+    "adjustment_low": "float32",
+    "adjustment_close": "float32",
+    "adjustment_volume": "float64",
+}
+
+INDEX_FILE = "index.json"
+INITIAL_DATE_CAPACITY = 256
+CODE_HEADROOM = 512  # 新規上場に備えた銘柄の空き枠
+
+
+class PriceCube:
+    """営業日 × 銘柄 × 項目 のメモリマップ配列"""
+
+    def __init__(self, directory: Path, index: dict, writable: bool = False):
+        self.directory = Path(directory)
+        self.writable = writable
+        self._index = index
+        self._arrays: Dict[str, np.memmap] = {}
+        self._lock = threading.Lock()
+        self._old_generation: Optional[int] = None
+        self._load_axes()
+
+    # ─── 開く ───
+
+    @classmethod
+    def open(cls, directory: Optional[Path] = None, writable: bool = False) -> "PriceCube":
+        """キューブを開く（書き込み可能で開くと、なければ空のキューブを作る）"""
+        directory = Path(directory or config.cube.directory)
+        path = directory / INDEX_FILE
+        if path.exists():
+            index = json.loads(path.read_text(encoding="utf-8"))
+        elif writable:
+            directory.mkdir(parents=True, exist_ok=True)
+            index = {
+                "generation": 0,
+                "codes": [],
+                "dates": [],
+                "code_capacity": 0,
+                "date_capacity": 0,
+                "fields": FIELDS,
+            }
+        else:
+            raise FileNotFoundError(f"株価キューブがありません: {directory}")
+        return cls(directory, index, writable=writable)
+
+    def reload(self):
+        """index.json を読み直し、書き込み側が追記した範囲まで見えるようにする"""
+        index = json.loads((self.directory / INDEX_FILE).read_text(encoding="utf-8"))
+        with self._lock:
+            if (index["generation"], index["date_capacity"]) != (
+                self._index["generation"], self._index["date_capacity"]
+            ):
+                self._arrays.clear()
+            self._index = index
+            self._load_axes()
+
+    def _load_axes(self):
+        self.codes: List[str] = list(self._index["codes"])
+        self.dates = np.array(self._index["dates"], dtype="datetime64[D]")
+        self.code_index = {code: i for i, code in enumerate(self.codes)}
+
+    # ─── 読み取り ───
+
+    @property
+    def shape(self) -> tuple:
+        return (len(self.dates), len(self.codes), len(FIELDS))
+
+    def _path(self, name: str, generation: Optional[int] = None) -> Path:
+        generation = self._index["generation"] if generation is None else generation
+        return self.directory / f"{name}.{generation}.bin"
+
+    def _array(self, name: str) -> np.memmap:
+        arr = self._arrays.get(name)
+        if arr is None:
+            arr = np.memmap(
+                self._path(name),
+                dtype=FIELDS[name],
+                mode="r+" if self.writable else "r",
+                shape=(self._index["date_capacity"], self._index["code_capacity"]),
+            )
+            self._arrays[name] = arr
+        return arr
+
+    def field(self, name: str) -> np.ndarray:
+        """項目の (営業日, 銘柄) 行列（ゼロコピーのビュー）"""
+        if name not in FIELDS:
+            raise ValueError(f"未知の項目: {name}")
+        if not len(self.dates) or not len(self.codes):
+            return np.empty((len(self.dates), len(self.codes)), dtype=FIELDS[name])
+        return self._array(name)[: len(self.dates), : len(self.codes)]
+
+    def frame(self, name: str) -> pd.DataFrame:
+        """項目の行列を DataFrame（index=営業日, columns=銘柄）で返す"""
+        return pd.DataFrame(
+            self.field(name), index=pd.DatetimeIndex(self.dates), columns=self.codes, copy=False
+        )
+
+    def to_array(self, fields: Optional[Sequence[str]] = None) -> np.ndarray:
+        """(営業日, 銘柄, 項目) の3次元配列（コピー）"""
+        fields = list(fields or FIELDS)
+        return np.stack([self.field(name).astype("float64") for name in fields], axis=-1)
+
+    # ─── 書き込み ───
+
+    def update(self, df: pd.DataFrame, write_index: bool = True) -> int:
+        """縦持ちの株価（code, date, 各項目）を反映し、反映した行数を返す
+
+        write_index=False は index.json を書き換えない（続けて反映したあとに _write_index() を呼ぶ）。
+        """
+        if not self.writable:
+            raise PermissionError("読み取り専用で開いたキューブには書き込めません")
+        if df.empty:
+            return 0
+        df = df.dropna(subset=["code", "date"])
+        row_dates = pd.to_datetime(df["date"]).to_numpy(dtype="datetime64[D]")
+        row_codes = df["code"].astype(str).to_numpy()
+
+        with self._lock:
+            self._extend_axes(np.unique(row_dates), set(row_codes))
+            rows = np.searchsorted(self.dates, row_dates)
+            cols = np.fromiter((self.code_index[c] for c in row_codes), dtype=np.int64, count=len(row_codes))
+            for name, dtype in FIELDS.items():
+                if name in df.columns:
+                    arr = self._array(name)
+                    arr[rows, cols] = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=dtype)
+                    arr.flush()
+            if write_index:
+                self._write_index()
+        return len(df)
+
+    def reserve(self, dates: Iterable[date], codes: Iterable[str]):
+        """営業日・銘柄の軸を先に確保する（追加分はNaN、index.json は書き換えない）"""
+        if not self.writable:
+            raise PermissionError("読み取り専用で開いたキューブには書き込めません")
+        with self._lock:
+            self._extend_axes(np.unique(np.array(list(dates), dtype="datetime64[D]")), set(codes))
+
+    def _extend_axes(self, incoming_dates: np.ndarray, incoming_codes: set):
+        """軸にない営業日・銘柄を加える"""
+        new_dates = np.setdiff1d(incoming_dates, self.dates)
+        new_codes = sorted(incoming_codes - set(self.code_index))
+        if not len(new_dates) and not new_codes:
+            return
+
+        n_codes = len(self.codes) + len(new_codes)
+        all_dates = np.union1d(self.dates, new_dates)
+        if (
+            n_codes > self._index["code_capacity"]
+            or (len(self.dates) and len(new_dates) and new_dates[0] < self.dates[-1])
+        ):
+            # 銘柄の空き枠不足・過去日の挿入は新しい世代に作り直す
+            self._rebuild(all_dates, self.codes + new_codes)
+        else:
+            self._ensure_date_capacity(len(all_dates))
+            self.codes.extend(new_codes)
+            self.dates = all_dates
+        self.code_index = {code: i for i, code in enumerate(self.codes)}
+
+    def _ensure_date_capacity(self, n_dates: int):
+        """営業日の枠が足りなければファイルを伸ばす（追加分はNaNで埋める）"""
+        capacity = self._index["date_capacity"]
+        if n_dates <= capacity:
+            return
+        new_capacity = max(INITIAL_DATE_CAPACITY, capacity)
+        while new_capacity < n_dates:
+            new_capacity *= 2
+        code_capacity = self._index["code_capacity"]
+        self._arrays.clear()
+        for name, dtype in FIELDS.items():
+            itemsize = np.dtype(dtype).itemsize
+            with open(self._path(name), "r+b") as f:
+                f.seek(capacity * code_capacity * itemsize)
+                f.write(np.full((new_capacity - capacity) * code_capacity, np.nan, dtype=dtype).tobytes())
+        self._index["date_capacity"] = new_capacity
+
+    def _rebuild(self, dates: np.ndarray, codes: List[str]):
+        """軸を広げた新しい世代のファイルを作り、既存データを移す"""
+        old_generation = self._index["generation"]
+        old_rows = np.searchsorted(dates, self.dates)
+        old_n_codes = len(self.codes)
+        generation = old_generation + 1
+        date_capacity = max(INITIAL_DATE_CAPACITY, 1 << int(np.ceil(np.log2(max(len(dates), 1)))))
+        code_capacity = len(codes) + CODE_HEADROOM
+
+        for name, dtype in FIELDS.items():
+            new = np.memmap(
+                self._path(name, generation), dtype=dtype, mode="w+", shape=(date_capacity, code_capacity)
+            )
+            new[:] = np.nan
+            if len(self.dates) and old_n_codes:
+                new[old_rows, :old_n_codes] = self._array(name)[: len(self.dates), :old_n_codes]
+            new.flush()
+            del new
+
+        self._arrays.clear()
+        self._index.update(
+            generation=generation, date_capacity=date_capacity, code_capacity=code_capacity
+        )
+        self.codes = list(codes)
+        self.dates = dates
+        self._old_generation = old_generation
+        logger.info(f"株価キューブを再構築: {len(dates)}営業日 × {len(codes)}銘柄")
+
+    def _write_index(self):
+        """軸をindex.jsonに書き出す（置き換えで書くため読み取り側は中途半端な状態を見ない）"""
+        self._index["codes"] = self.codes
+        self._index["dates"] = [str(d) for d in self.dates]
+        path = self.directory / INDEX_FILE
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(self._index, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+        # 旧世代のファイルは削除（開いている読み取り側のマップは有効なまま）
+        if self._old_generation is not None:
+            for name in FIELDS:
+                self._path(name, self._old_generation).unlink(missing_ok=True)
+            self._old_generation = None
+
+    # ─── DBからの反映 ───
+
+    def refresh_from_db(self, dates: Iterable[date], chunk_days: int = 20) -> int:
+        """指定した営業日の株価をDBから読み込んで反映
+
+        先にDBにある営業日・銘柄の軸を確保してから chunk_days ずつ書き込むため、
+        過去の営業日の挿入でも作り直しは1回、index.json の書き換えは最後の1回で済む。
+        """
+        dates = sorted(set(dates))
+        columns = [DailyPrice.code, DailyPrice.date] + [getattr(DailyPrice, name) for name in FIELDS]
+        total = 0
+        session = get_read_session()
+        try:
+            conn = session.connection()
+            chunks = [dates[start:start + chunk_days] for start in range(0, len(dates), chunk_days)]
+            present_dates, present_codes = set(), set()
+            for chunk in chunks:
+                present_dates.update(
+                    conn.execute(select(DailyPrice.date).where(DailyPrice.date.in_(chunk)).distinct()).scalars()
+                )
+                present_codes.update(
+                    conn.execute(select(DailyPrice.code).where(DailyPrice.date.in_(chunk)).distinct()).scalars()
+                )
+            if not present_dates:
+                return 0
+            self.reserve(present_dates, present_codes)
+            for chunk in chunks:
+                df = pd.read_sql(select(*columns).where(DailyPrice.date.in_(chunk)), conn)
+                total += self.update(df, write_index=False)
+        finally:
+            session.close()
+        with self._lock:
+            self._write_index()
+        return total
+
+
+def get_price_cube(writable: bool = False) -> Optional[PriceCube]:
+    """設定で有効な場合に株価キューブを開く（未作成の読み取りはNone）"""
+    if not config.cube.enabled:
+        return None
+    try:
+        return PriceCube.open(writable=writable)
+    except FileNotFoundError:
+        return None
+
+
+def _refresh_adjusted(codes: List[str], prices: pd.DataFrame):
+    """調整後株価を計算し直した銘柄の全期間を書き直す"""
+    if config.cube.enabled and not prices.empty:
+        PriceCube.open(writable=True).update(prices)
+
+
+register_invalidator("price_cube", _refresh_adjusted)
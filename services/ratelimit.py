@@ -0,0 +1,129 @@
+"""APIリクエストのレートリミッタ
+
+プロセス全体で1つのトークンバケットを共有し、
+同期クライアント（スレッド）と非同期クライアント（asyncio）の双方から
+プランのリクエスト上限を超えないように制御する。
+"""
+
+import asyncio
+import threading
+import time
+from typing import Optional
+
+from config import PLAN_RATE_LIMITS, config
+
+
+class TokenBucket:
+    """トークンバケット方式のレートリミッタ（スレッド・asyncio両対応）
+
+    トークンは前借り方式で予約するため、待機中のリクエストも
+    到着順に一定間隔で払い出される。
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate  # 1秒あたりの補充トークン数
+        self.capacity = capacity  # バースト上限
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests: int, capacity: float = 1.0) -> "TokenBucket":
+        """回/分の上限から生成"""
+        return cls(rate=requests / 60.0, capacity=capacity)
+
+    def _reserve(self) -> float:
+        """トークンを1つ予約し、使用可能になるまでの待機秒数を返す"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1.0
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """トークンを取得（同期・ブロッキング）"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """トークンを取得（非同期）"""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        """リクエスト成功の通知（固定レートでは何もしない）"""
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """スロットリング（429）の通知（固定レートでは何もしない）"""
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """スロットリングに応じてレートを自動調整するトークンバケット
+
+    429を受けたらレートを半減し（乗算減少）、Retry-Afterの間は払い出しを止める。
+    成功が続けば一定間隔ごとに上限レートへ向けて徐々に戻す（加算増加）。
+    """
+
+    def __init__(
+        self,
+        max_rate: float,
+        min_rate: Optional[float] = None,
+        capacity: float = 1.0,
+        increase_step: float = 0.1,
+        increase_interval: float = 10.0,
+    ):
+        super().__init__(rate=max_rate, capacity=capacity)
+        self.max_rate = max_rate
+        self.min_rate = min_rate or max_rate / 16
+        self.increase_step = increase_step  # 1回あたりの増加幅（max_rateに対する比率）
+        self.increase_interval = increase_interval  # 増加判定の間隔（秒）
+        self.throttle_count = 0
+        self._last_change = time.monotonic()
+
+    @classmethod
+    def for_plan(cls, plan: Optional[str] = None) -> "AdaptiveTokenBucket":
+        """プランのリクエスト上限から生成"""
+        if plan is None:
+            limit = config.jquants.rate_limit_per_minute
+        else:
+            limit = PLAN_RATE_LIMITS.get(plan, PLAN_RATE_LIMITS["free"])
+        return cls(max_rate=limit / 60.0)
+
+    def on_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.rate >= self.max_rate or now - self._last_change < self.increase_interval:
+                return
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.increase_step)
+            self._last_change = now
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        with self._lock:
+            now = time.monotonic()
+            self.throttle_count += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._last_change = now
+            if retry_after:
+                # Retry-After経過まで次のトークンが払い出されないよう前借りしておく
+                self._tokens = min(self._tokens, -retry_after * self.rate)
+                self._updated = now
+
+
+_shared_limiter: Optional[TokenBucket] = None
+_shared_lock = threading.Lock()
+
+
+def get_rate_limiter() -> TokenBucket:
+    """プロセス共有のレートリミッタを取得"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = AdaptiveTokenBucket.for_plan()
+        return _shared_limiter
@@ -0,0 +1,70 @@
+"""HTTPリクエストのリトライ制御
+
+429・5xx・通信エラーをジッター付き指数バックオフで再試行する。
+Retry-Afterヘッダーがあればその値を優先する（バックオフの上限秒数で頭打ち）。
+"""
+
+import logging
+import random
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# 再試行対象のステータスコード
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class RetryPolicy:
+    """リトライ設定"""
+
+    max_attempts: int = 5  # 初回を含む試行回数
+    base_delay: float = 1.0  # バックオフの基準秒数
+    max_delay: float = 60.0  # バックオフ・Retry-After の上限秒数
+
+    def backoff(self, attempt: int) -> float:
+        """attempt回目（0始まり）の失敗後の待機秒数（Full Jitter）"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def retry_after(self, response: httpx.Response) -> Optional[float]:
+        """レスポンスのRetry-After秒数（max_delayで頭打ち、ヘッダーがなければNone）"""
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None and retry_after > self.max_delay:
+            logger.warning(f"Retry-After {retry_after:.1f}秒は上限を超えるため{self.max_delay:.1f}秒に切り詰めます")
+            return self.max_delay
+        return retry_after
+
+    def delay_for(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """次の試行までの待機秒数"""
+        if response is not None:
+            retry_after = self.retry_after(response)
+            if retry_after is not None:
+                return retry_after
+        return self.backoff(attempt)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-Afterヘッダー（秒数またはHTTP日付）を秒数に変換"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def is_retryable_status(status_code: int) -> bool:
+    return status_code in RETRY_STATUS
@@ -0,0 +1,259 @@
+"""スクリーニング結果のキャッシュ
+
+正規化した条件の定義と、条件が参照するデータセットの版数（services.data_version）の
+ハッシュをキーに結果を保存する。同期で元データが書き込まれると版数が進んでキーが
+変わるため、明示的な無効化なしに次の実行から計算し直される（古いキーはLRUで消える）。
+
+- メモリ: 件数・合計サイズの上限を超えたら最終アクセスの古い順に削除
+- ディスク（data/cache/screens）: 結果の表をParquet、統計などのメタデータをJSON
+  （Parquetのスキーマのメタデータ）で保存し、合計サイズの上限を超えたら最終アクセスの
+  古い順に削除（プロセスをまたいで再利用できる）
+
+共有ディレクトリのファイルを読むため、読み込み時にコードが実行されうる pickle は使わない。
+pyarrow は requirements.txt の依存。入っていない環境では警告を出してメモリだけのキャッシュになる。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+from config import config
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 未インストールならディスクのキャッシュは無効
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Parquetのスキーマのメタデータでメタデータ（JSON）を保存するキー
+META_KEY = b"screen_cache"
+
+Entry = Tuple[pd.DataFrame, dict]
+
+
+class ScreenCache:
+    """版数つきのキーで引くメモリ＋ディスクのLRUキャッシュ"""
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        max_entries: Optional[int] = None,
+        max_memory_bytes: Optional[int] = None,
+        max_disk_bytes: Optional[int] = None,
+    ):
+        settings = config.screen_cache
+        self.directory = Path(directory or settings.directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries if max_entries is not None else settings.max_entries
+        self.max_memory_bytes = max_memory_bytes if max_memory_bytes is not None else settings.max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes if max_disk_bytes is not None else settings.max_disk_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+        self._memory: "OrderedDict[str, Tuple[Entry, int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.disk_enabled = pa is not None
+        if not self.disk_enabled:
+            logger.warning("pyarrow が未インストールのためスクリーニング結果はメモリだけにキャッシュします")
+        # 以前の形式（pickle）のファイルは読まずに削除
+        for legacy in self.directory.glob("*/*.pkl.gz"):
+            legacy.unlink(missing_ok=True)
+        self._disk_bytes = sum(p.stat().st_size for p in self._iter_files())
+
+    # ─── キー ───
+
+    @staticmethod
+    def key(definition: dict, versions: Dict[str, int]) -> str:
+        """正規化した条件の定義＋データセットの版数のハッシュ"""
+        payload = json.dumps(
+            {"definition": definition, "versions": versions},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.parquet"
+
+    def _iter_files(self):
+        return self.directory.glob("*/*.parquet")
+
+    # ─── 読み書き ───
+
+    def get(self, key: str) -> Optional[Entry]:
+        """キャッシュから (結果の表, メタデータ) を取得（メモリ→ディスクの順、なければNone）"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+
+        path = self._path(key)
+        if not self.disk_enabled:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            table = pq.read_table(path)
+            meta = json.loads(table.schema.metadata[META_KEY])
+            frame = table.to_pandas()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"スクリーニング結果のキャッシュ破損のため削除: {path.name} ({e})")
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # LRU判定用に最終アクセス時刻を更新
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.disk_hits += 1
+        entry = (frame, meta)
+        self._remember(key, entry, _frame_size(frame))
+        return entry
+
+    def put(self, key: str, frame: pd.DataFrame, meta: dict):
+        """結果の表とメタデータ（JSONにできる値）をメモリとディスクに保存"""
+        data = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        self._remember(key, (frame, meta), _frame_size(frame))
+        if not self.disk_enabled:
+            return
+
+        table = pa.Table.from_pandas(frame)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), META_KEY: data})
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".tmp{threading.get_ident()}")
+        old_size = path.stat().st_size if path.exists() else 0
+        pq.write_table(table, tmp, compression="zstd")
+        size = tmp.stat().st_size
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._disk_bytes += size - old_size
+            over = self._disk_bytes > self.max_disk_bytes
+        if over:
+            self.evict()
+
+    def _remember(self, key: str, value: Entry, size: int):
+        """メモリに保持し、上限を超えた分を最終アクセスの古い順に捨てる"""
+        if size > self.max_memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= previous[1]
+            self._memory[key] = (value, size)
+            self._memory_bytes += size
+            while self._memory and (
+                len(self._memory) > self.max_entries or self._memory_bytes > self.max_memory_bytes
+            ):
+                _, (_, dropped) = self._memory.popitem(last=False)
+                self._memory_bytes -= dropped
+                self.memory_evictions += 1
+
+    def evict(self):
+        """ディスクの合計サイズが上限の90%以下になるまで古いエントリから削除"""
+        target = int(self.max_disk_bytes * 0.9)
+        files = []
+        for p in self._iter_files():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        files.sort()
+
+        with self._lock:
+            total = sum(size for _, size, _ in files)
+            for _, size, p in files:
+                if total <= target:
+                    break
+                try:
+                    p.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self.disk_evictions += 1
+            self._disk_bytes = total
+
+    def clear(self):
+        """キャッシュを全削除"""
+        for p in self._iter_files():
+            p.unlink(missing_ok=True)
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._disk_bytes = 0
+
+    def _remove(self, path: Path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+
+    # ─── 統計 ───
+
+    def stats(self) -> dict:
+        """ヒット/ミス数・ヒット率とメモリ・ディスクの使用量"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "memory_evictions": self.memory_evictions,
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "disk_evictions": self.disk_evictions,
+            }
+
+
+def _frame_size(frame: pd.DataFrame) -> int:
+    """表のメモリ上のおおよそのバイト数"""
+    return int(frame.memory_usage(deep=True).sum())
+
+
+_shared_cache: Optional[ScreenCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_screen_cache() -> Optional[ScreenCache]:
+    """プロセス共有のスクリーニング結果キャッシュを取得（無効時はNone）"""
+    global _shared_cache
+    if not config.screen_cache.enabled:
+        return None
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ScreenCache()
+        return _shared_cache
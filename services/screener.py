@@ -0,0 +1,747 @@
+"""宣言的なスクリーニングエンジン
+
+条件（項目・演算子・値の組のAND）を受け取り、次の2段階に分けて実行する。
+
+1. 保存済みの列（銘柄マスタ・latest_snapshot・technical_indicators）の条件は
+   1本のSQLにまとめてDBに任せる（市場・業種・時価総額・PER/PBR には索引がある）
+2. 株価の履歴やファンダメンタル指標のパネルから求める派生項目の条件は、
+   SQLを通った銘柄だけについてNumPyのマスクで評価する。推定の通過率と
+   コストから「安くてよく絞れる」順に並べ、重い計算ほど残った銘柄だけで行う
+
+条件ごとに推定通過率・入出力の銘柄数・所要時間を ScreenResult.stats に返す。
+SQLの条件は既定では SQL の段階全体を1行（対象の上場銘柄数 → 通過した銘柄数・
+クエリの時間）にまとめ、条件が1つならその条件の通過率として学習する。条件ごとの
+累積件数は全件を数え直す追加のクエリが要るため、sql_stats=True のときだけ数える
+（派生項目の条件は計算済みのマスクから数える）。
+
+結果は正規化した条件と参照するデータセットの版数をキーにキャッシュする
+（services.screen_cache）。同期で元データが書き込まれるまでは同じ条件の再実行で
+株価・財務を読み直さない。
+
+    engine = ScreeningEngine()
+    result = engine.run("market == 0111 and per < 15 and return_20 > 0.05")
+    result.frame        # 該当銘柄（条件に使った項目の値つき）
+    result.stats_frame  # 条件ごとの件数・時間
+"""
+
+import json
+import logging
+import operator
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, field, replace
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.sql.elements import ColumnElement
+
+from db.database import get_read_session
+from models.schemas import LatestSnapshot, Stock, TechnicalIndicator
+from services.data_version import DATASET_FUNDAMENTALS, DATASET_PRICE_CUBE, get_versions
+from services.datasets import DATASET_DAILY_PRICES
+from services.fundamental import get_fundamentals
+from services.screen_cache import ScreenCache, get_screen_cache
+from services.technical import PriceMatrix, load_prices, sma
+
+logger = logging.getLogger(__name__)
+
+# 演算子
+OPERATORS = ("==", "!=", "<", "<=", ">", ">=", "in", "between")
+
+# 統計のない条件の通過率の既定値（System R の経験則）
+DEFAULT_SELECTIVITY = {
+    "==": 0.05,
+    "!=": 0.95,
+    "<": 1 / 3,
+    "<=": 1 / 3,
+    ">": 1 / 3,
+    ">=": 1 / 3,
+    "between": 0.25,
+}
+
+# 営業日数 → 読み込む暦日数（休日を見込んだ余裕）
+CALENDAR_DAYS_PER_ROW = 1.5
+TRADING_DAYS_PER_YEAR = 245
+
+Condition = Union["Predicate", Tuple[str, str, Any], Dict[str, Any]]
+
+
+# ─── 項目 ───
+
+
+@dataclass(frozen=True)
+class StoredField:
+    """保存済みの列（SQLで評価）"""
+
+    name: str
+    column: Any  # SQLAlchemyの列
+    kind: str = "number"  # number / text
+    label: str = ""
+
+
+@dataclass(frozen=True)
+class DerivedField:
+    """派生項目（SQLを通った銘柄だけNumPyで評価）"""
+
+    name: str
+    source: str  # prices / fundamentals
+    compute: Callable[["_Context", List[str]], np.ndarray]
+    cost: float  # 1銘柄あたりの相対コスト（通過率と合わせて評価順を決める）
+    lookback: int = 0  # 必要な株価の営業日数
+    label: str = ""
+
+
+def _snapshot_fields() -> Dict[str, StoredField]:
+    skip = {"code", "price_date", "disclosed_date", "type_of_document", "updated_at"}
+    return {
+        c.name: StoredField(c.name, c)
+        for c in LatestSnapshot.__table__.columns
+        if c.name not in skip
+    }
+
+
+def _technical_fields() -> Dict[str, StoredField]:
+    return {
+        c.name: StoredField(c.name, c)
+        for c in TechnicalIndicator.__table__.columns
+        if c.name not in ("code", "date")
+    }
+
+
+STORED_FIELDS: Dict[str, StoredField] = {
+    "market": StoredField("market", Stock.market_code, "text", "市場区分コード"),
+    "market_name": StoredField("market_name", Stock.market_name, "text", "市場区分名"),
+    "sector33": StoredField("sector33", Stock.sector33_code, "text", "33業種コード"),
+    "sector33_name": StoredField("sector33_name", Stock.sector33_name, "text", "33業種名"),
+    "sector17": StoredField("sector17", Stock.sector17_code, "text", "17業種コード"),
+    "fiscal_year_end": StoredField("fiscal_year_end", Stock.fiscal_year_end, "text", "決算月"),
+    **_snapshot_fields(),
+    **_technical_fields(),
+}
+
+
+# ─── 派生項目の計算 ───
+
+
+class _Context:
+    """1回の実行で読み込んだ株価・パネル（後の条件は残った銘柄の列を切り出す）"""
+
+    def __init__(self, engine: "ScreeningEngine", rows: int):
+        self.engine = engine
+        self.rows = rows  # 読み込む営業日数（この実行で使う株価の派生項目の最長）
+        self.prices: Optional[PriceMatrix] = None
+        self.prices_index: Dict[str, int] = {}
+        self.fundamentals: Optional[pd.DataFrame] = None
+
+    def close(self, codes: List[str], rows: int) -> np.ndarray:
+        """調整後終値の直近 rows 営業日 (rows, 銘柄数)"""
+        # 残った銘柄は最初に読み込んだ銘柄の部分集合なので、読み込みは1回で済む
+        if self.prices is None or any(c not in self.prices_index for c in codes):
+            self.prices = self.engine.load_prices(codes, max(rows, self.rows))
+            self.prices_index = {c: i for i, c in enumerate(self.prices.codes)}
+        cols = np.array([self.prices_index.get(c, -1) for c in codes], dtype=np.int64)
+        found = cols >= 0
+        rows = min(rows, len(self.prices.dates))
+        out = np.full((rows, len(codes)), np.nan)
+        out[:, found] = self.prices.close[len(self.prices.dates) - rows:, cols[found]]
+        return out
+
+    def fundamental(self, codes: List[str], metric: str) -> np.ndarray:
+        if self.fundamentals is None:
+            self.fundamentals = self.engine.load_fundamentals()
+        return self.fundamentals[metric].reindex(codes).to_numpy(dtype="float64")
+
+
+def _last(x: np.ndarray) -> np.ndarray:
+    return x[-1] if len(x) else np.full(x.shape[1], np.nan)
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    out = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=np.isfinite(denominator) & (denominator > 0))
+    return out
+
+
+def _return(days: int):
+    def compute(ctx: _Context, codes: List[str]) -> np.ndarray:
+        close = ctx.close(codes, days + 1)
+        if len(close) < days + 1:
+            return np.full(len(codes), np.nan)
+        return _ratio(close[-1], close[0]) - 1
+    return compute
+
+
+def _sma_deviation(window: int):
+    def compute(ctx: _Context, codes: List[str]) -> np.ndarray:
+        close = ctx.close(codes, window)
+        return _ratio(_last(close), _last(sma(close, window))) - 1
+    return compute
+
+
+def _high_ratio(window: int):
+    def compute(ctx: _Context, codes: List[str]) -> np.ndarray:
+        close = ctx.close(codes, window)
+        # 全て欠損の銘柄で警告を出さないよう -inf で埋めて最大値を取る
+        high = np.max(np.where(np.isfinite(close), close, -np.inf), axis=0, initial=-np.inf)
+        return _ratio(_last(close), np.where(np.isfinite(high), high, np.nan))
+    return compute
+
+
+def _volatility(window: int):
+    def compute(ctx: _Context, codes: List[str]) -> np.ndarray:
+        close = ctx.close(codes, window + 1)
+        returns = np.log(_ratio(close[1:], close[:-1]))
+        valid = np.isfinite(returns)
+        n = valid.sum(axis=0)
+        filled = np.where(valid, returns, 0.0)
+        mean = _ratio(filled.sum(axis=0), n)
+        var = _ratio((np.where(valid, returns - mean, 0.0) ** 2).sum(axis=0), n - 1)
+        return np.where(n >= window, np.sqrt(var * TRADING_DAYS_PER_YEAR), np.nan)
+    return compute
+
+
+def _fundamental(metric: str):
+    def compute(ctx: _Context, codes: List[str]) -> np.ndarray:
+        return ctx.fundamental(codes, metric)
+    return compute
+
+
+DERIVED_FIELDS: Dict[str, DerivedField] = {
+    f.name: f
+    for f in (
+        DerivedField("roe", "fundamentals", _fundamental("roe"), cost=1.0, label="ROE（通期実績）"),
+        DerivedField("per_actual", "fundamentals", _fundamental("per_actual"), cost=1.0, label="PER（通期実績EPS）"),
+        DerivedField("return_5", "prices", _return(5), cost=5.0, lookback=6, label="5営業日騰落率"),
+        DerivedField("return_20", "prices", _return(20), cost=5.0, lookback=21, label="20営業日騰落率"),
+        DerivedField("return_60", "prices", _return(60), cost=6.0, lookback=61, label="60営業日騰落率"),
+        DerivedField("sma_deviation_25", "prices", _sma_deviation(25), cost=6.0, lookback=25,
+                     label="25日移動平均乖離率"),
+        DerivedField("high_ratio_245", "prices", _high_ratio(245), cost=8.0, lookback=245,
+                     label="52週高値比"),
+        DerivedField("volatility_20", "prices", _volatility(20), cost=7.0, lookback=21,
+                     label="20日ボラティリティ（年率）"),
+    )
+}
+
+
+def field_names() -> Dict[str, str]:
+    """条件に使える項目名 → 説明"""
+    names = {name: f.label or name for name, f in STORED_FIELDS.items()}
+    names.update({name: f.label for name, f in DERIVED_FIELDS.items()})
+    return names
+
+
+# ─── 条件 ───
+
+
+@dataclass(frozen=True)
+class Predicate:
+    """1つの条件（項目 演算子 値）"""
+
+    field: str
+    op: str
+    value: Any
+
+    def __str__(self) -> str:
+        if self.op == "in":
+            return f"{self.field} in ({', '.join(map(str, self.value))})"
+        if self.op == "between":
+            return f"{self.field} between ({self.value[0]}, {self.value[1]})"
+        return f"{self.field} {self.op} {self.value}"
+
+    @property
+    def stored(self) -> bool:
+        return self.field in STORED_FIELDS
+
+    def to_sql(self) -> ColumnElement:
+        column = STORED_FIELDS[self.field].column
+        if self.op == "in":
+            return column.in_(list(self.value))
+        if self.op == "between":
+            return column.between(*self.value)
+        return _COMPARE[self.op](column, self.value)
+
+    def mask(self, values: np.ndarray) -> np.ndarray:
+        """派生項目の値に対する条件のマスク（欠損は不一致）"""
+        with np.errstate(invalid="ignore"):
+            if self.op == "in":
+                return np.isin(values, np.asarray(self.value, dtype="float64"))
+            if self.op == "between":
+                return (values >= self.value[0]) & (values <= self.value[1])
+            return _COMPARE[self.op](values, self.value) & np.isfinite(values)
+
+
+_COMPARE = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def _coerce(kind: str, value: Any) -> Any:
+    if kind == "text":
+        return str(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"数値ではありません: {value}") from None
+
+
+def make_predicate(field_name: str, op: str, value: Any) -> Predicate:
+    """項目・演算子を検証し、値を項目の型に揃えた条件を作る"""
+    op = "==" if op == "=" else op
+    if op not in OPERATORS:
+        raise ValueError(f"未対応の演算子: {op}")
+    if field_name in STORED_FIELDS:
+        kind = STORED_FIELDS[field_name].kind
+    elif field_name in DERIVED_FIELDS:
+        kind = "number"
+    else:
+        raise ValueError(f"未対応の項目: {field_name}")
+
+    if op == "in":
+        values = [value] if isinstance(value, (str, int, float)) else list(value)
+        if not values:
+            raise ValueError(f"{field_name} in の値が空です")
+        return Predicate(field_name, op, tuple(sorted({_coerce(kind, v) for v in values})))
+    if op == "between":
+        low, high = value
+        return Predicate(field_name, op, (_coerce(kind, low), _coerce(kind, high)))
+    return Predicate(field_name, op, _coerce(kind, value))
+
+
+_CLAUSE = re.compile(r"^\s*(\w+)\s*(==|!=|<=|>=|=|<|>|\bin\b|\bbetween\b)\s*(.+?)\s*$", re.IGNORECASE)
+
+
+def _literal(token: str) -> str:
+    token = token.strip()
+    if len(token) >= 2 and token[0] == token[-1] and token[0] in "'\"":
+        return token[1:-1]
+    return token
+
+
+def parse_conditions(text: str) -> List[Predicate]:
+    """"per < 15 and market in (0111, 0112) and roe between (0.1, 0.3)" 形式の条件を解析"""
+    predicates = []
+    for clause in re.split(r"\s+and\s+", text.strip(), flags=re.IGNORECASE):
+        if not clause.strip():
+            continue
+        m = _CLAUSE.match(clause)
+        if m is None:
+            raise ValueError(f"条件を解釈できません: {clause}")
+        name, op, raw = m.group(1), m.group(2).lower(), m.group(3)
+        if op in ("in", "between"):
+            value = [_literal(v) for v in raw.strip().strip("()").split(",") if v.strip()]
+        else:
+            value = _literal(raw)
+        predicates.append(make_predicate(name, op, value))
+    return predicates
+
+
+def normalize_conditions(conditions: Union[str, Sequence[Condition]]) -> List[Predicate]:
+    """文字列・(項目, 演算子, 値) の組・辞書・Predicate を条件のリストに揃える（重複は除く）"""
+    if isinstance(conditions, str):
+        predicates = parse_conditions(conditions)
+    else:
+        predicates = []
+        for c in conditions:
+            if isinstance(c, Predicate):
+                c = (c.field, c.op, c.value)
+            elif isinstance(c, dict):
+                c = (c["field"], c["op"], c["value"])
+            predicates.append(make_predicate(*c))
+    return list(dict.fromkeys(predicates))
+
+
+# ─── 通過率の推定 ───
+
+
+class SelectivityEstimator:
+    """条件の通過率（残る割合）の推定
+
+    観測した通過率があればその指数移動平均、なければ演算子ごとの既定値を使う。
+    """
+
+    def __init__(self, smoothing: float = 0.5):
+        self.smoothing = smoothing
+        self._observed: Dict[Predicate, float] = {}
+        self._lock = threading.Lock()
+
+    def estimate(self, predicate: Predicate) -> float:
+        with self._lock:
+            if predicate in self._observed:
+                return self._observed[predicate]
+        if predicate.op == "in":
+            return min(1.0, DEFAULT_SELECTIVITY["=="] * len(predicate.value))
+        return DEFAULT_SELECTIVITY[predicate.op]
+
+    def observe(self, predicate: Predicate, rows_in: int, rows_out: int):
+        if not rows_in:
+            return
+        observed = rows_out / rows_in
+        with self._lock:
+            prev = self._observed.get(predicate)
+            self._observed[predicate] = (
+                observed if prev is None else self.smoothing * observed + (1 - self.smoothing) * prev
+            )
+
+
+selectivity = SelectivityEstimator()
+
+
+def _rank(predicate: Predicate, estimate: float) -> float:
+    """独立な条件のANDは cost / (1 - 通過率) の小さい順が最も安い"""
+    cost = DERIVED_FIELDS[predicate.field].cost
+    return cost / max(1.0 - estimate, 1e-6)
+
+
+# ─── 実行 ───
+
+
+@dataclass
+class PredicateStats:
+    """条件ごとの実行結果"""
+
+    predicate: str  # SQLの段階全体の行は条件を and でつないだもの
+    stage: str  # sql / numpy
+    estimated_selectivity: float
+    rows_in: Optional[int]
+    rows_out: Optional[int]
+    seconds: Optional[float]  # sql_stats=True の条件ごとの行は1本のクエリで評価するため個別の時間はなし
+
+
+@dataclass
+class ScreenResult:
+    """スクリーニング結果"""
+
+    frame: pd.DataFrame
+    stats: List[PredicateStats] = field(default_factory=list)
+    sql_seconds: float = 0.0
+    seconds: float = 0.0
+    versions: Dict[str, int] = field(default_factory=dict)  # 参照したデータセットの版数
+    cached: bool = False  # キャッシュから返した結果か（stats は計算したときのもの）
+
+    @property
+    def codes(self) -> List[str]:
+        return self.frame["code"].tolist()
+
+    @property
+    def stats_frame(self) -> pd.DataFrame:
+        return pd.DataFrame([s.__dict__ for s in self.stats])
+
+    def cache_meta(self) -> dict:
+        """キャッシュに保存するメタデータ（表以外、JSONにできる値）"""
+        return {
+            "stats": [asdict(s) for s in self.stats],
+            "sql_seconds": self.sql_seconds,
+            "seconds": self.seconds,
+            "versions": self.versions,
+        }
+
+    @classmethod
+    def from_cache(cls, frame: pd.DataFrame, meta: dict) -> "ScreenResult":
+        """キャッシュの表とメタデータから結果を作る"""
+        return cls(
+            frame=frame,
+            stats=[PredicateStats(**s) for s in meta["stats"]],
+            sql_seconds=meta["sql_seconds"],
+            seconds=meta["seconds"],
+            versions=meta["versions"],
+        )
+
+
+@dataclass
+class CompiledScreen:
+    """SQLで評価する条件と、評価順に並べた派生項目の条件"""
+
+    sql: List[Predicate]
+    derived: List[Predicate]
+    estimates: Dict[Predicate, float]
+
+
+# 結果に常に含める列
+BASE_COLUMNS = (Stock.code, Stock.company_name, Stock.market_name, Stock.sector33_name)
+BASE_NAMES = {c.name for c in BASE_COLUMNS}
+SUMMARY_FIELDS = ("close", "market_cap", "per", "pbr")
+
+
+# 派生項目の計算元 → データセット
+SOURCE_DATASETS = {
+    "prices": (DATASET_DAILY_PRICES, DATASET_PRICE_CUBE),
+    "fundamentals": (DATASET_FUNDAMENTALS,),
+}
+
+
+def dependencies(screen: CompiledScreen, columns: Sequence[str] = ()) -> List[str]:
+    """条件・結果の列が参照するデータセット（キャッシュの版数の対象）"""
+    names = [*SUMMARY_FIELDS, *(p.field for p in screen.sql), *(p.field for p in screen.derived), *columns]
+    datasets = {Stock.__tablename__}
+    for name in names:
+        if name in STORED_FIELDS:
+            datasets.add(STORED_FIELDS[name].column.table.name)
+        elif name in DERIVED_FIELDS:
+            datasets.update(SOURCE_DATASETS[DERIVED_FIELDS[name].source])
+    return sorted(datasets)
+
+
+def screen_definition(
+    screen: CompiledScreen,
+    columns: Sequence[str] = (),
+    order_by: Optional[str] = None,
+    ascending: bool = True,
+    limit: Optional[int] = None,
+) -> dict:
+    """条件の順序・書き方によらない正規化した定義（キャッシュのキー）"""
+    conditions = sorted(
+        json.dumps([p.field, p.op, list(p.value) if isinstance(p.value, tuple) else p.value], ensure_ascii=False)
+        for p in [*screen.sql, *screen.derived]
+    )
+    return {
+        "conditions": conditions,
+        "columns": list(columns),
+        "order_by": order_by,
+        "ascending": ascending if order_by is not None else None,
+        "limit": limit,
+    }
+
+
+class ScreeningEngine:
+    """条件をSQLとNumPyのマスクに振り分けて実行する"""
+
+    def __init__(
+        self,
+        estimator: SelectivityEstimator = selectivity,
+        cache: Optional[ScreenCache] = None,
+        use_cache: bool = True,
+        sql_stats: bool = False,
+    ):
+        self.estimator = estimator
+        self.cache = cache if cache is not None else (get_screen_cache() if use_cache else None)
+        # SQLの条件ごとの件数を追加のクエリで数えるか（全件の走査が1回増える）
+        self.sql_stats = sql_stats
+
+    def compile(self, conditions: Union[str, Sequence[Condition]]) -> CompiledScreen:
+        predicates = normalize_conditions(conditions)
+        estimates = {p: self.estimator.estimate(p) for p in predicates}
+        sql = sorted((p for p in predicates if p.stored), key=lambda p: estimates[p])
+        derived = sorted((p for p in predicates if not p.stored), key=lambda p: _rank(p, estimates[p]))
+        return CompiledScreen(sql=sql, derived=derived, estimates=estimates)
+
+    def run(
+        self,
+        conditions: Union[str, Sequence[Condition]],
+        columns: Sequence[str] = (),
+        order_by: Optional[str] = None,
+        ascending: bool = True,
+        limit: Optional[int] = None,
+    ) -> ScreenResult:
+        """条件に合う銘柄を返す（columns は結果に追加する項目）
+
+        参照するデータセットの版数が前回と同じなら、同じ条件の結果をキャッシュから返す。
+        """
+        started = time.perf_counter()
+        screen = self.compile(conditions)
+        columns = list(dict.fromkeys(columns))
+        for name in columns:
+            if name not in STORED_FIELDS and name not in DERIVED_FIELDS:
+                raise ValueError(f"未対応の項目: {name}")
+        if self.cache is None:
+            return self._execute(screen, columns, order_by, ascending, limit, started)
+
+        # 版数は計算の前に読む（計算中に同期が書き込んでも、次回は版数の違いで計算し直す）
+        versions = get_versions(dependencies(screen, columns))
+        definition = screen_definition(screen, columns, order_by, ascending, limit)
+        key = self.cache.key(definition, versions)
+        cached = self.cache.get(key)
+        if cached is not None:
+            frame, meta = cached
+            result = replace(
+                ScreenResult.from_cache(frame.copy(), meta), cached=True, seconds=time.perf_counter() - started
+            )
+            logger.info(f"スクリーニング（キャッシュ）: {len(result.frame)}銘柄")
+            return result
+
+        result = self._execute(screen, columns, order_by, ascending, limit, started)
+        result.versions = versions
+        try:
+            self.cache.put(key, result.frame, result.cache_meta())
+        except Exception as e:
+            logger.warning(f"スクリーニング結果のキャッシュ保存に失敗: {e}")
+        return replace(result, frame=result.frame.copy())
+
+    def _execute(
+        self,
+        screen: CompiledScreen,
+        columns: List[str],
+        order_by: Optional[str],
+        ascending: bool,
+        limit: Optional[int],
+        started: float,
+    ) -> ScreenResult:
+        output = [
+            name for name in dict.fromkeys([*SUMMARY_FIELDS, *[p.field for p in screen.sql], *columns])
+            if name in STORED_FIELDS and name not in BASE_NAMES
+        ]
+        sql_started = time.perf_counter()
+        frame, stats = self._run_sql(screen, output)
+        sql_seconds = time.perf_counter() - sql_started
+
+        price_fields = [
+            DERIVED_FIELDS[name] for name in [*(p.field for p in screen.derived), *columns]
+            if name in DERIVED_FIELDS and DERIVED_FIELDS[name].source == "prices"
+        ]
+        ctx = _Context(self, max((f.lookback for f in price_fields), default=0))
+        for predicate in screen.derived:
+            rows_in = len(frame)
+            t0 = time.perf_counter()
+            if rows_in:
+                codes = frame["code"].tolist()
+                values = DERIVED_FIELDS[predicate.field].compute(ctx, codes)
+                keep = predicate.mask(values)
+                frame = frame.assign(**{predicate.field: values})[keep].reset_index(drop=True)
+                self.estimator.observe(predicate, rows_in, len(frame))
+            stats.append(
+                PredicateStats(
+                    predicate=str(predicate),
+                    stage="numpy",
+                    estimated_selectivity=screen.estimates[predicate],
+                    rows_in=rows_in,
+                    rows_out=len(frame),
+                    seconds=time.perf_counter() - t0,
+                )
+            )
+
+        # 条件に使っていない派生項目の列は残った銘柄だけ計算する
+        for name in columns:
+            if name in DERIVED_FIELDS and name not in frame.columns:
+                values = DERIVED_FIELDS[name].compute(ctx, frame["code"].tolist()) if len(frame) else []
+                frame = frame.assign(**{name: values})
+
+        if order_by is not None:
+            if order_by not in frame.columns:
+                raise ValueError(f"並べ替えの項目が結果にありません: {order_by}")
+            frame = frame.sort_values(order_by, ascending=ascending, na_position="last", kind="mergesort")
+        if limit is not None:
+            frame = frame.head(limit)
+
+        result = ScreenResult(
+            frame=frame.reset_index(drop=True),
+            stats=stats,
+            sql_seconds=sql_seconds,
+            seconds=time.perf_counter() - started,
+        )
+        logger.info(f"スクリーニング: {len(result.frame)}銘柄 / {result.seconds:.3f}秒")
+        return result
+
+    def _run_sql(self, screen: CompiledScreen, output: List[str]) -> Tuple[pd.DataFrame, List[PredicateStats]]:
+        """保存済みの列の条件を1本のSQLで評価する（sql_stats=True なら条件ごとの累積件数も数える）"""
+        tables = {STORED_FIELDS[name].column.table for name in output}
+        tables |= {STORED_FIELDS[p.field].column.table for p in screen.sql}
+        source = Stock.__table__
+        for table in (LatestSnapshot.__table__, TechnicalIndicator.__table__):
+            if table in tables:
+                source = source.outerjoin(table, table.c.code == Stock.code)
+
+        active = Stock.is_active.is_(True)
+        clauses = [p.to_sql() for p in screen.sql]
+        stmt = (
+            select(*BASE_COLUMNS, *[STORED_FIELDS[name].column.label(name) for name in output])
+            .select_from(source)
+            .where(active, *clauses)
+            .order_by(Stock.code)
+        )
+        session = get_read_session()
+        try:
+            t0 = time.perf_counter()
+            frame = pd.read_sql(stmt, session.connection())
+            seconds = time.perf_counter() - t0
+            if not clauses:
+                return frame, []
+            if self.sql_stats:
+                # 条件を推定の通過率の順に1つずつ加えたときの件数（1回の走査で数える）
+                counts = select(
+                    func.count(),
+                    *[func.sum(case((and_(*clauses[:i + 1]), 1), else_=0)) for i in range(len(clauses))],
+                ).select_from(source).where(active)
+                cumulative = [int(n or 0) for n in session.execute(counts).one()]
+            else:
+                # 対象の上場銘柄数だけ数える（銘柄マスタのみで結合なし）
+                total = session.execute(select(func.count()).select_from(Stock).where(active)).scalar()
+                cumulative = [int(total or 0), len(frame)]
+        finally:
+            session.close()
+
+        if self.sql_stats:
+            stats = []
+            for i, predicate in enumerate(screen.sql):
+                rows_in, rows_out = cumulative[i], cumulative[i + 1]
+                self.estimator.observe(predicate, rows_in, rows_out)
+                stats.append(
+                    PredicateStats(
+                        predicate=str(predicate),
+                        stage="sql",
+                        estimated_selectivity=screen.estimates[predicate],
+                        rows_in=rows_in,
+                        rows_out=rows_out,
+                        seconds=None,
+                    )
+                )
+            return frame, stats
+
+        # SQLの段階全体を1行にまとめる（推定は条件が独立とみなした通過率の積）
+        rows_in, rows_out = cumulative
+        if len(screen.sql) == 1:
+            self.estimator.observe(screen.sql[0], rows_in, rows_out)
+        stats = [
+            PredicateStats(
+                predicate=" and ".join(str(p) for p in screen.sql),
+                stage="sql",
+                estimated_selectivity=float(np.prod([screen.estimates[p] for p in screen.sql])),
+                rows_in=rows_in,
+                rows_out=rows_out,
+                seconds=seconds,
+            )
+        ]
+        return frame, stats
+
+    # ─── 派生項目のデータ ───
+
+    def load_prices(self, codes: List[str], rows: int) -> PriceMatrix:
+        """銘柄を絞って直近 rows 営業日の株価を読み込む"""
+        session = get_read_session()
+        try:
+            latest = session.execute(select(func.max(LatestSnapshot.price_date))).scalar()
+        finally:
+            session.close()
+        if latest is None:
+            return load_prices(codes=codes)
+        return load_prices(from_date=latest - timedelta(days=int(rows * CALENDAR_DAYS_PER_ROW) + 10), codes=codes)
+
+    def load_fundamentals(self) -> pd.DataFrame:
+        """ファンダメンタル指標のパネルの最終営業日の値（index=銘柄コード）"""
+        return get_fundamentals().latest()
+
+
+def field_choices(name: str) -> pd.DataFrame:
+    """銘柄マスタの区分項目の選択肢（コードと名称）"""
+    pairs = {
+        "market": (Stock.market_code, Stock.market_name),
+        "sector33": (Stock.sector33_code, Stock.sector33_name),
+        "sector17": (Stock.sector17_code, Stock.sector17_name),
+    }
+    if name not in pairs:
+        raise ValueError(f"選択肢のない項目: {name}")
+    code, label = pairs[name]
+    stmt = select(code.label("code"), label.label("name")).where(Stock.is_active.is_(True)).distinct().order_by(code)
+    session = get_read_session()
+    try:
+        return pd.read_sql(stmt, session.connection())
+    finally:
+        session.close()
@@ -0,0 +1,150 @@
+"""銘柄ごとの最新スナップショット（latest_snapshot）
+
+スクリーニングの起点となる「銘柄ごとの最新の株価＋最新の財務」を
+1銘柄1行のテーブルに実体化する。SyncService は同期でコミットした銘柄だけを
+差分更新するため、スクリーニングは数千行の走査で済む。
+
+- 株価は (code, date) 主キーを使って銘柄ごとの最終日の行を引く
+- 財務は項目ごとに直近の開示で値のあるもの（予想の修正のみの開示でも実績が欠けない）
+- 時価総額・PER・PBR・配当利回りは最新の終値と株式数・1株当たり指標から求める
+"""
+
+import logging
+from datetime import datetime
+from typing import Iterable, List
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Connection
+
+from models.schemas import DailyPrice, FinancialSummary, LatestSnapshot
+from services.datasets import frame_to_records
+
+logger = logging.getLogger(__name__)
+
+# スナップショットに載せる株価・財務の列（元テーブルと同じ列名）
+PRICE_COLUMNS = ("close", "adjustment_close", "volume", "turnover_value")
+FINANCIAL_COLUMNS = (
+    "net_sales",
+    "operating_profit",
+    "ordinary_profit",
+    "profit",
+    "earnings_per_share",
+    "total_assets",
+    "equity",
+    "equity_to_asset_ratio",
+    "book_value_per_share",
+    "result_dividend_per_share_annual",
+    "forecast_net_sales",
+    "forecast_operating_profit",
+    "forecast_ordinary_profit",
+    "forecast_profit",
+    "forecast_earnings_per_share",
+    "forecast_dividend_per_share_annual",
+    "shares_outstanding",
+    "treasury_shares",
+)
+
+# 1回のSELECT・executemanyで扱う銘柄数
+CODE_CHUNK_SIZE = 500
+
+
+def _latest_prices(conn: Connection, codes: List[str]) -> pd.DataFrame:
+    """銘柄ごとの最終日の株価"""
+    latest = (
+        select(DailyPrice.code, func.max(DailyPrice.date).label("date"))
+        .where(DailyPrice.code.in_(codes))
+        .group_by(DailyPrice.code)
+        .subquery()
+    )
+    stmt = select(
+        DailyPrice.code,
+        DailyPrice.date.label("price_date"),
+        *[getattr(DailyPrice, c) for c in PRICE_COLUMNS],
+    ).join(latest, and_(DailyPrice.code == latest.c.code, DailyPrice.date == latest.c.date))
+    return pd.read_sql(stmt, conn)
+
+
+def _latest_financials(conn: Connection, codes: List[str]) -> pd.DataFrame:
+    """銘柄ごとの直近の開示（項目ごとに値のある最新の開示）"""
+    stmt = (
+        select(
+            FinancialSummary.code,
+            FinancialSummary.disclosed_date,
+            FinancialSummary.type_of_document,
+            *[getattr(FinancialSummary, c) for c in FINANCIAL_COLUMNS],
+        )
+        .where(FinancialSummary.code.in_(codes))
+        .order_by(FinancialSummary.code, FinancialSummary.disclosed_date, FinancialSummary.disclosed_time)
+    )
+    df = pd.read_sql(stmt, conn)
+    if df.empty:
+        return df
+    # GroupBy.last は列ごとに欠損を飛ばした最後の値を返す
+    return df.groupby("code", sort=False, as_index=False).last()
+
+
+def _ratio(numerator: pd.Series, denominator: pd.Series) -> np.ndarray:
+    """分母が正の場合だけの比率（それ以外は欠損）"""
+    num = pd.to_numeric(numerator, errors="coerce").to_numpy(dtype="float64")
+    den = pd.to_numeric(denominator, errors="coerce").to_numpy(dtype="float64")
+    out = np.full(len(num), np.nan)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+def snapshot_frame(prices: pd.DataFrame, financials: pd.DataFrame) -> pd.DataFrame:
+    """最新の株価と財務からスナップショットの行を作る"""
+    if financials.empty:
+        financials = pd.DataFrame(columns=["code", "disclosed_date", "type_of_document", *FINANCIAL_COLUMNS])
+    if prices.empty:
+        prices = pd.DataFrame(columns=["code", "price_date", *PRICE_COLUMNS])
+    df = prices.merge(financials, on="code", how="outer")
+
+    close = pd.to_numeric(df["close"], errors="coerce")
+    shares = pd.to_numeric(df["shares_outstanding"], errors="coerce") - pd.to_numeric(
+        df["treasury_shares"], errors="coerce"
+    ).fillna(0)
+    df["market_cap"] = close * shares.where(shares > 0)
+    df["per"] = _ratio(close, df["forecast_earnings_per_share"])
+    df["pbr"] = _ratio(close, df["book_value_per_share"])
+    df["dividend_yield"] = _ratio(df["forecast_dividend_per_share_annual"], close)
+    return df
+
+
+def refresh_snapshot(conn: Connection, codes: Iterable[str]) -> int:
+    """指定した銘柄のスナップショットを作り直す（コミットは呼び出し側）"""
+    codes = sorted({c for c in codes if c})
+    columns = [c.name for c in LatestSnapshot.__table__.columns if c.name != "updated_at"]
+    now = datetime.utcnow()
+    stmt = insert(LatestSnapshot)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["code"],
+        set_={**{c: stmt.excluded[c] for c in columns if c != "code"}, "updated_at": now},
+    )
+
+    written = 0
+    for start in range(0, len(codes), CODE_CHUNK_SIZE):
+        chunk = codes[start:start + CODE_CHUNK_SIZE]
+        df = snapshot_frame(_latest_prices(conn, chunk), _latest_financials(conn, chunk))
+        records = frame_to_records(df, {c: c for c in columns})
+        for r in records:
+            r["updated_at"] = now
+        if records:
+            conn.execute(stmt, records)
+        # 株価・財務のどちらもなくなった銘柄は削除
+        missing = sorted(set(chunk) - set(df["code"]))
+        if missing:
+            conn.execute(delete(LatestSnapshot).where(LatestSnapshot.code.in_(missing)))
+        written += len(records)
+    return written
+
+
+def rebuild_snapshot(conn: Connection) -> int:
+    """全銘柄のスナップショットを作り直す（コミットは呼び出し側）"""
+    codes = select(DailyPrice.code).distinct().union(select(FinancialSummary.code).distinct())
+    existing = select(LatestSnapshot.code)
+    all_codes = {row[0] for row in conn.execute(codes)} | {row[0] for row in conn.execute(existing)}
+    return refresh_snapshot(conn, all_codes)
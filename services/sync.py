@@ -3,75 +3,233 @@
 J-Quants APIからデータを取得し、DBに保存する処理をまとめたモジュール。
 """
 
+import asyncio
+import hashlib
 import logging
+from dataclasses import dataclass
 from datetime import date, datetime, timedelta
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, List, Optional
 
 import pandas as pd
+from sqlalchemy import bindparam, func, or_, select, update
 from sqlalchemy.orm import Session
 from sqlalchemy.dialects.sqlite import insert
 
+from config import config
 from db.database import get_session
-from models.schemas import Stock, DailyPrice, FinancialSummary
-from services.jquants import JQuantsClient
+from models.schemas import Stock, SyncJob, SyncState
+from services.columnar import PriceStore, get_price_store
+from services.corporate_actions import CorporateActionHandler
+from services.datasets import (
+    ALL_DATASETS,
+    DATASET_DAILY_PRICES,
+    DATASET_FIN_SUMMARY,
+    DATE_AXIS_SNAPSHOT,
+    DatasetSpec,
+    frame_to_records,
+    get_dataset,
+)
+from services.data_version import (
+    DATASET_FUNDAMENTALS,
+    DATASET_LATEST_SNAPSHOT,
+    DATASET_PRICE_CUBE,
+    DATASET_STOCKS,
+    DATASET_TECHNICAL_INDICATORS,
+    bump_versions,
+)
+from services.fundamental import refresh_fundamentals
+from services.indicator_state import refresh_indicators
+from services.jquants import AsyncJQuantsClient, JQuantsClient
+from services.metrics import measured_run, metrics
+from services.pipeline import BackfillPipeline
+from services.price_cube import PriceCube
+from services.snapshot import refresh_snapshot
 
 logger = logging.getLogger(__name__)
 
+# 日付単位で同期するデータセット（既定の差分同期対象）
+HISTORICAL_DATASETS = (DATASET_DAILY_PRICES, DATASET_FIN_SUMMARY)
 
-class SyncService:
-    def __init__(self):
-        self.client = JQuantsClient()
+# ジョブジャーナルの状態
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
 
-    def _safe_float(self, value):
-        if value is None or value == "":
-            return None
-        try:
-            return float(value)
-        except (ValueError, TypeError):
-            return None
+# 取引カレンダーの休日区分のうち、株式の営業日（"1": 営業日, "2": 半日立会）
+BUSINESS_DAY_DIVISIONS = {"1", "2"}
 
-    def _safe_date(self, value):
-        if value is None or value == "":
-            return None
-        return pd.to_datetime(value).date()
+# 銘柄マスタAPIの列名 → Stockの列名
+STOCK_COLUMNS = {
+    "Code": "code",
+    "CoName": "company_name",
+    "CoNameEn": "company_name_english",
+    "S17": "sector17_code",
+    "S17Nm": "sector17_name",
+    "S33": "sector33_code",
+    "S33Nm": "sector33_name",
+    "Mkt": "market_code",
+    "MktNm": "market_name",
+    "Mrgn": "margin_code",
+}
+
+# 1回のexecutemanyで送る行数
+UPSERT_CHUNK_SIZE = 1000
+# ジャーナルの既存行を引くときの1回のIN句の日付数
+JOURNAL_LOOKUP_CHUNK_SIZE = 500
+
+
+def _execute_chunked(session: Session, stmt, records: List[dict]):
+    """同一ステートメントをチャンク単位のexecutemanyで実行"""
+    conn = session.connection()
+    for start in range(0, len(records), UPSERT_CHUNK_SIZE):
+        conn.execute(stmt, records[start:start + UPSERT_CHUNK_SIZE])
+
+
+@dataclass
+class FailedUnit:
+    """同期に失敗した作業単位（データセット×日付）"""
+
+    dataset: str
+    target_date: date
+    error: str
+    attempts: int = 1
 
-    def sync_stocks(self):
-        """銘柄マスタの同期"""
+
+@dataclass
+class StockSyncReport:
+    """銘柄マスタ同期の変更内容"""
+
+    inserted: List[str]
+    updated: List[str]
+    delisted: List[str]
+    unchanged: int
+
+    @property
+    def changed_codes(self) -> List[str]:
+        """新規・変更・上場廃止となった銘柄コード"""
+        return self.inserted + self.updated + self.delisted
+
+
+def _row_hashes(records: List[dict], columns: List[str]) -> List[str]:
+    """レコードごとの内容ハッシュ"""
+    return [
+        hashlib.sha1(
+            "\x1f".join("" if r[c] is None else str(r[c]) for c in columns).encode("utf-8")
+        ).hexdigest()
+        for r in records
+    ]
+
+
+class SyncService:
+    def __init__(
+        self,
+        client: Optional[JQuantsClient] = None,
+        async_client_factory: Optional[Callable[..., AsyncJQuantsClient]] = None,
+        price_store: Optional[PriceStore] = None,
+    ):
+        self.client = client or JQuantsClient()
+        self.async_client_factory = async_client_factory or AsyncJQuantsClient
+        # 株価の列指向ストア（無効ならNone）
+        self.price_store = price_store or get_price_store()
+        # 実行中にコミットした株価の営業日（実行の最後に派生データへまとめて反映）
+        self._touched_price_dates: set = set()
+        # 実行中に株価の行を挿入・変更した銘柄 → その最も古い営業日
+        # （派生データは反映済みの日以前が変わった銘柄だけを計算し直す）
+        self._changed_prices: Dict[str, date] = {}
+        # 実行中に分割・併合を反映した銘柄（実行の最後に派生データへ通知）
+        self.corporate_actions = CorporateActionHandler()
+        self._adjusted_codes: set = set()
+        # 実行中に株価・財務をコミットした銘柄（実行の最後に最新スナップショットを更新）
+        self._snapshot_codes: set = set()
+        # 失敗した作業単位のリトライキュー
+        self.retry_queue: List[FailedUnit] = []
+        # 直近のパイプライン実行のステージ別統計
+        self.last_pipeline_stats: dict = {}
+
+    @measured_run("sync_stocks")
+    def sync_stocks(self) -> Optional[StockSyncReport]:
+        """銘柄マスタの同期
+
+        各行の内容ハッシュを保存済みのものと比較し、
+        新規・変更・上場廃止（is_active=False）の銘柄だけをまとめて書き込む。
+        """
         logger.info("銘柄マスタ同期開始")
         df = self.client.get_listed_stocks()
         if df.empty:
             logger.warning("銘柄データが取得できませんでした")
-            return
+            return None
+
+        records = frame_to_records(df, STOCK_COLUMNS)
+        # 同一コードが複数行ある場合は後勝ち
+        records = list({r["code"]: r for r in records}.values())
+        hashes = _row_hashes(records, list(STOCK_COLUMNS.values()))
 
         session = get_session()
         try:
-            # バルクインサート（SQLiteのupsert構文を使用）
-            for _, row in df.iterrows():
-                stmt = insert(Stock).values(
-                    code=row["Code"],
-                    company_name=row["CoName"],
-                    company_name_english=row.get("CoNameEn"),
-                    sector17_code=row.get("S17"),
-                    sector17_name=row.get("S17Nm"),
-                    sector33_code=row.get("S33"),
-                    sector33_name=row.get("S33Nm"),
-                    market_code=row.get("Mkt"),
-                    market_name=row.get("MktNm"),
-                    margin_code=row.get("Mrgn"),
-                    updated_at=datetime.utcnow(),
+            stored = {
+                code: (content_hash, is_active)
+                for code, content_hash, is_active in session.execute(
+                    select(Stock.code, Stock.content_hash, Stock.is_active)
                 )
-                # コンフリクト時は更新
-                stmt = stmt.on_conflict_do_update(
-                    index_elements=["code"],
-                    set_={
-                        "company_name": stmt.excluded.company_name,
-                        "updated_at": datetime.utcnow(),
-                    },
+            }
+
+            now = datetime.utcnow()
+            inserted, updated, changed_records = [], [], []
+            for record, content_hash in zip(records, hashes):
+                current = stored.get(record["code"])
+                if current is None:
+                    inserted.append(record["code"])
+                elif current != (content_hash, True):
+                    updated.append(record["code"])
+                else:
+                    continue
+                changed_records.append(
+                    {**record, "content_hash": content_hash, "is_active": True, "updated_at": now}
                 )
-                session.execute(stmt)
-            
-            session.commit()
-            logger.info(f"銘柄マスタ同期完了: {len(df)}件")
+
+            incoming = {r["code"] for r in records}
+            delisted = [
+                code for code, (_, is_active) in stored.items()
+                if is_active and code not in incoming
+            ]
+
+            with metrics.timer("transaction_seconds", dataset="stocks"):
+                if changed_records:
+                    stmt = insert(Stock)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["code"],
+                        set_={
+                            c: stmt.excluded[c]
+                            for c in changed_records[0]
+                            if c != "code"
+                        },
+                    )
+                    _execute_chunked(session, stmt, changed_records)
+
+                if delisted:
+                    stmt = (
+                        update(Stock)
+                        .where(Stock.code == bindparam("b_code"))
+                        .values(is_active=False, updated_at=now)
+                    )
+                    _execute_chunked(session, stmt, [{"b_code": code} for code in delisted])
+
+                session.commit()
+            if changed_records or delisted:
+                self._bump_versions(DATASET_STOCKS)
+            metrics.inc("rows_written_total", len(changed_records) + len(delisted), dataset="stocks")
+            report = StockSyncReport(
+                inserted=inserted,
+                updated=updated,
+                delisted=delisted,
+                unchanged=len(records) - len(inserted) - len(updated),
+            )
+            logger.info(
+                f"銘柄マスタ同期完了: 新規{len(inserted)}件 / 変更{len(updated)}件 / "
+                f"廃止{len(delisted)}件 / 変更なし{report.unchanged}件"
+            )
+            return report
         except Exception as e:
             session.rollback()
             logger.error(f"銘柄マスタ同期エラー: {e}")
@@ -79,50 +237,74 @@ class SyncService:
         finally:
             session.close()
 
+    def _upsert(
+        self, session: Session, spec: DatasetSpec, records: List[dict], returning: bool = False
+    ) -> List[tuple]:
+        """データセットの自然キーでレコードをUPSERT（コミットは呼び出し側）
+
+        returning=True の場合は値の変わらない行を書き換えず、
+        挿入・変更した行の自然キーを返す。
+        """
+        if not records:
+            return []
+        key_columns = list(spec.natural_key)
+        update_columns = spec.update_columns or [c for c in records[0] if c not in key_columns]
+        stmt = insert(spec.model)
+        set_ = {c: stmt.excluded[c] for c in update_columns}
+        if "updated_at" in spec.model.__table__.c:
+            set_["updated_at"] = datetime.utcnow()
+        if not returning:
+            stmt = stmt.on_conflict_do_update(index_elements=key_columns, set_=set_)
+            with metrics.timer("upsert_seconds", dataset=spec.name):
+                _execute_chunked(session, stmt, records)
+            metrics.inc("rows_written_total", len(records), dataset=spec.name)
+            return []
+
+        table = spec.model.__table__
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_=set_,
+            where=or_(*(table.c[c].is_distinct_from(stmt.excluded[c]) for c in update_columns)),
+        ).returning(*(table.c[c] for c in key_columns))
+        changed = []
+        conn = session.connection()
+        with metrics.timer("upsert_seconds", dataset=spec.name):
+            for start in range(0, len(records), UPSERT_CHUNK_SIZE):
+                changed.extend(tuple(row) for row in conn.execute(stmt, records[start:start + UPSERT_CHUNK_SIZE]))
+        metrics.inc("rows_written_total", len(changed), dataset=spec.name)
+        return changed
+
+    def _write_daily_prices(self, session: Session, records: List[dict]):
+        """株価レコードをUPSERT（コミットは呼び出し側）
+
+        新しく現れた分割・併合は、UPSERTの前に同じトランザクションで保存済みの
+        調整後株価へ反映する（各行の基準は保存済みの値から判定する）。
+        """
+        codes = self.corporate_actions.rescale(session.connection(), records)
+        # ロールバックされても派生データの通知・計算し直しが余分に走るだけ（DBから作り直す）
+        self._adjusted_codes.update(codes)
+        changed = self._upsert(session, get_dataset(DATASET_DAILY_PRICES), records, returning=True)
+        for code, day in changed:
+            if day < self._changed_prices.get(code, date.max):
+                self._changed_prices[code] = day
+
     def _save_daily_prices(self, df: pd.DataFrame):
-        """株価データのDB保存（共通処理）"""
+        """株価データのDB保存（共通処理）
+
+        NaN→NULL変換と日付の正規化を列単位で行い、
+        uix_code_date をキーにしたUPSERTをまとめて実行する。
+        """
         if df.empty:
             return
 
+        records = get_dataset(DATASET_DAILY_PRICES).to_records(df)
         session = get_session()
         try:
-            for _, row in df.iterrows():
-                # NaNをNoneに変換
-                row = row.where(pd.notnull(row), None)
-                
-                date_val = row["Date"]
-                if hasattr(date_val, "date"):
-                    date_val = date_val.date()
-
-                stmt = insert(DailyPrice).values(
-                    code=row["Code"],
-                    date=date_val,
-                    open=row["O"],
-                    high=row["H"],
-                    low=row["L"],
-                    close=row["C"],
-                    volume=row["Vo"],
-                    turnover_value=row["Va"],
-                    adjustment_factor=row["AdjFactor"],
-                    adjustment_open=row["AdjO"],
-                    adjustment_high=row["AdjH"],
-                    adjustment_low=row["AdjL"],
-                    adjustment_close=row["AdjC"],
-                    adjustment_volume=row["AdjVo"],
-                )
-                stmt = stmt.on_conflict_do_update(
-                    index_elements=["code", "date"],
-                    set_={
-                        "close": stmt.excluded.close,
-                        "volume": stmt.excluded.volume,
-                        # 必要に応じて更新項目を追加
-                        "adjustment_close": stmt.excluded.adjustment_close,
-                        "adjustment_factor": stmt.excluded.adjustment_factor,
-                    },
-                )
-                session.execute(stmt)
-            
-            session.commit()
+            with metrics.timer("transaction_seconds", dataset=DATASET_DAILY_PRICES):
+                self._write_daily_prices(session, records)
+                session.commit()
+            self._on_committed(DATASET_DAILY_PRICES, records)
+            self._on_batch_committed({DATASET_DAILY_PRICES})
             logger.info(f"株価保存完了: {len(df)}件")
         except Exception as e:
             session.rollback()
@@ -131,81 +313,57 @@ class SyncService:
         finally:
             session.close()
 
-    def sync_daily_prices(self, code: str, from_date: date, to_date: date):
-        """日足株価の同期（個別銘柄・期間指定）"""
+    @measured_run("sync_daily_prices")
+    def sync_daily_prices(self, code: str, from_date: date, to_date: date, refresh: bool = False):
+        """日足株価の同期（個別銘柄・期間指定、refresh=True で派生データも更新）"""
         logger.info(f"株価同期開始: {code} ({from_date} ~ {to_date})")
-        df = self.client.get_daily_prices(code=code, from_date=from_date, to_date=to_date)
-        if df.empty:
+        # ページ単位で保存し、期間が長くてもメモリを一定に保つ
+        total = 0
+        for df in self.client.iter_daily_prices(code=code, from_date=from_date, to_date=to_date):
+            self._save_daily_prices(df)
+            total += len(df)
+        if refresh:
+            self.refresh_derived()
+        if total == 0:
             logger.warning(f"株価データなし: {code}")
-            return
-        self._save_daily_prices(df)
 
-    def sync_daily_prices_on_date(self, target_date: date):
-        """日足株価の同期（全銘柄・日付指定）"""
+    @measured_run("sync_daily_prices_on_date")
+    def sync_daily_prices_on_date(self, target_date: date, refresh: bool = False):
+        """日足株価の同期（全銘柄・日付指定、refresh=True で派生データも更新）"""
         logger.info(f"全銘柄株価同期開始: {target_date}")
-        df = self.client.get_daily_prices(date=target_date) # code指定なし
-        if df.empty:
+        total = 0
+        for df in self.client.iter_daily_prices(date=target_date): # code指定なし
+            self._save_daily_prices(df)
+            total += len(df)
+        if refresh:
+            self.refresh_derived()
+        if total == 0:
             logger.warning(f"株価データなし: {target_date}")
             return
-        logger.info(f"取得件数: {len(df)}件 (at {target_date})")
-        self._save_daily_prices(df)
+        self._mark_synced(DATASET_DAILY_PRICES, target_date, total)
+        logger.info(f"取得件数: {total}件 (at {target_date})")
+
+    def _write_financial_summary(self, session: Session, records: List[dict]):
+        """財務サマリレコードをUPSERT（コミットは呼び出し側）"""
+        self._upsert(session, get_dataset(DATASET_FIN_SUMMARY), records)
 
     def _save_financial_summary(self, df: pd.DataFrame):
-        """財務サマリのDB保存（共通処理）"""
+        """財務サマリのDB保存（共通処理）
+
+        (code, disclosed_date, disclosed_time, type_of_document) をキーにUPSERTするため、
+        同じ日付を再同期しても行は重複しない。
+        """
         if df.empty:
             return
 
+        records = get_dataset(DATASET_FIN_SUMMARY).to_records(df)
         session = get_session()
         try:
-            for _, row in df.iterrows():
-                # Date型変換
-                disclosed_date = self._safe_date(row.get("DiscDate"))
-                
-                # 四半期情報の取得
-                quarter = None
-                per_type = str(row.get("CurPerType", ""))
-                if "1Q" in per_type: quarter = 1
-                elif "2Q" in per_type: quarter = 2
-                elif "3Q" in per_type: quarter = 3
-                elif "4Q" in per_type: quarter = 4
-
-                stmt = insert(FinancialSummary).values(
-                    code=row.get("Code"),
-                    disclosed_date=disclosed_date,
-                    disclosed_time=row.get("DiscTime"),
-                    type_of_document=row.get("DocType"),
-                    fiscal_year=row.get("CurFYSt")[0:4] if row.get("CurFYSt") else None,
-                    fiscal_quarter=quarter,
-                    
-                    net_sales=self._safe_float(row.get("Sales")),
-                    operating_profit=self._safe_float(row.get("OP")),
-                    ordinary_profit=self._safe_float(row.get("OdP")),
-                    profit=self._safe_float(row.get("NP")),
-                    earnings_per_share=self._safe_float(row.get("EPS")),
-                    
-                    forecast_net_sales=self._safe_float(row.get("FSales")),
-                    forecast_operating_profit=self._safe_float(row.get("FOP")),
-                    forecast_ordinary_profit=self._safe_float(row.get("FOdP")),
-                    forecast_profit=self._safe_float(row.get("FNP")),
-                    forecast_earnings_per_share=self._safe_float(row.get("FEPS")),
-                    
-                    total_assets=self._safe_float(row.get("TA")),
-                    equity=self._safe_float(row.get("Eq")),
-                    equity_to_asset_ratio=self._safe_float(row.get("EqAR")),
-                    book_value_per_share=self._safe_float(row.get("BPS")),
-                    cash_flows_from_operating=self._safe_float(row.get("CFO")),
-                    cash_flows_from_investing=self._safe_float(row.get("CFI")),
-                    cash_flows_from_financing=self._safe_float(row.get("CFF")),
-                    
-                    result_dividend_per_share_annual=self._safe_float(row.get("DivTotalAnn")),
-                    forecast_dividend_per_share_annual=self._safe_float(row.get("FDivTotalAnn")),
-                    
-                    updated_at=datetime.utcnow(),
-                )
-                # 財務データはユニーク制約がないため単発追加
-                session.execute(stmt)
-
-            session.commit()
+            with metrics.timer("transaction_seconds", dataset=DATASET_FIN_SUMMARY):
+                self._write_financial_summary(session, records)
+                session.commit()
+            self._on_committed(DATASET_FIN_SUMMARY, records)
+            self._on_batch_committed({DATASET_FIN_SUMMARY})
             logger.info(f"財務サマリ保存完了: {len(df)}件")
         except Exception as e:
             session.rollback()
@@ -214,44 +372,553 @@ class SyncService:
         finally:
             session.close()
 
-    def sync_financial_summary(self, code: str, from_date: date, to_date: date):
-        """財務サマリの同期（個別銘柄・期間指定）"""
+    @measured_run("sync_financial_summary")
+    def sync_financial_summary(self, code: str, from_date: date, to_date: date, refresh: bool = False):
+        """財務サマリの同期（個別銘柄・期間指定、refresh=True で派生データも更新）"""
         logger.info(f"財務サマリ同期開始: {code}")
-        df = self.client.get_financial_summary(code=code, from_date=from_date, to_date=to_date)
-        if df.empty:
+        total = 0
+        for df in self.client.iter_financial_summary(code=code, from_date=from_date, to_date=to_date):
+            self._save_financial_summary(df)
+            total += len(df)
+        if refresh:
+            self.refresh_derived()
+        if total == 0:
             logger.warning(f"財務データなし: {code}")
-            return
-        self._save_financial_summary(df)
 
-    def sync_financial_summary_on_date(self, target_date: date):
-        """財務サマリの同期（全銘柄・日付指定）"""
+    @measured_run("sync_financial_summary_on_date")
+    def sync_financial_summary_on_date(self, target_date: date, refresh: bool = False):
+        """財務サマリの同期（全銘柄・日付指定、refresh=True で派生データも更新）"""
         logger.info(f"全銘柄財務サマリ同期開始: {target_date}")
-        df = self.client.get_financial_summary(date=target_date) # code指定なし
-        if df.empty:
+        total = 0
+        for df in self.client.iter_financial_summary(date=target_date): # code指定なし
+            self._save_financial_summary(df)
+            total += len(df)
+        if refresh:
+            self.refresh_derived()
+        self._mark_synced(DATASET_FIN_SUMMARY, target_date, total)
+        if total == 0:
             logger.warning(f"財務データなし: {target_date}")
             return
-        logger.info(f"取得件数: {len(df)}件 (at {target_date})")
-        self._save_financial_summary(df)
+        logger.info(f"取得件数: {total}件 (at {target_date})")
+
+    @measured_run("sync_all_historical_data")
+    def sync_all_historical_data(
+        self, from_date: date, to_date: date, max_concurrency: Optional[int] = None
+    ) -> List[FailedUnit]:
+        """指定期間の全銘柄データを同期（日付を並列取得）
+
+        この実行で失敗した作業単位は retry_queue に積まれ、戻り値としても返す。
+        """
+        asyncio.run(
+            self.async_sync_all_historical_data(from_date, to_date, max_concurrency)
+        )
+        return list(self.retry_queue)
 
-    def sync_all_historical_data(self, from_date: date, to_date: date):
-        """指定期間の全銘柄データを同期（日付ループ）"""
+    async def async_sync_all_historical_data(
+        self, from_date: date, to_date: date, max_concurrency: Optional[int] = None
+    ):
+        """指定期間の全銘柄データを同期（非同期版）
+
+        日付×データセットの作業単位を並列に取得し、
+        取得できたものから順にDBへ保存する。
+        """
         logger.info(f"過去全データ同期開始: {from_date} ~ {to_date}")
-        
-        current = from_date
-        while current <= to_date:
-            # 土日はスキップしてもいいが、APIが空を返すだけなのでそのまま呼ぶ
-            # ただし無駄なリクエストを避けるなら平日チェックを入れる
-            if current.weekday() < 5: # 月(0)〜金(4)
-                logger.info(f"--- Processing {current} ---")
-                try:
-                    self.sync_daily_prices_on_date(current)
-                    self.sync_financial_summary_on_date(current)
-                except Exception as e:
-                    logger.error(f"Error on {current}: {e}")
-                    # 個別の日付のエラーで全体を止めない
-            else:
-                logger.debug(f"Skipping weekend: {current}")
-
-            current += timedelta(days=1)
-        
+
+        # 休場日は無駄なリクエストを避けるためスキップ
+        dates = self.business_days(from_date, to_date)
+
+        units = [(dataset, d) for d in dates for dataset in HISTORICAL_DATASETS]
+        # 前の実行の失敗はジョブジャーナルに記録済み（resume() で再実行）
+        self.retry_queue = []
+        try:
+            await self._run_units(units, max_concurrency)
+        finally:
+            self.refresh_derived()
+
+        if self.retry_queue:
+            logger.warning(f"失敗した作業単位: {len(self.retry_queue)}件（retry_failed()で再実行）")
         logger.info("過去全データ同期完了")
+
+    # ─── 取引カレンダー・同期状態 ───
+
+    def business_days(self, from_date: date, to_date: date) -> List[date]:
+        """期間内の営業日（取引カレンダーから取得、失敗時は平日で代用）"""
+        try:
+            df = self.client.get_trading_calendar(from_date=from_date, to_date=to_date)
+        except Exception as e:
+            logger.warning(f"取引カレンダー取得失敗のため平日で代用: {e}")
+            df = pd.DataFrame()
+
+        if df.empty or "HolDiv" not in df.columns:
+            days = []
+            current = from_date
+            while current <= to_date:
+                if current.weekday() < 5:  # 月(0)〜金(4)
+                    days.append(current)
+                current += timedelta(days=1)
+            return days
+
+        mask = df["HolDiv"].astype(str).isin(BUSINESS_DAY_DIVISIONS)
+        return sorted(pd.to_datetime(df.loc[mask, "Date"]).dt.date)
+
+    def _mark_synced(
+        self,
+        dataset: str,
+        target_date: date,
+        row_count: int,
+        session: Optional[Session] = None,
+    ):
+        """作業単位の完了を同期状態に記録（session指定時はコミットしない）"""
+        if row_count == 0 and get_dataset(dataset).empty_means_missing:
+            return
+        stmt = insert(SyncState).values(
+            dataset=dataset,
+            date=target_date,
+            row_count=row_count,
+            synced_at=datetime.utcnow(),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["dataset", "date"],
+            set_={"row_count": stmt.excluded.row_count, "synced_at": stmt.excluded.synced_at},
+        )
+        if session is not None:
+            session.execute(stmt)
+            return
+        session = get_session()
+        try:
+            session.execute(stmt)
+            session.commit()
+        finally:
+            session.close()
+
+    def get_watermark(self, dataset: str) -> Optional[date]:
+        """データセットの同期済み最新日付"""
+        session = get_session()
+        try:
+            return session.execute(
+                select(func.max(SyncState.date)).where(SyncState.dataset == dataset)
+            ).scalar()
+        finally:
+            session.close()
+
+    def pending_units(
+        self,
+        datasets=HISTORICAL_DATASETS,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        lookback_days: int = 30,
+    ) -> List[tuple]:
+        """未同期・要再取得の作業単位（データセット×営業日）
+
+        データの確定時刻（JQUANTS_PUBLISH_TIME）より前に取得した記録は確定前の可能性が
+        あるため再取得の対象とし、確定後に取得した営業日は取り直さない。
+        日付指定のないデータセット（決算発表予定など）は当日未取得なら対象とする。
+        """
+        to_date = to_date or config.jquants.latest_available_date()
+        from_date = from_date or to_date - timedelta(days=lookback_days)
+        days = self.business_days(from_date, to_date)
+
+        session = get_session()
+        try:
+            synced = {
+                (dataset, d): synced_at
+                for dataset, d, synced_at in session.execute(
+                    select(SyncState.dataset, SyncState.date, SyncState.synced_at).where(
+                        SyncState.dataset.in_(datasets),
+                        SyncState.date.between(from_date, to_date),
+                    )
+                )
+            }
+        finally:
+            session.close()
+
+        units = []
+        daily = [ds for ds in datasets if get_dataset(ds).date_axis != DATE_AXIS_SNAPSHOT]
+        for d in days:
+            for dataset in daily:
+                synced_at = synced.get((dataset, d))
+                if synced_at is None or synced_at < config.jquants.publish_cutoff(d):
+                    units.append((dataset, d))
+
+        # 日付指定のないデータセットは当日1回分の作業単位として扱う
+        today = date.today()
+        for dataset in datasets:
+            if dataset not in daily and not self._synced_on(dataset, today):
+                units.append((dataset, today))
+        return units
+
+    def _synced_on(self, dataset: str, target_date: date) -> bool:
+        session = get_session()
+        try:
+            return session.get(SyncState, (dataset, target_date)) is not None
+        finally:
+            session.close()
+
+    @measured_run("incremental_sync")
+    def incremental_sync(
+        self,
+        datasets=HISTORICAL_DATASETS,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        lookback_days: int = 30,
+        max_concurrency: Optional[int] = None,
+    ) -> List[FailedUnit]:
+        """未同期・要再取得の営業日だけを同期（日次バッチ用）
+
+        取引カレンダーを1回だけ取得し、同期状態と突き合わせて対象を決める。
+        datasets=ALL_DATASETS を指定すると登録済みの全エンドポイントを同期する。
+        この実行で失敗した作業単位を返す（retry_queue にも積まれる）。
+        """
+        units = self.pending_units(datasets, from_date, to_date, lookback_days)
+        logger.info(f"差分同期開始: {len(units)}件")
+        # 前の実行の失敗はジョブジャーナルに記録済み（resume() で再実行）
+        self.retry_queue = []
+        try:
+            if units:
+                asyncio.run(self._run_units(units, max_concurrency))
+        finally:
+            self.refresh_derived()
+        logger.info("差分同期完了")
+        return list(self.retry_queue)
+
+    @measured_run("retry_failed")
+    def retry_failed(self, max_concurrency: Optional[int] = None) -> List[FailedUnit]:
+        """リトライキューの作業単位を再実行し、なお失敗したものを返す"""
+        if not self.retry_queue:
+            return []
+        units = list(dict.fromkeys((u.dataset, u.target_date) for u in self.retry_queue))
+        self.retry_queue = []
+        logger.info(f"リトライ開始: {len(units)}件")
+        try:
+            asyncio.run(self._run_units(units, max_concurrency))
+        finally:
+            self.refresh_derived()
+        return list(self.retry_queue)
+
+    # ─── ジョブジャーナル ───
+
+    @measured_run("resume")
+    def resume(self, max_attempts: int = 3, max_concurrency: Optional[int] = None) -> List[FailedUnit]:
+        """中断したバックフィルを再開
+
+        実行中のまま残った作業単位（プロセスが落ちたもの）を未実行に戻し、
+        未実行・失敗の作業単位を max_attempts 回まで再実行する。
+        """
+        session = get_session()
+        try:
+            session.execute(
+                update(SyncJob)
+                .where(SyncJob.status == JOB_RUNNING)
+                .values(status=JOB_PENDING, updated_at=datetime.utcnow())
+            )
+            session.commit()
+            units = [
+                (dataset, d)
+                for dataset, d in session.execute(
+                    select(SyncJob.dataset, SyncJob.date)
+                    .where(
+                        SyncJob.status.in_([JOB_PENDING, JOB_FAILED]),
+                        SyncJob.attempts < max_attempts,
+                    )
+                    .order_by(SyncJob.date, SyncJob.dataset)
+                )
+            ]
+        finally:
+            session.close()
+
+        logger.info(f"バックフィル再開: {len(units)}件")
+        if units:
+            self.retry_queue = []
+            try:
+                asyncio.run(self._run_units(units, max_concurrency))
+            finally:
+                self.refresh_derived()
+        summary = self.journal_summary()
+        if summary.get(JOB_FAILED):
+            logger.warning(f"失敗した作業単位: {summary[JOB_FAILED]}件")
+        return list(self.retry_queue)
+
+    def journal_summary(self) -> Dict[str, int]:
+        """ジョブジャーナルの状態別件数"""
+        session = get_session()
+        try:
+            return dict(
+                session.execute(
+                    select(SyncJob.status, func.count()).group_by(SyncJob.status)
+                ).all()
+            )
+        finally:
+            session.close()
+
+    def _journal_start(self, units: List[tuple]) -> Dict[tuple, int]:
+        """作業単位を実行中として記録し、これまでの実行回数を返す"""
+        session = get_session()
+        try:
+            # ジャーナル全体ではなく、今回の作業単位の行だけを引く
+            by_dataset: Dict[str, List[date]] = {}
+            for dataset, d in units:
+                by_dataset.setdefault(dataset, []).append(d)
+            prev_attempts = {}
+            for dataset, dates in by_dataset.items():
+                dates = sorted(set(dates))
+                for start in range(0, len(dates), JOURNAL_LOOKUP_CHUNK_SIZE):
+                    chunk = dates[start:start + JOURNAL_LOOKUP_CHUNK_SIZE]
+                    for d, attempts in session.execute(
+                        select(SyncJob.date, SyncJob.attempts).where(
+                            SyncJob.dataset == dataset, SyncJob.date.in_(chunk)
+                        )
+                    ):
+                        prev_attempts[(dataset, d)] = attempts or 0
+
+            now = datetime.utcnow()
+            records = [
+                {
+                    "dataset": dataset,
+                    "date": d,
+                    "status": JOB_RUNNING,
+                    "attempts": prev_attempts.get((dataset, d), 0) + 1,
+                    "last_error": None,
+                    "updated_at": now,
+                }
+                for dataset, d in units
+            ]
+            stmt = insert(SyncJob)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["dataset", "date"],
+                set_={
+                    "status": stmt.excluded.status,
+                    "attempts": stmt.excluded.attempts,
+                    "last_error": stmt.excluded.last_error,
+                    "updated_at": stmt.excluded.updated_at,
+                },
+            )
+            _execute_chunked(session, stmt, records)
+            session.commit()
+            return prev_attempts
+        finally:
+            session.close()
+
+    def _journal_failures(self, failures: List[FailedUnit]):
+        """失敗した作業単位をジャーナルに記録"""
+        if not failures:
+            return
+        stmt = (
+            update(SyncJob)
+            .where(SyncJob.dataset == bindparam("b_dataset"), SyncJob.date == bindparam("b_date"))
+            .values(
+                status=JOB_FAILED,
+                last_error=bindparam("b_error"),
+                updated_at=datetime.utcnow(),
+            )
+        )
+        session = get_session()
+        try:
+            _execute_chunked(
+                session,
+                stmt,
+                [
+                    {"b_dataset": u.dataset, "b_date": u.target_date, "b_error": u.error}
+                    for u in failures
+                ],
+            )
+            session.commit()
+        finally:
+            session.close()
+
+    async def _fetch_unit(
+        self, client: AsyncJQuantsClient, dataset: str, target_date: date
+    ) -> pd.DataFrame:
+        return await client.fetch_unit(dataset, target_date)
+
+    def _prepare_unit(self, dataset: str, df: pd.DataFrame) -> List[dict]:
+        """取得結果をDB書き込み用のレコードに変換"""
+        return get_dataset(dataset).to_records(df)
+
+    def _write_unit(self, session: Session, dataset: str, records: List[dict]):
+        """レコードを書き込む（コミットは呼び出し側）"""
+        if dataset == DATASET_DAILY_PRICES:
+            # 分割・併合の反映を同じトランザクションで行う
+            self._write_daily_prices(session, records)
+            return
+        self._upsert(session, get_dataset(dataset), records)
+
+    def _on_committed(self, dataset: str, records: List[dict]):
+        """コミット済みのレコードをDB以外のストアへ反映
+
+        DBが正であるため、ここでの失敗は同期を止めずに警告のみとする
+        （次回の再同期で上書きされる）。
+        """
+        if not records:
+            return
+        if dataset == DATASET_DAILY_PRICES:
+            self._touched_price_dates.update(r["date"] for r in records)
+        if dataset in HISTORICAL_DATASETS:
+            self._snapshot_codes.update(r["code"] for r in records)
+        if dataset == DATASET_DAILY_PRICES and self.price_store is not None:
+            try:
+                with metrics.timer("columnar_write_seconds"):
+                    self.price_store.write(records)
+            except Exception as e:
+                logger.warning(f"列指向ストアへの書き込みに失敗: {e}")
+
+    def _on_batch_committed(self, datasets: Iterable[str]):
+        """1トランザクションでコミットしたデータセットの版数をまとめて1つ進める
+
+        書き込みスレッドのバッチごとに1回だけ呼ぶ（作業単位ごとに版数を書き込むと
+        単一書き込みのパイプラインに書き込みトランザクションが増えるため）。
+        """
+        datasets = sorted(set(datasets))
+        if datasets:
+            self._bump_versions(*datasets)
+
+    def apply_corporate_actions(self) -> List[str]:
+        """この実行で分割・併合を反映した銘柄を派生データ（株価キューブなど）へ通知
+
+        調整後株価自体は株価の書き込みと同じトランザクションで更新済み
+        （services.corporate_actions）。
+        """
+        if not self._adjusted_codes:
+            return []
+        codes = sorted(self._adjusted_codes)
+        self.corporate_actions.notify(codes)
+        # 失敗時は次の実行で計算し直せるよう残しておく
+        self._adjusted_codes.difference_update(codes)
+        return codes
+
+    def refresh_derived(self):
+        """この実行でコミットした営業日・銘柄をまとめてコーポレートアクション・
+        最新スナップショット・株価キューブ・テクニカル指標・ファンダメンタル指標に反映
+
+        incremental_sync / sync_all_historical_data / resume / retry_failed は最後に
+        1回だけ呼ぶ。個別の同期（sync_daily_prices など）は refresh=True を指定するか、
+        続けて同期したあとにこれを呼ぶ。
+        """
+        try:
+            self.apply_corporate_actions()
+        finally:
+            dates = sorted(self._touched_price_dates)
+            changed = dict(self._changed_prices)
+            fundamentals_changed = bool(self._snapshot_codes) or bool(dates)
+            self.refresh_snapshot()
+            self.refresh_price_cube(dates)
+            self.refresh_indicators(dates, changed)
+            if fundamentals_changed:
+                self.refresh_fundamentals(dates, changed)
+            # 反映した営業日・銘柄は次の実行では対象にしない
+            self._touched_price_dates.difference_update(dates)
+            for code, day in changed.items():
+                if self._changed_prices.get(code) == day:
+                    del self._changed_prices[code]
+
+    def refresh_indicators(self, dates: List[date], changed: Optional[Dict[str, date]] = None) -> int:
+        """コミットした営業日をテクニカル指標（indicator_state / technical_indicators）に反映
+
+        changed は株価の行が変わった銘柄 → 最も古い営業日（None は不明として扱う）。
+        """
+        if not dates:
+            return 0
+        try:
+            with metrics.timer("indicator_refresh_seconds"):
+                n = refresh_indicators(dates, changed)
+            self._bump_versions(DATASET_TECHNICAL_INDICATORS)
+            return n
+        except Exception as e:
+            logger.warning(f"テクニカル指標の更新に失敗: {e}")
+            return 0
+
+    def refresh_fundamentals(self, dates: List[date], changed: Optional[Dict[str, date]] = None) -> int:
+        """コミットした営業日・開示をファンダメンタル指標の日次パネルに反映
+
+        changed は株価の行が変わった銘柄 → 最も古い営業日（None は不明として扱う）。
+        """
+        if not config.fundamentals.enabled:
+            return 0
+        try:
+            with metrics.timer("fundamentals_refresh_seconds"):
+                panel = refresh_fundamentals(dates, changed)
+            self._bump_versions(DATASET_FUNDAMENTALS)
+            return len(panel.dates)
+        except Exception as e:
+            logger.warning(f"ファンダメンタル指標の更新に失敗: {e}")
+            return 0
+
+    def refresh_snapshot(self) -> int:
+        """この実行でコミットした銘柄の最新スナップショット（latest_snapshot）を更新"""
+        if not self._snapshot_codes:
+            return 0
+        codes = sorted(self._snapshot_codes)
+        session = get_session()
+        try:
+            with metrics.timer("snapshot_refresh_seconds"):
+                n = refresh_snapshot(session.connection(), codes)
+                session.commit()
+            self._bump_versions(DATASET_LATEST_SNAPSHOT)
+            # 失敗時は次の実行で更新できるよう残しておく
+            self._snapshot_codes.difference_update(codes)
+            logger.info(f"最新スナップショット更新: {n}銘柄")
+            return n
+        except Exception as e:
+            session.rollback()
+            logger.warning(f"最新スナップショットの更新に失敗: {e}")
+            return 0
+        finally:
+            session.close()
+
+    def refresh_price_cube(self, dates: List[date]) -> int:
+        """コミットした営業日の株価を株価キューブに反映"""
+        if not config.cube.enabled or not dates:
+            return 0
+        try:
+            with metrics.timer("cube_refresh_seconds"):
+                cube = PriceCube.open(writable=True)
+                n = cube.refresh_from_db(dates)
+            self._bump_versions(DATASET_PRICE_CUBE)
+            logger.info(f"株価キューブ更新: {len(dates)}営業日 / {n}件")
+            return n
+        except Exception as e:
+            logger.warning(f"株価キューブの更新に失敗: {e}")
+            return 0
+
+    def _bump_versions(self, *datasets: str):
+        """コミットしたデータセットの版数を進める（失敗しても同期は止めない）"""
+        try:
+            bump_versions(datasets)
+        except Exception as e:
+            logger.warning(f"データセットの版数の更新に失敗: {e}")
+
+    def _record_failure(self, dataset: str, target_date: date, error, prev_attempts: int = 0):
+        """失敗した作業単位をリトライキューへ積む"""
+        # 個別の作業単位のエラーで全体を止めない
+        logger.error(f"Error on {dataset} {target_date}: {error}")
+        self.retry_queue.append(
+            FailedUnit(
+                dataset=dataset,
+                target_date=target_date,
+                error=str(error),
+                attempts=prev_attempts + 1,
+            )
+        )
+
+    def _complete_unit(self, session: Session, dataset: str, target_date: date, row_count: int):
+        """作業単位の完了をデータと同じトランザクションで記録"""
+        self._mark_synced(dataset, target_date, row_count, session=session)
+        session.execute(
+            update(SyncJob)
+            .where(SyncJob.dataset == dataset, SyncJob.date == target_date)
+            .values(status=JOB_DONE, last_error=None, updated_at=datetime.utcnow())
+        )
+
+    async def _run_units(self, units: List[tuple], max_concurrency: Optional[int] = None):
+        """作業単位をパイプライン（取得→変換→書き込み）で処理
+
+        作業単位の状態はジョブジャーナル（sync_jobs）に記録する。
+        完了はデータの書き込みと同一トランザクションで記録されるため、
+        途中でプロセスが落ちても resume() で続きから再開できる。
+        """
+        prev_attempts = self._journal_start(units)
+        failed_before = len(self.retry_queue)
+        pipeline = BackfillPipeline(self, fetch_workers=max_concurrency)
+        try:
+            self.last_pipeline_stats = await pipeline.run(units, prev_attempts)
+        finally:
+            self._journal_failures(self.retry_queue[failed_before:])
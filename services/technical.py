@@ -0,0 +1,383 @@
+"""テクニカル分析（全銘柄一括の2次元計算）
+
+調整後の四本値・出来高を (営業日, 銘柄) の行列に揃え、移動平均・MACD・RSI・
+ボリンジャーバンド・ATR・出来高倍率を全銘柄まとめてNumPyの行列演算で計算する。
+銘柄ごとに ta のパイプラインを約4,000回回す代わりに、営業日方向の演算を
+全銘柄の列に対して一度に行う。
+
+各指標の定義は ta（fillna=False）と同じ:
+
+- SMA / ボリンジャーバンド: 期間内に欠損があれば欠損（rolling(min_periods=window)）
+- EMA / MACD / RSI: pandas の ewm(adjust=False) と同じ漸化式（欠損日は値を持ち越す）
+- ATR: 最初の window 日の真の値幅の平均（欠損は除く）から始める Wilder の平滑化
+
+ATR は計算開始後の値が ta と一致する（ベンチマークで確認）。ta と異なるのは次の点だけ:
+
+- 計算開始前（最初に値幅が出た日から window－1 営業日）は ta の 0 ではなく欠損
+- 計算開始の起点は銘柄の最初の行ではなく最初に値幅が出た日（初日が売買不成立の
+  銘柄は ta より1日遅く計算を始める。翌日以降の値は一致する）
+- 計算開始後に売買不成立の日（真の値幅が欠損）があると ta は以降ずっと欠損に
+  なるが、こちらは前日のATRを持ち越して平滑化を続ける
+
+    prices = load_prices(from_date=date(2023, 1, 1))
+    values = compute_indicators(prices)       # 指標名 → (営業日, 銘柄) の行列
+    latest = latest_indicators(prices)        # 最終営業日の値（index=銘柄コード）
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from db.database import get_read_session
+from models.schemas import DailyPrice
+from services.price_cube import get_price_cube
+
+logger = logging.getLogger(__name__)
+
+# 既定の期間
+SMA_WINDOWS = (5, 25, 75)
+EMA_WINDOWS = (12, 26)
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+RSI_WINDOW = 14
+BOLLINGER_WINDOW, BOLLINGER_DEV = 20, 2.0
+ATR_WINDOW = 14
+VOLUME_RATIO_WINDOW = 20
+
+# 行列に読み込む列（調整後の値）
+PRICE_FIELDS = {
+    "close": "adjustment_close",
+    "high": "adjustment_high",
+    "low": "adjustment_low",
+    "volume": "adjustment_volume",
+}
+
+
+@dataclass
+class PriceMatrix:
+    """(営業日, 銘柄) に揃えた調整後の株価"""
+
+    dates: np.ndarray  # datetime64[D]
+    codes: List[str]
+    close: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    volume: np.ndarray
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.close.shape
+
+
+# ─── 読み込み ───
+
+
+def load_prices(
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    codes: Optional[Sequence[str]] = None,
+) -> PriceMatrix:
+    """調整後の株価を (営業日, 銘柄) の行列で読み込む"""
+    dates, selected, values = load_fields(PRICE_FIELDS.values(), from_date, to_date, codes)
+    return PriceMatrix(
+        dates=dates, codes=selected, **{name: values[field] for name, field in PRICE_FIELDS.items()}
+    )
+
+
+def load_fields(
+    fields: Iterable[str],
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    codes: Optional[Sequence[str]] = None,
+) -> Tuple[np.ndarray, List[str], Dict[str, np.ndarray]]:
+    """DailyPrice の列を (営業日, 銘柄) の行列で読み込む（営業日, 銘柄, 列名 → 行列）
+
+    株価キューブがあればそこから切り出し、なければDBから読み込んで揃える。
+    """
+    fields = list(fields)
+    cube = get_price_cube()
+    if cube is not None and len(cube.dates):
+        return _from_cube(cube, fields, from_date, to_date, codes)
+    return _from_db(fields, from_date, to_date, codes)
+
+
+def _from_cube(cube, fields, from_date, to_date, codes):
+    rows = np.ones(len(cube.dates), dtype=bool)
+    if from_date is not None:
+        rows &= cube.dates >= np.datetime64(from_date, "D")
+    if to_date is not None:
+        rows &= cube.dates <= np.datetime64(to_date, "D")
+    if codes is None:
+        cols = np.arange(len(cube.codes))
+        selected = list(cube.codes)
+    else:
+        selected = [c for c in codes if c in cube.code_index]
+        cols = np.array([cube.code_index[c] for c in selected], dtype=np.int64)
+    values = {field: cube.field(field)[rows][:, cols].astype("float64") for field in fields}
+    return cube.dates[rows], selected, values
+
+
+def _from_db(fields, from_date, to_date, codes):
+    stmt = select(DailyPrice.code, DailyPrice.date, *[getattr(DailyPrice, f) for f in fields])
+    if from_date is not None:
+        stmt = stmt.where(DailyPrice.date >= from_date)
+    if to_date is not None:
+        stmt = stmt.where(DailyPrice.date <= to_date)
+    dates = None
+    session = get_read_session()
+    try:
+        if codes is not None:
+            stmt = stmt.where(DailyPrice.code.in_(list(codes)))
+            # 銘柄を絞っても営業日の軸は全銘柄と揃える（株価キューブと同じ行列にする）
+            axis = select(DailyPrice.date).distinct()
+            if from_date is not None:
+                axis = axis.where(DailyPrice.date >= from_date)
+            if to_date is not None:
+                axis = axis.where(DailyPrice.date <= to_date)
+            dates = [row[0] for row in session.execute(axis)]
+        df = pd.read_sql(stmt, session.connection())
+    finally:
+        session.close()
+    return pivot_fields(df, fields, dates=dates)
+
+
+def pivot_fields(
+    df: pd.DataFrame, fields: Iterable[str], dates: Optional[Sequence[date]] = None
+) -> Tuple[np.ndarray, List[str], Dict[str, np.ndarray]]:
+    """縦持ちの株価（code, date, 各列）を行列に揃える（dates 省略時は行にある日付）"""
+    df = df.assign(date=pd.to_datetime(df["date"]))
+    if dates is None:
+        dates = df["date"].unique()
+    dates = np.unique(np.asarray(dates, dtype="datetime64[D]"))
+    codes = sorted(df["code"].unique())
+    values = {}
+    for field in fields:
+        wide = df.pivot(index="date", columns="code", values=field)
+        wide = wide.reindex(index=pd.DatetimeIndex(dates), columns=codes)
+        values[field] = wide.to_numpy(dtype="float64")
+    return dates, codes, values
+
+
+def price_matrix_from_frame(df: pd.DataFrame, dates: Optional[Sequence[date]] = None) -> PriceMatrix:
+    """縦持ちの株価（code, date, 調整後の列）を行列に揃える（dates 省略時は行にある日付）"""
+    dates, codes, values = pivot_fields(df, PRICE_FIELDS.values(), dates)
+    return PriceMatrix(
+        dates=dates, codes=codes, **{name: values[field] for name, field in PRICE_FIELDS.items()}
+    )
+
+
+# ─── 指標（入力・出力とも (営業日, 銘柄) の行列）───
+
+
+def _shift(x: np.ndarray, periods: int = 1) -> np.ndarray:
+    """営業日方向にずらす（空いた行は欠損）"""
+    out = np.full_like(x, np.nan)
+    out[periods:] = x[:-periods]
+    return out
+
+
+def _window_sum(x: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """期間内の合計と有効な値の数（累積和の差分）"""
+    valid = ~np.isnan(x)
+    zero = np.zeros((1, x.shape[1]))
+    csum = np.concatenate([zero, np.cumsum(np.where(valid, x, 0.0), axis=0)])
+    ccount = np.concatenate([zero, np.cumsum(valid, axis=0)])
+    total = np.full_like(x, np.nan)
+    count = np.zeros_like(x)
+    total[window - 1:] = csum[window:] - csum[:-window]
+    count[window - 1:] = ccount[window:] - ccount[:-window]
+    return total, count
+
+
+def sma(x: np.ndarray, window: int) -> np.ndarray:
+    """単純移動平均（期間内に欠損があれば欠損）"""
+    total, count = _window_sum(x, window)
+    return np.where(count == window, total / window, np.nan)
+
+
+def rolling_std(x: np.ndarray, window: int) -> np.ndarray:
+    """移動標準偏差（母標準偏差、ddof=0）"""
+    # 桁落ちを避けるため列ごとの平均を引いてから二乗和をとる
+    valid = ~np.isnan(x)
+    mean = np.where(valid, x, 0.0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+    centered = x - mean
+    total, count = _window_sum(centered, window)
+    total_sq, _ = _window_sum(centered * centered, window)
+    window_mean = total / window
+    var = np.maximum(total_sq / window - window_mean * window_mean, 0.0)
+    return np.where(count == window, np.sqrt(var), np.nan)
+
+
+def ewm_init(n_codes: int) -> np.ndarray:
+    """ewm_step の状態（加重平均・直前の重み・観測数）の初期値"""
+    state = np.empty((3, n_codes))
+    state[0] = np.nan
+    state[1] = 1.0
+    state[2] = 0.0
+    return state
+
+
+def ewm_step(state: np.ndarray, cur: np.ndarray, alpha: float, min_periods: int = 0) -> np.ndarray:
+    """指数加重移動平均を1営業日進め、その日の値を返す（state は更新される）
+
+    pandas の ewm(alpha, adjust=False).mean() と同じ漸化式。
+    欠損日は値を持ち越し、次の観測では経過日数ぶん減衰した重みで合成する。
+    """
+    weighted, old_wt, nobs = state
+    observed = ~np.isnan(cur)
+    started = ~np.isnan(weighted)
+    nobs += observed
+
+    old_wt[:] = np.where(started, old_wt * (1.0 - alpha), old_wt)
+    update = started & observed
+    weighted[:] = np.where(
+        update,
+        (old_wt * weighted + alpha * cur) / (old_wt + alpha),
+        np.where(observed & ~started, cur, weighted),
+    )
+    old_wt[update] = 1.0
+    return np.where(nobs >= max(min_periods, 1), weighted, np.nan)
+
+
+def ewm_mean(x: np.ndarray, alpha: float, min_periods: int = 0) -> np.ndarray:
+    """指数加重移動平均（営業日方向の漸化式を全銘柄の列に対して同時に進める）"""
+    out = np.full_like(x, np.nan)
+    state = ewm_init(x.shape[1])
+    for i in range(len(x)):
+        out[i] = ewm_step(state, x[i], alpha, min_periods)
+    return out
+
+
+def ema(x: np.ndarray, window: int) -> np.ndarray:
+    """指数移動平均（span=window）"""
+    return ewm_mean(x, alpha=2.0 / (window + 1), min_periods=window)
+
+
+def macd(
+    close: np.ndarray, fast: int = MACD_FAST, slow: int = MACD_SLOW, signal: int = MACD_SIGNAL
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """MACD・シグナル・ヒストグラム"""
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def _before_first_valid(x: np.ndarray) -> np.ndarray:
+    """列ごとに最初の有効値より前の行（上場前など）"""
+    valid = ~np.isnan(x)
+    return np.cumsum(valid, axis=0) == 0
+
+
+def rsi(close: np.ndarray, window: int = RSI_WINDOW) -> np.ndarray:
+    """RSI（Wilder の平滑化）"""
+    diff = close - _shift(close)
+    # ta と同じく差分が欠損の日は上昇・下落とも 0 とする（上場前は除く）
+    up = np.where(diff > 0, diff, 0.0)
+    down = np.where(diff < 0, -diff, 0.0)
+    before = _before_first_valid(close)
+    up[before] = np.nan
+    down[before] = np.nan
+
+    alpha = 1.0 / window
+    ema_up = ewm_mean(up, alpha, min_periods=window)
+    ema_down = ewm_mean(down, alpha, min_periods=window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = 100.0 - 100.0 / (1.0 + ema_up / ema_down)
+    return np.where(ema_down == 0, 100.0, value)
+
+
+def bollinger(
+    close: np.ndarray, window: int = BOLLINGER_WINDOW, dev: float = BOLLINGER_DEV
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ボリンジャーバンド（中心線・上限・下限）"""
+    mavg = sma(close, window)
+    std = rolling_std(close, window)
+    return mavg, mavg + dev * std, mavg - dev * std
+
+
+def _true_range(high: np.ndarray, low: np.ndarray, prev_close: np.ndarray) -> np.ndarray:
+    ranges = np.stack([high - low, np.abs(high - prev_close), np.abs(low - prev_close)])
+    out = np.max(np.where(np.isnan(ranges), -np.inf, ranges), axis=0)
+    return np.where(np.isinf(out), np.nan, out)
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """真の値幅（前日終値がなければ高値－安値）"""
+    return _true_range(high, low, _shift(close))
+
+
+def atr_init(n_codes: int) -> np.ndarray:
+    """atr_step の状態（ATR・計算開始前の合計・有効日数・経過日数）の初期値"""
+    state = np.zeros((4, n_codes))
+    state[0] = np.nan
+    return state
+
+
+def atr_step(state: np.ndarray, tr: np.ndarray, window: int = ATR_WINDOW) -> np.ndarray:
+    """ATRを1営業日進め、その日の値を返す（state は更新される）"""
+    current, seed_sum, seed_count, seed_rows = state
+    observed = ~np.isnan(tr)
+    # 計算開始前: 最初に値幅が出た日から window 営業日（欠損の日も数える）の
+    # 欠損でない値幅の平均を初期値にする（ta の true_range[0:window].mean() と同じ）
+    seeding = (seed_rows < window) & ((seed_rows > 0) | observed)
+    seed_rows[seeding] += 1
+    adding = seeding & observed
+    seed_sum[adding] += tr[adding]
+    seed_count[adding] += 1
+    ready = seeding & (seed_rows == window)
+    current[ready] = seed_sum[ready] / seed_count[ready]
+    # 計算開始後は Wilder の平滑化
+    smoothing = ~seeding & observed & ~np.isnan(current)
+    current[smoothing] = (current[smoothing] * (window - 1) + tr[smoothing]) / window
+    return current.copy()
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = ATR_WINDOW) -> np.ndarray:
+    """ATR（最初の window 日の平均から始める Wilder の平滑化）"""
+    tr = true_range(high, low, close)
+    out = np.full_like(tr, np.nan)
+    state = atr_init(tr.shape[1])
+    for i in range(len(tr)):
+        out[i] = atr_step(state, tr[i], window)
+    return out
+
+
+def volume_ratio(volume: np.ndarray, window: int = VOLUME_RATIO_WINDOW) -> np.ndarray:
+    """出来高倍率（当日の出来高 ÷ 前日までの window 日の平均出来高）"""
+    base = _shift(sma(volume, window))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(base > 0, volume / base, np.nan)
+
+
+# ─── まとめて計算 ───
+
+
+def compute_indicators(prices: PriceMatrix) -> Dict[str, np.ndarray]:
+    """既定の期間の全指標を計算（指標名 → (営業日, 銘柄) の行列）"""
+    close = prices.close
+    out: Dict[str, np.ndarray] = {}
+    for window in SMA_WINDOWS:
+        out[f"sma_{window}"] = sma(close, window)
+    for window in EMA_WINDOWS:
+        out[f"ema_{window}"] = ema(close, window)
+    out["macd"], out["macd_signal"], out["macd_diff"] = macd(close)
+    out[f"rsi_{RSI_WINDOW}"] = rsi(close)
+    out["bb_mavg"], out["bb_hband"], out["bb_lband"] = bollinger(close)
+    out[f"atr_{ATR_WINDOW}"] = atr(prices.high, prices.low, close)
+    out[f"volume_ratio_{VOLUME_RATIO_WINDOW}"] = volume_ratio(prices.volume)
+    return out
+
+
+def latest_indicators(prices: PriceMatrix) -> pd.DataFrame:
+    """最終営業日の全指標（index=銘柄コード, columns=指標名）"""
+    values = compute_indicators(prices)
+    if not len(prices.dates):
+        return pd.DataFrame(index=pd.Index(prices.codes, name="code"), columns=list(values))
+    return pd.DataFrame(
+        {name: matrix[-1] for name, matrix in values.items()},
+        index=pd.Index(prices.codes, name="code"),
+    )
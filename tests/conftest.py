@@ -0,0 +1,38 @@
+"""テスト共通の設定
+
+DB・キャッシュ・キューブなどの保存先を一時ディレクトリに向ける。
+設定はモジュールの読み込み時に環境変数から作られるため、アプリのモジュールより先に設定する。
+"""
+
+import os
+import shutil
+import tempfile
+
+_tmpdir = tempfile.mkdtemp(prefix="screener_tests_")
+os.environ["SCREENER_DB_URL"] = f"sqlite:///{_tmpdir}/test.db"
+os.environ["JQUANTS_CACHE_ENABLED"] = "0"
+os.environ["SCREENER_CUBE_DIR"] = f"{_tmpdir}/cube"
+os.environ["SCREENER_FUNDAMENTALS_DIR"] = f"{_tmpdir}/fundamentals"
+os.environ["SCREENER_SCREEN_CACHE_DIR"] = f"{_tmpdir}/screens"
+os.environ["SCREENER_COLUMNAR_ENABLED"] = "0"
+os.environ["SCREENER_METRICS_ENABLED"] = "0"
+
+import pytest  # noqa: E402
+
+from db.database import engine, init_db  # noqa: E402
+from models.schemas import Base  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    init_db()
+
+
+@pytest.fixture
+def clean_db():
+    """テーブルと派生データ（キューブ・パネル・スクリーニングのキャッシュ）を空にしてから使う"""
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    for name in ("cube", "fundamentals", "screens"):
+        shutil.rmtree(os.path.join(_tmpdir, name), ignore_errors=True)
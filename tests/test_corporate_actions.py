@@ -0,0 +1,140 @@
+"""分割・併合の反映のテスト
+
+APIは取得した時点までの分割・併合を反映した調整後株価を返す。どの順番・何回に分けて
+取り込んでも、保存済みの調整後株価は最新のAPIの値と一致しなければならない。
+"""
+
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+from db.database import get_session
+from models.schemas import DailyPrice
+from services.sync import SyncService
+
+CODE = "72030"
+DAYS = [date(2024, 1, 8) + timedelta(days=i) for i in range(10)]
+ADJUSTED = ["adjustment_open", "adjustment_high", "adjustment_low", "adjustment_close", "adjustment_volume"]
+
+
+def api_prices(days, splits, fetched_on):
+    """fetched_on 時点のAPIが返す日足（splits は 分割日 → 調整係数）"""
+    known = {d: f for d, f in splits.items() if d <= fetched_on}
+    rows = []
+    for d in days:
+        p = 1000.0 + d.toordinal() % 100
+        cum = 1.0
+        for split_date, factor in known.items():
+            if d < split_date:
+                cum *= factor
+        rows.append(
+            {
+                "Code": CODE,
+                "Date": pd.Timestamp(d),
+                "O": p, "H": p + 10, "L": p - 10, "C": p + 5, "Vo": 1000, "Va": p * 1000,
+                "AdjFactor": known.get(d, 1.0),
+                "AdjO": p * cum, "AdjH": (p + 10) * cum, "AdjL": (p - 10) * cum, "AdjC": (p + 5) * cum,
+                "AdjVo": 1000 / cum,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def sync_run(days, splits, fetched_on):
+    """1回分の同期（書き込み→派生データの更新）"""
+    service = SyncService(client=object())
+    service._save_daily_prices(api_prices(days, splits, fetched_on))
+    service.refresh_derived()
+
+
+def stored():
+    session = get_session()
+    try:
+        df = pd.read_sql(
+            select(DailyPrice.date, *(getattr(DailyPrice, c) for c in ADJUSTED))
+            .where(DailyPrice.code == CODE)
+            .order_by(DailyPrice.date),
+            session.connection(),
+        )
+    finally:
+        session.close()
+    return df.set_index("date")
+
+
+def latest(splits):
+    """最新のAPIの値（正解）"""
+    df = api_prices(DAYS, splits, DAYS[-1])
+    df = df.rename(columns={"Date": "date", "AdjO": ADJUSTED[0], "AdjH": ADJUSTED[1], "AdjL": ADJUSTED[2],
+                            "AdjC": ADJUSTED[3], "AdjVo": ADJUSTED[4]})
+    df["date"] = df["date"].dt.date
+    return df.set_index("date")[ADJUSTED].astype(float)
+
+
+def assert_latest(splits):
+    pd.testing.assert_frame_equal(stored(), latest(splits), check_names=False, rtol=1e-9)
+
+
+SPLIT = {DAYS[6]: 0.5}
+
+
+def test_split_rescales_rows_fetched_before_it(clean_db):
+    sync_run(DAYS[:6], SPLIT, fetched_on=DAYS[5])
+    sync_run(DAYS[6:], SPLIT, fetched_on=DAYS[-1])
+
+    assert_latest(SPLIT)
+
+
+def test_backfill_split_across_two_runs_is_not_applied_twice(clean_db):
+    # 分割後に取得した分割日より前の期間を先に、分割日を含む期間を別の実行で取り込む
+    sync_run(DAYS[:6], SPLIT, fetched_on=DAYS[-1])
+    before = stored()
+    sync_run(DAYS[6:], SPLIT, fetched_on=DAYS[-1])
+
+    pd.testing.assert_frame_equal(stored().loc[before.index], before)
+    assert_latest(SPLIT)
+
+
+def test_retry_of_split_date_after_refresh_is_not_applied_twice(clean_db):
+    # 分割日だけ失敗し、派生データの更新後に別の実行（retry_failed / resume）で取り込む
+    sync_run(DAYS[:6] + DAYS[7:], SPLIT, fetched_on=DAYS[-1])
+    sync_run(DAYS[6:7], SPLIT, fetched_on=DAYS[-1])
+
+    assert_latest(SPLIT)
+
+
+def test_replaying_the_same_range_keeps_adjusted_prices(clean_db):
+    sync_run(DAYS[:6], SPLIT, fetched_on=DAYS[5])
+    sync_run(DAYS[6:], SPLIT, fetched_on=DAYS[-1])
+    sync_run(DAYS, SPLIT, fetched_on=DAYS[-1])
+    sync_run(DAYS[4:8], SPLIT, fetched_on=DAYS[-1])
+
+    assert_latest(SPLIT)
+
+
+def test_consecutive_splits(clean_db):
+    splits = {DAYS[3]: 0.5, DAYS[7]: 0.25}
+    sync_run(DAYS[:3], splits, fetched_on=DAYS[2])
+    sync_run(DAYS[3:6], splits, fetched_on=DAYS[5])
+    sync_run(DAYS[6:], splits, fetched_on=DAYS[-1])
+
+    assert_latest(splits)
+
+
+def test_two_new_splits_in_one_batch(clean_db):
+    splits = {DAYS[3]: 0.5, DAYS[7]: 0.25}
+    sync_run(DAYS[:3], splits, fetched_on=DAYS[2])
+    sync_run(DAYS[3:], splits, fetched_on=DAYS[-1])
+
+    assert_latest(splits)
+
+
+@pytest.mark.parametrize("order", [(0, 1), (1, 0)])
+def test_older_split_backfilled_after_newer_one(clean_db, order):
+    splits = {DAYS[3]: 0.5, DAYS[7]: 0.25}
+    ranges = [DAYS[:5], DAYS[5:]]
+    for i in order:
+        sync_run(ranges[i], splits, fetched_on=DAYS[-1])
+
+    assert_latest(splits)
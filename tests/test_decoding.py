@@ -0,0 +1,35 @@
+"""APIレスポンスの型付きデコードのテスト"""
+
+from datetime import date
+
+import pandas as pd
+
+from benchmarks.synthetic import daily_price_records, financial_summary_records, universe
+from services.datasets import PRICE_COLUMNS, frame_to_records
+from services.decoding import decode_records
+
+DAY = date(2024, 3, 4)
+
+
+def test_volume_and_share_counts_decode_as_integers():
+    prices = decode_records(daily_price_records(universe(5), DAY), "equities_bars_daily")
+    summaries = decode_records(financial_summary_records(universe(4000), date(2024, 5, 8))[:5], "fins_summary")
+
+    assert prices["Vo"].dtype == "int64"
+    assert prices["C"].dtype == "float64"
+    assert prices["AdjVo"].dtype == "float64"  # 分割・併合で端数が出る
+    assert summaries["ShOutFY"].dtype == "int64"
+    assert summaries["TrShFY"].dtype == "int64"
+
+
+def test_missing_counts_decode_as_nullable_int64():
+    records = daily_price_records(universe(3), DAY)
+    records[1]["Vo"] = None
+    records[2]["Vo"] = ""
+
+    df = decode_records(records, "equities_bars_daily")
+
+    assert df["Vo"].dtype == pd.Int64Dtype()
+    assert df["Vo"].isna().tolist() == [False, True, True]
+    volumes = [r["volume"] for r in frame_to_records(df, PRICE_COLUMNS)]
+    assert isinstance(volumes[0], int) and volumes[1:] == [None, None]
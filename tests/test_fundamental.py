@@ -0,0 +1,126 @@
+"""ファンダメンタル指標の日次パネルのテスト
+
+開示日 T の財務サマリは T の終値から使い、T より前の営業日には使わない（先読みなし）。
+前営業日を取り直す日次の同期でも全銘柄を作り直さず、差分更新の結果は全期間の計算と一致しなければならない。
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import business_days, daily_prices_frame, financial_summary_records, universe
+from services import fundamental
+from services.decoding import decode_records
+from services.fundamental import METRICS, build_fundamentals, load_panel
+from services.sync import SyncService
+
+CODES = universe(8)
+DAYS = business_days(date(2024, 5, 6), 20)
+
+
+@pytest.fixture
+def rebuilds(monkeypatch):
+    """全銘柄を作り直した回数を記録する"""
+    calls = []
+    original = fundamental.build_fundamentals
+
+    def build():
+        calls.append(1)
+        return original()
+
+    monkeypatch.setattr(fundamental, "build_fundamentals", build)
+    return calls
+
+
+def disclosure(code: str, disclosed_date: date, disclosed_time: str = "15:00:00") -> pd.DataFrame:
+    """1銘柄の財務サマリ（APIの形式）"""
+    record = financial_summary_records(universe(4000), disclosed_date)[0]
+    record.update({"Code": code, "DiscDate": disclosed_date.isoformat(), "DiscTime": disclosed_time})
+    return decode_records([record], "fins_summary")
+
+
+def sync_run(days, disclosures=(), prices=None):
+    """1回分の同期（書き込み→派生データの更新）"""
+    service = SyncService(client=object())
+    for day in days:
+        frame = prices.get(day) if prices else None
+        service._save_daily_prices(frame if frame is not None else daily_prices_frame(CODES, day))
+    for df in disclosures:
+        service._save_financial_summary(df)
+    service.refresh_derived()
+
+
+def per(code: str, day: date) -> float:
+    return float(load_panel().on(day).loc[code, "per"])
+
+
+def assert_matches_full_build():
+    panel = load_panel()
+    full = build_fundamentals()
+    np.testing.assert_array_equal(panel.dates, full.dates)
+    order = [panel.code_index[c] for c in full.codes]
+    for m in METRICS:
+        np.testing.assert_allclose(panel.values[m][:, order], full.values[m], rtol=1e-6, equal_nan=True)
+
+
+@pytest.mark.parametrize("split_runs", [False, True])
+def test_disclosure_is_visible_from_its_date_and_never_before(clean_db, split_runs):
+    code, disclosed = CODES[0], DAYS[5]
+    if split_runs:
+        # 開示日の株価と開示を、反映済みのパネルへの差分更新で取り込む
+        sync_run(DAYS[:5])
+        sync_run(DAYS[4:10], [disclosure(code, disclosed)])
+    else:
+        sync_run(DAYS[:10], [disclosure(code, disclosed)])
+
+    assert np.isnan(per(code, DAYS[4]))
+    assert np.isfinite(per(code, disclosed))
+    assert np.isfinite(per(code, DAYS[9]))
+    assert np.isnan(per(CODES[1], disclosed))
+
+
+def test_late_arriving_disclosure_is_not_visible_before_its_date(clean_db):
+    code, disclosed = CODES[0], DAYS[5]
+    sync_run(DAYS[:10])
+    # 反映済みの営業日の開示をあとから取り込む
+    sync_run([], [disclosure(code, disclosed)])
+
+    assert np.isnan(per(code, DAYS[4]))
+    assert np.isfinite(per(code, disclosed))
+    assert_matches_full_build()
+
+
+def test_holiday_disclosure_is_visible_from_next_business_day(clean_db):
+    code = CODES[0]
+    saturday = date(2024, 5, 11)
+    assert DAYS[4] < saturday < DAYS[5]
+    sync_run(DAYS[:10], [disclosure(code, saturday)])
+
+    assert np.isnan(per(code, DAYS[4]))
+    assert np.isfinite(per(code, DAYS[5]))
+
+
+def test_daily_runs_refetching_previous_day_stay_incremental(clean_db, rebuilds):
+    sync_run(DAYS[:10], [disclosure(CODES[0], DAYS[3])])
+    assert rebuilds == [1]
+
+    rebuilds.clear()
+    for i in range(10, len(DAYS)):
+        sync_run(DAYS[i - 1:i + 1], [disclosure(CODES[i % len(CODES)], DAYS[i])])
+
+    assert rebuilds == []
+    assert_matches_full_build()
+
+
+def test_corrected_previous_day_recomputes_only_that_code(clean_db, rebuilds):
+    sync_run(DAYS[:10], [disclosure(CODES[0], DAYS[3])])
+    rebuilds.clear()
+
+    corrected = daily_prices_frame(CODES, DAYS[9])
+    corrected.loc[0, ["C", "AdjC"]] = corrected.loc[0, ["C", "AdjC"]] * 1.1
+    sync_run(DAYS[9:11], prices={DAYS[9]: corrected})
+
+    assert rebuilds == []
+    assert_matches_full_build()
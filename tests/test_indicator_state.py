@@ -0,0 +1,124 @@
+"""テクニカル指標の差分更新のテスト
+
+日次の同期は前営業日を取り直すため、毎回の取り込みに反映済みの営業日が含まれる。
+同じ値の再取得では全履歴から計算し直さず、差分更新の結果は全履歴からの計算と一致しなければならない。
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+from benchmarks.synthetic import business_days, daily_prices_frame, universe
+from db.database import get_session
+from models.schemas import TechnicalIndicator
+from services.indicator_state import IncrementalIndicators
+from services.sync import SyncService
+from services.technical import load_prices
+
+CODES = universe(8)
+DAYS = business_days(pd.Timestamp("2024-01-04").date(), 40)
+
+
+@pytest.fixture
+def recomputed(monkeypatch):
+    """全履歴から計算した銘柄数を記録する"""
+    counts = []
+    original = IncrementalIndicators.from_history.__func__
+
+    def from_history(cls, prices):
+        counts.append(len(prices.codes))
+        return original(cls, prices)
+
+    monkeypatch.setattr(IncrementalIndicators, "from_history", classmethod(from_history))
+    return counts
+
+
+def sync_days(days, frames=None):
+    """1回分の同期（書き込み→派生データの更新）"""
+    service = SyncService(client=object())
+    for day in days:
+        frame = frames.get(day) if frames else None
+        service._save_daily_prices(frame if frame is not None else daily_prices_frame(CODES, day))
+    service.refresh_derived()
+
+
+def stored_indicators() -> pd.DataFrame:
+    session = get_session()
+    try:
+        df = pd.read_sql(select(TechnicalIndicator), session.connection())
+    finally:
+        session.close()
+    return df.drop(columns=["id", "updated_at"], errors="ignore").sort_values("code").reset_index(drop=True)
+
+
+def assert_matches_full_recompute():
+    session = get_session()
+    try:
+        engine = IncrementalIndicators.load(session)
+    finally:
+        session.close()
+    full = IncrementalIndicators.from_history(load_prices())
+    assert engine.as_of == full.as_of
+    cols = [engine.code_index[c] for c in full.codes]
+    for key, values in full.state.items():
+        np.testing.assert_allclose(engine.state[key][:, cols], values, rtol=1e-9, equal_nan=True)
+
+    expected = pd.DataFrame({name: values for name, values in full.latest.items()})
+    expected.insert(0, "code", full.codes)
+    actual = stored_indicators().set_index("code")
+    expected = expected.set_index("code").loc[actual.index]
+    for name in full.latest:
+        np.testing.assert_allclose(
+            actual[name].astype(float).to_numpy(), expected[name].to_numpy(), rtol=1e-9, equal_nan=True
+        )
+
+
+def test_daily_runs_refetching_previous_day_stay_incremental(clean_db, recomputed):
+    sync_days(DAYS[:30])
+    assert recomputed == [len(CODES)]  # 初回だけ全履歴から
+
+    recomputed.clear()
+    for i in range(30, len(DAYS)):
+        sync_days(DAYS[i - 1:i + 1])  # 前営業日を取り直す
+
+    assert recomputed == []
+    assert_matches_full_recompute()
+
+
+def test_rewritten_as_of_day_recomputes_only_that_code(clean_db, recomputed):
+    sync_days(DAYS[:30])
+    recomputed.clear()
+
+    # 反映済みの最終営業日の1銘柄だけ値が変わる（訂正）
+    corrected = daily_prices_frame(CODES, DAYS[29])
+    for column in ("C", "AdjC"):
+        corrected.loc[0, column] = corrected.loc[0, column] * 1.1
+    sync_days(DAYS[29:31], {DAYS[29]: corrected})
+
+    assert recomputed == [1]
+    assert_matches_full_recompute()
+
+
+def test_rewritten_as_of_day_without_new_days(clean_db, recomputed):
+    sync_days(DAYS[:30])
+    recomputed.clear()
+
+    corrected = daily_prices_frame(CODES, DAYS[29])
+    for column in ("C", "AdjC"):
+        corrected.loc[0, column] = corrected.loc[0, column] * 0.9
+    sync_days(DAYS[29:30], {DAYS[29]: corrected})
+
+    assert recomputed == [1]
+    assert_matches_full_recompute()
+
+
+def test_most_codes_changed_falls_back_to_full_recompute(clean_db, recomputed):
+    sync_days(DAYS[:30])
+    recomputed.clear()
+
+    sync_days(DAYS[28:31], {day: daily_prices_frame(CODES, day, seed=1) for day in DAYS[28:30]})
+
+    # 大半の銘柄の過去の値が変わった
+    assert recomputed == [len(CODES)]
+    assert_matches_full_recompute()
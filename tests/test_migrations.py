@@ -0,0 +1,243 @@
+"""既存DBのスキーマ移行のテスト
+
+移行前のスキーマ（最初のリリースの create_all が作ったテーブル）のDBに行を入れてから
+init_db と同じ手順（create_all → run_migrations）を適用する。
+"""
+
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from db.migrations import run_migrations
+from models.schemas import Base
+
+# 移行前の create_all が作ったテーブル（一意制約の追加前に作られた daily_prices を含む）
+BASELINE_DDL = {
+    "stocks": """
+        CREATE TABLE stocks (
+            code VARCHAR(10) NOT NULL,
+            company_name VARCHAR(200),
+            company_name_english VARCHAR(200),
+            sector17_code VARCHAR(10),
+            sector17_name VARCHAR(100),
+            sector33_code VARCHAR(10),
+            sector33_name VARCHAR(100),
+            market_code VARCHAR(10),
+            market_name VARCHAR(50),
+            margin_code VARCHAR(10),
+            fiscal_year_end VARCHAR(10),
+            is_active BOOLEAN,
+            updated_at DATETIME,
+            PRIMARY KEY (code)
+        )
+    """,
+    "daily_prices": """
+        CREATE TABLE daily_prices (
+            id INTEGER NOT NULL,
+            code VARCHAR(10),
+            date DATE,
+            open FLOAT,
+            high FLOAT,
+            low FLOAT,
+            close FLOAT,
+            volume BIGINT,
+            turnover_value FLOAT,
+            adjustment_factor FLOAT,
+            adjustment_open FLOAT,
+            adjustment_high FLOAT,
+            adjustment_low FLOAT,
+            adjustment_close FLOAT,
+            adjustment_volume FLOAT,
+            PRIMARY KEY (id)
+        )
+    """,
+    "ix_daily_prices_date": "CREATE INDEX ix_daily_prices_date ON daily_prices (date)",
+    "ix_daily_prices_code": "CREATE INDEX ix_daily_prices_code ON daily_prices (code)",
+    "financial_summaries": """
+        CREATE TABLE financial_summaries (
+            id INTEGER NOT NULL,
+            code VARCHAR(10),
+            disclosed_date DATE,
+            disclosed_time VARCHAR(10),
+            type_of_document VARCHAR(50),
+            fiscal_year VARCHAR(20),
+            fiscal_quarter INTEGER,
+            net_sales FLOAT,
+            operating_profit FLOAT,
+            ordinary_profit FLOAT,
+            profit FLOAT,
+            earnings_per_share FLOAT,
+            forecast_net_sales FLOAT,
+            forecast_operating_profit FLOAT,
+            forecast_ordinary_profit FLOAT,
+            forecast_profit FLOAT,
+            forecast_earnings_per_share FLOAT,
+            total_assets FLOAT,
+            equity FLOAT,
+            equity_to_asset_ratio FLOAT,
+            book_value_per_share FLOAT,
+            cash_flows_from_operating FLOAT,
+            cash_flows_from_investing FLOAT,
+            cash_flows_from_financing FLOAT,
+            result_dividend_per_share_annual FLOAT,
+            forecast_dividend_per_share_annual FLOAT,
+            updated_at DATETIME,
+            PRIMARY KEY (id)
+        )
+    """,
+    "ix_financial_summaries_code": "CREATE INDEX ix_financial_summaries_code ON financial_summaries (code)",
+}
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    """移行前のスキーマのDB"""
+    engine = create_engine(f"sqlite:///{tmp_path}/baseline.db")
+    with engine.begin() as conn:
+        for ddl in BASELINE_DDL.values():
+            conn.execute(text(ddl))
+    yield engine
+    engine.dispose()
+
+
+def migrate(engine):
+    """init_db と同じ手順"""
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+
+
+def table_sql(conn, name: str) -> str:
+    return conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": name}
+    ).scalar()
+
+
+def indexes(conn, table: str) -> set:
+    return {row[1] for row in conn.execute(text(f"PRAGMA index_list({table})"))}
+
+
+# ─── daily_prices のクラスタ化 ───
+
+
+PRICE_ROWS = [
+    # id, code, date, close（同じ (code, date) は id の大きい行が最後に保存されたもの）
+    (1, "72030", date(2024, 1, 5), 100.0),
+    (2, "72030", date(2024, 1, 4), 99.0),
+    (3, "72030", date(2024, 1, 5), 101.0),
+    (4, "67580", date(2024, 1, 4), 50.0),
+    (5, "72030", date(2024, 1, 5), 102.0),
+    (6, "67580", date(2024, 1, 4), 51.0),
+    (7, None, date(2024, 1, 4), 1.0),  # キーの欠けた行は移さない
+    (8, "67580", None, 1.0),
+]
+
+
+def insert_prices(conn):
+    conn.execute(
+        text("INSERT INTO daily_prices (id, code, date, close) VALUES (:id, :code, :date, :close)"),
+        [{"id": i, "code": code, "date": d, "close": close} for i, code, d, close in PRICE_ROWS],
+    )
+
+
+def test_cluster_daily_prices_keeps_latest_row_per_key(baseline):
+    with baseline.begin() as conn:
+        insert_prices(conn)
+
+    migrate(baseline)
+
+    with baseline.connect() as conn:
+        rows = conn.execute(text("SELECT code, date, close FROM daily_prices ORDER BY code, date")).all()
+        assert [tuple(r) for r in rows] == [
+            ("67580", "2024-01-04", 51.0),
+            ("72030", "2024-01-04", 99.0),
+            ("72030", "2024-01-05", 102.0),
+        ]
+        assert "WITHOUT ROWID" in table_sql(conn, "daily_prices").upper()
+        assert "ix_daily_prices_date_code" in indexes(conn, "daily_prices")
+        # 旧テーブルの単独インデックスと一時テーブルは残らない
+        assert {"ix_daily_prices_code", "ix_daily_prices_date"}.isdisjoint(indexes(conn, "daily_prices"))
+        assert table_sql(conn, "daily_prices_old") is None
+
+
+def test_cluster_daily_prices_second_run_is_noop(baseline):
+    with baseline.begin() as conn:
+        insert_prices(conn)
+    migrate(baseline)
+    with baseline.connect() as conn:
+        before_sql = table_sql(conn, "daily_prices")
+        before = conn.execute(text("SELECT * FROM daily_prices ORDER BY code, date")).all()
+
+    migrate(baseline)
+
+    with baseline.connect() as conn:
+        assert table_sql(conn, "daily_prices") == before_sql
+        assert conn.execute(text("SELECT * FROM daily_prices ORDER BY code, date")).all() == before
+
+
+# ─── financial_summaries の重複削除・株式数の列 ───
+
+
+FIN_ROWS = [
+    # id, code, disclosed_date, disclosed_time, type_of_document, profit
+    (1, "72030", date(2024, 5, 8), "15:00:00", "FYFinancialStatements", 1.0),
+    (2, "72030", date(2024, 5, 8), "15:00:00", "FYFinancialStatements", 2.0),
+    (3, "72030", date(2024, 5, 8), "15:00:00", "ForecastRevision", 3.0),  # 書類種別が違えば別の行
+    (4, "67580", date(2024, 5, 9), None, None, 4.0),
+    (5, "67580", date(2024, 5, 9), "", "", 5.0),  # NULL と空文字は同じキー
+    (6, "67580", date(2024, 5, 9), None, None, 6.0),
+    (7, "72030", date(2024, 5, 8), "15:00:00", "FYFinancialStatements", 7.0),
+]
+
+
+def insert_financial_summaries(conn):
+    conn.execute(
+        text(
+            "INSERT INTO financial_summaries (id, code, disclosed_date, disclosed_time, type_of_document, profit)"
+            " VALUES (:id, :code, :disclosed_date, :disclosed_time, :type_of_document, :profit)"
+        ),
+        [
+            dict(zip(("id", "code", "disclosed_date", "disclosed_time", "type_of_document", "profit"), row))
+            for row in FIN_ROWS
+        ],
+    )
+
+
+def columns(conn, table: str) -> list:
+    return [row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))]
+
+
+def test_dedupe_financial_summaries_keeps_max_id_per_natural_key(baseline):
+    with baseline.begin() as conn:
+        insert_financial_summaries(conn)
+
+    migrate(baseline)
+
+    with baseline.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT id, code, disclosed_time, type_of_document, profit FROM financial_summaries ORDER BY id"
+            )
+        ).all()
+        assert [tuple(r) for r in rows] == [
+            (3, "72030", "15:00:00", "ForecastRevision", 3.0),
+            (6, "67580", "", "", 6.0),
+            (7, "72030", "15:00:00", "FYFinancialStatements", 7.0),
+        ]
+        assert "uix_fin_natural_key" in indexes(conn, "financial_summaries")
+
+
+def test_financial_summary_migrations_are_idempotent(baseline):
+    with baseline.begin() as conn:
+        insert_financial_summaries(conn)
+    migrate(baseline)
+    with baseline.connect() as conn:
+        before = conn.execute(text("SELECT * FROM financial_summaries ORDER BY id")).all()
+        names = columns(conn, "financial_summaries")
+
+    migrate(baseline)
+
+    with baseline.connect() as conn:
+        assert columns(conn, "financial_summaries") == names
+        assert names.count("shares_outstanding") == 1 and names.count("treasury_shares") == 1
+        assert conn.execute(text("SELECT * FROM financial_summaries ORDER BY id")).all() == before
@@ -0,0 +1,90 @@
+"""未同期・要再取得の作業単位（pending_units）のテスト
+
+その営業日のデータの確定時刻より前に取得した日付だけを取り直し、確定後に取得した日付は取り直さない。
+"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy.dialects.sqlite import insert
+
+from config import config
+from db.database import get_session
+from models.schemas import SyncState
+from services.datasets import DATASET_DAILY_PRICES
+from services.sync import SyncService
+
+DAYS = [date(2024, 3, 4), date(2024, 3, 5), date(2024, 3, 6)]  # 月〜水
+
+
+class NoCalendarClient:
+    """取引カレンダーを返さない（平日で代用させる）"""
+
+    def get_trading_calendar(self, **kwargs):
+        raise RuntimeError("offline")
+
+
+def mark(dataset: str, target_date: date, synced_at: datetime):
+    session = get_session()
+    try:
+        stmt = insert(SyncState).values(dataset=dataset, date=target_date, row_count=1, synced_at=synced_at)
+        session.execute(
+            stmt.on_conflict_do_update(index_elements=["dataset", "date"], set_={"synced_at": stmt.excluded.synced_at})
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def pending(**kwargs):
+    service = SyncService(client=NoCalendarClient())
+    return service.pending_units(datasets=(DATASET_DAILY_PRICES,), from_date=DAYS[0], to_date=DAYS[-1], **kwargs)
+
+
+@pytest.fixture
+def publish_time(monkeypatch):
+    monkeypatch.setattr(config.jquants, "publish_time", "20:00")
+
+
+def test_publish_cutoff_is_jst_time_in_utc(publish_time):
+    # 日本時間 20:00 = UTC 11:00
+    assert config.jquants.publish_cutoff(date(2024, 3, 4)) == datetime(2024, 3, 4, 11, 0)
+
+
+def test_unsynced_days_are_pending(clean_db, publish_time):
+    assert pending() == [(DATASET_DAILY_PRICES, d) for d in DAYS]
+
+
+def test_day_synced_after_publication_is_not_refetched(clean_db, publish_time):
+    for d in DAYS:
+        mark(DATASET_DAILY_PRICES, d, config.jquants.publish_cutoff(d) + timedelta(minutes=1))
+
+    assert pending() == []
+
+
+def test_day_synced_after_publication_on_the_next_day_is_not_refetched(clean_db, publish_time):
+    # 翌日の日次バッチ（日付は d より後）で取得した前営業日は確定済み
+    for d in DAYS:
+        mark(DATASET_DAILY_PRICES, d, datetime.combine(d + timedelta(days=1), datetime.min.time()))
+
+    assert pending() == []
+
+
+def test_day_synced_before_publication_is_refetched(clean_db, publish_time):
+    for d in DAYS:
+        mark(DATASET_DAILY_PRICES, d, config.jquants.publish_cutoff(d) + timedelta(hours=1))
+    # 最終日は確定前（日本時間 18:00）に取得した
+    mark(DATASET_DAILY_PRICES, DAYS[-1], config.jquants.publish_cutoff(DAYS[-1]) - timedelta(hours=2))
+
+    assert pending() == [(DATASET_DAILY_PRICES, DAYS[-1])]
+
+
+def test_publish_time_is_configurable(clean_db, monkeypatch):
+    synced_at = datetime(2024, 3, 6, 9, 0)  # 日本時間 18:00
+    for d in DAYS:
+        mark(DATASET_DAILY_PRICES, d, synced_at if d == DAYS[-1] else datetime(2024, 3, 7))
+
+    monkeypatch.setattr(config.jquants, "publish_time", "17:00")
+    assert pending() == []
+    monkeypatch.setattr(config.jquants, "publish_time", "19:00")
+    assert pending() == [(DATASET_DAILY_PRICES, DAYS[-1])]
@@ -0,0 +1,103 @@
+"""株価キューブのテスト
+
+DBからの反映は過去の営業日の挿入を含んでも作り直しを1回で済ませ、
+結果はDBの値と一致しなければならない。
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+from benchmarks.synthetic import business_days, daily_prices_frame, universe
+from db.database import get_session
+from models.schemas import DailyPrice
+from services.price_cube import FIELDS, PriceCube
+from services.sync import SyncService
+
+CODES = universe(6)
+DAYS = business_days(pd.Timestamp("2024-02-01").date(), 50)
+
+
+@pytest.fixture
+def rebuilds(monkeypatch):
+    """作り直した回数を記録する"""
+    calls = []
+    original = PriceCube._rebuild
+
+    def rebuild(self, dates, codes):
+        calls.append(len(dates))
+        return original(self, dates, codes)
+
+    monkeypatch.setattr(PriceCube, "_rebuild", rebuild)
+    return calls
+
+
+def write_prices(days, codes=CODES):
+    service = SyncService(client=object())
+    for day in days:
+        service._save_daily_prices(daily_prices_frame(codes, day))
+
+
+def db_frame(name: str) -> pd.DataFrame:
+    session = get_session()
+    try:
+        df = pd.read_sql(select(DailyPrice.code, DailyPrice.date, getattr(DailyPrice, name)), session.connection())
+    finally:
+        session.close()
+    df["date"] = pd.to_datetime(df["date"])
+    return df.pivot(index="date", columns="code", values=name).astype(FIELDS[name])
+
+
+def assert_matches_db(cube: PriceCube):
+    for name in ("close", "adjustment_close", "volume"):
+        expected = db_frame(name)
+        actual = cube.frame(name).loc[expected.index, expected.columns]
+        pd.testing.assert_frame_equal(actual, expected, check_names=False, check_freq=False)
+
+
+def test_backfill_before_last_date_rebuilds_once(clean_db, tmp_path, rebuilds):
+    write_prices(DAYS[40:])
+    cube = PriceCube.open(tmp_path, writable=True)
+    cube.refresh_from_db(DAYS[40:])
+    rebuilds.clear()
+
+    # 最終営業日より前の40営業日を2営業日ずつのチャンクで反映
+    write_prices(DAYS[:40])
+    cube.refresh_from_db(DAYS[:40], chunk_days=2)
+
+    assert rebuilds == [len(DAYS)]
+    assert len(cube.dates) == len(DAYS)
+    assert_matches_db(PriceCube.open(tmp_path))
+
+
+def test_new_codes_beyond_headroom_rebuild_once(clean_db, tmp_path, rebuilds, monkeypatch):
+    monkeypatch.setattr("services.price_cube.CODE_HEADROOM", 1)
+    write_prices(DAYS[:2], CODES[:2])
+    cube = PriceCube.open(tmp_path, writable=True)
+    cube.refresh_from_db(DAYS[:2])
+    rebuilds.clear()
+
+    write_prices(DAYS[2:10])
+    cube.refresh_from_db(DAYS[2:10], chunk_days=1)
+
+    assert len(rebuilds) == 1
+    assert_matches_db(PriceCube.open(tmp_path))
+
+
+def test_readers_see_only_written_dates(clean_db, tmp_path):
+    write_prices(DAYS[:5])
+    cube = PriceCube.open(tmp_path, writable=True)
+    cube.refresh_from_db(DAYS[:5])
+    reader = PriceCube.open(tmp_path)
+
+    # DBにない営業日は軸に加えない
+    cube.refresh_from_db(DAYS[5:8])
+    reader.reload()
+    assert len(reader.dates) == 5
+
+    write_prices(DAYS[5:8])
+    cube.refresh_from_db(DAYS[5:8])
+    reader.reload()
+    assert len(reader.dates) == 8
+    assert not np.isnan(reader.field("close")[-1]).all()
@@ -0,0 +1,104 @@
+"""APIレスポンスキャッシュのテスト
+
+ページングされたレスポンスは全ページを1件として保存・再利用し、
+キャッシュを使わない指定のクライアントは共有キャッシュに触れない。
+"""
+
+import asyncio
+from datetime import date
+
+import httpx
+
+from benchmarks.fake_jquants import FAKE_BASE_URL, FakeJQuants
+from services import jquants
+from services.cache import ResponseCache
+from services.jquants import AsyncJQuantsClient, JQuantsClient
+from services.ratelimit import AdaptiveTokenBucket
+
+TARGET_DATE = date(2024, 3, 4)  # 確定済み（無期限でキャッシュする）日付
+
+
+class CountingTransport:
+    """偽サーバへのリクエストを数える"""
+
+    def __init__(self, fake: FakeJQuants):
+        self.fake = fake
+        self.requests = []
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request.url.params.get("pagination_key"))
+        return self.fake.handle(request)
+
+
+def _client(counting: CountingTransport, cache) -> JQuantsClient:
+    return JQuantsClient(
+        limiter=AdaptiveTokenBucket(max_rate=1000.0),
+        cache=cache,
+        base_url=FAKE_BASE_URL,
+        transport=httpx.MockTransport(counting.handle),
+    )
+
+
+def test_paginated_response_is_cached_as_one_entry(tmp_path):
+    cache = ResponseCache(tmp_path)
+    counting = CountingTransport(FakeJQuants(n_codes=20, page_size=5))
+    client = _client(counting, cache)
+
+    first = client.get_daily_prices(date=TARGET_DATE)
+    assert counting.requests == [None, "5", "10", "15"]
+    assert len(list(cache._iter_files())) == 1
+
+    again = client.get_daily_prices(date=TARGET_DATE)
+
+    assert len(counting.requests) == 4  # 全ページをキャッシュから返す
+    assert cache.stats()["hits"] == 1
+    assert again.equals(first)
+
+
+def test_incomplete_chain_is_not_cached(tmp_path):
+    cache = ResponseCache(tmp_path)
+    counting = CountingTransport(FakeJQuants(n_codes=20, page_size=5))
+    client = _client(counting, cache)
+
+    # 最初のページで読むのをやめる
+    next(client.iter_daily_prices(date=TARGET_DATE))
+    assert len(list(cache._iter_files())) == 0
+
+    # 途中のページのトークンをキャッシュから送ることはなく、最初から取り直す
+    df = client.get_daily_prices(date=TARGET_DATE)
+    assert counting.requests == [None, None, "5", "10", "15"]
+    assert len(df) == 20
+
+
+def test_async_client_caches_the_whole_chain(tmp_path):
+    cache = ResponseCache(tmp_path)
+    counting = CountingTransport(FakeJQuants(n_codes=20, page_size=5))
+
+    async def fetch():
+        client = AsyncJQuantsClient(
+            limiter=AdaptiveTokenBucket(max_rate=1000.0),
+            cache=cache,
+            base_url=FAKE_BASE_URL,
+            transport=httpx.MockTransport(counting.handle),
+        )
+        async with client:
+            return [len(await client.get_daily_prices(date=TARGET_DATE)) for _ in range(2)]
+
+    assert asyncio.run(fetch()) == [20, 20]
+    assert len(counting.requests) == 4
+
+
+def test_client_can_opt_out_of_the_shared_cache(tmp_path, monkeypatch):
+    shared = ResponseCache(tmp_path)
+    monkeypatch.setattr(jquants, "get_response_cache", lambda: shared)
+    counting = CountingTransport(FakeJQuants(n_codes=10))
+
+    assert _client(counting, None)._cache is shared
+    client = _client(counting, False)
+    assert client._cache is None
+
+    client.get_daily_prices(date=TARGET_DATE)
+    client.get_daily_prices(date=TARGET_DATE)
+
+    assert len(counting.requests) == 2
+    assert shared.stats()["bytes"] == 0
@@ -0,0 +1,264 @@
+"""リトライ・適応レート制御・失敗した作業単位の再実行のテスト
+
+偽のJ-Quants API（benchmarks.fake_jquants の httpx.MockTransport）に対して
+429・5xx を返させ、クライアントとリトライキュー・ジョブジャーナルの動作を確かめる。
+"""
+
+import time
+from datetime import date
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from benchmarks.fake_jquants import FAKE_BASE_URL, FakeJQuants
+from db.database import get_session
+from models.schemas import SyncJob
+from services import jquants, ratelimit
+from services.datasets import DATASET_DAILY_PRICES, DATASET_FIN_SUMMARY
+from services.jquants import AsyncJQuantsClient, JQuantsClient
+from services.ratelimit import AdaptiveTokenBucket
+from services.retry import RetryPolicy
+from services.sync import JOB_DONE, JOB_FAILED, SyncService
+
+TARGET_DATE = date(2024, 3, 4)
+
+
+class FlakyTransport:
+    """指定したステータスを順に返してから偽サーバへ渡す"""
+
+    def __init__(self, fake: FakeJQuants, statuses=(), retry_after=None):
+        self.fake = fake
+        self.statuses = list(statuses)
+        self.retry_after = retry_after
+        self.requests = 0
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.statuses:
+            status = self.statuses.pop(0)
+            headers = {"Retry-After": self.retry_after} if self.retry_after else {}
+            return httpx.Response(status, headers=headers, json={"message": "error"})
+        return self.fake.handle(request)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """クライアントのリトライ待ちを記録する（待ち自体は行う）
+
+    time モジュールごと差し替えるとレートリミッタの待ちまで混ざるため、
+    services.jquants から見える time だけを置き換える。
+    """
+    recorded = []
+
+    def sleep(seconds):
+        recorded.append(seconds)
+        time.sleep(seconds)
+
+    monkeypatch.setattr(jquants, "time", SimpleNamespace(sleep=sleep))
+    return recorded
+
+
+def _client(transport, limiter=None, **policy) -> JQuantsClient:
+    return JQuantsClient(
+        limiter=limiter or AdaptiveTokenBucket(max_rate=1000.0),
+        retry_policy=RetryPolicy(**{"base_delay": 0.0, **policy}),
+        base_url=FAKE_BASE_URL,
+        transport=transport,
+    )
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_retries_throttled_and_server_errors(status, sleeps):
+    fake = FakeJQuants(n_codes=10)
+    flaky = FlakyTransport(fake, statuses=[status, status])
+    client = _client(flaky.transport())
+
+    df = client.get_daily_prices(date=TARGET_DATE)
+
+    assert len(df) == 10
+    assert flaky.requests == 3
+    assert len(sleeps) == 2
+
+
+def test_gives_up_after_max_attempts(sleeps):
+    flaky = FlakyTransport(FakeJQuants(n_codes=10), statuses=[503] * 3)
+    client = _client(flaky.transport(), max_attempts=3)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        client.get_daily_prices(date=TARGET_DATE)
+    assert flaky.requests == 3
+
+
+def test_honors_retry_after(sleeps):
+    flaky = FlakyTransport(FakeJQuants(n_codes=10), statuses=[503], retry_after="0.2")
+    client = _client(flaky.transport(), base_delay=30.0)
+
+    client.get_daily_prices(date=TARGET_DATE)
+
+    # バックオフ（最大30秒）ではなく Retry-After の秒数だけ待つ
+    assert sleeps == [0.2]
+
+
+class RecordingBucket(AdaptiveTokenBucket):
+    """on_throttle に渡された Retry-After を記録する"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.retry_afters = []
+
+    def on_throttle(self, retry_after=None):
+        self.retry_afters.append(retry_after)
+        super().on_throttle(retry_after)
+
+
+def test_retry_after_is_clamped_to_max_delay(sleeps, caplog):
+    flaky = FlakyTransport(FakeJQuants(n_codes=10), statuses=[429], retry_after="3600")
+    limiter = RecordingBucket(max_rate=1000.0)
+    client = _client(flaky.transport(), limiter=limiter, max_delay=0.2)
+
+    with caplog.at_level("WARNING", logger="services.retry"):
+        client.get_daily_prices(date=TARGET_DATE)
+
+    # 1時間待たず、待機もレートリミッタの払い出し停止も上限秒数まで
+    assert sleeps == [0.2]
+    assert limiter.retry_afters == [0.2]
+    assert "3600.0秒" in caplog.text
+
+
+def test_throttled_fake_server_is_retried_with_retry_after(sleeps):
+    fake = FakeJQuants(n_codes=20, page_size=5, requests_per_second=2)
+    limiter = AdaptiveTokenBucket(max_rate=1000.0, increase_interval=3600.0)
+    client = _client(fake.transport(), limiter=limiter)
+
+    df = client.get_daily_prices(date=TARGET_DATE)
+
+    assert len(df) == 20  # 4ページとも取得できる
+    assert fake.throttled >= 1
+    assert sleeps and all(s == 1.0 for s in sleeps)  # 偽サーバの Retry-After: 1
+    assert limiter.throttle_count == fake.throttled
+    assert limiter.rate < limiter.max_rate
+
+
+def test_adaptive_bucket_halves_on_throttle_and_recovers():
+    limiter = AdaptiveTokenBucket(max_rate=10.0, increase_step=0.1, increase_interval=0.0)
+
+    limiter.on_throttle()
+    assert limiter.rate == pytest.approx(5.0)
+    limiter.on_throttle()
+    assert limiter.rate == pytest.approx(2.5)
+
+    for _ in range(8):
+        limiter.on_success()
+    assert limiter.rate == pytest.approx(10.0)  # 上限で止まる
+    assert limiter.throttle_count == 2
+
+
+def test_adaptive_bucket_does_not_drop_below_min_rate():
+    limiter = AdaptiveTokenBucket(max_rate=16.0, min_rate=2.0)
+    for _ in range(10):
+        limiter.on_throttle()
+    assert limiter.rate == pytest.approx(2.0)
+
+
+def test_adaptive_bucket_recovers_only_after_interval():
+    limiter = AdaptiveTokenBucket(max_rate=10.0, increase_interval=3600.0)
+    limiter.on_throttle()
+    limiter.on_success()
+    assert limiter.rate == pytest.approx(5.0)
+
+
+def test_adaptive_bucket_holds_tokens_for_retry_after(monkeypatch):
+    waits = []
+    monkeypatch.setattr(ratelimit.time, "sleep", waits.append)
+    limiter = AdaptiveTokenBucket(max_rate=100.0)
+
+    limiter.on_throttle(retry_after=2.0)
+    limiter.acquire()
+
+    assert waits and waits[0] == pytest.approx(2.0, abs=0.05)
+
+
+class FailingDateTransport:
+    """指定したデータセット・日付のリクエストに500を返す（healed=True で回復）"""
+
+    def __init__(self, fake: FakeJQuants, endpoint: str, target_date: date):
+        self.fake = fake
+        self.endpoint = endpoint
+        self.date = target_date.strftime("%Y%m%d")
+        self.healed = False
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if (
+            not self.healed
+            and request.url.path.endswith(self.endpoint)
+            and request.url.params.get("date") == self.date
+        ):
+            return httpx.Response(500, json={"message": "internal error"})
+        return self.fake.handle(request)
+
+
+def _journal(dataset: str, target_date: date) -> SyncJob:
+    session = get_session()
+    try:
+        return session.execute(
+            select(SyncJob).where(SyncJob.dataset == dataset, SyncJob.date == target_date)
+        ).scalar_one()
+    finally:
+        session.close()
+
+
+def _service(transport) -> SyncService:
+    return SyncService(
+        client=_client(transport),
+        async_client_factory=lambda **kwargs: AsyncJQuantsClient(
+            limiter=AdaptiveTokenBucket(max_rate=1000.0),
+            retry_policy=RetryPolicy(max_attempts=2, base_delay=0.0),
+            base_url=FAKE_BASE_URL,
+            transport=transport,
+            **kwargs,
+        ),
+    )
+
+
+def test_failed_unit_is_journaled_and_retried():
+    days = [date(2024, 4, 1), date(2024, 4, 2), date(2024, 4, 3)]
+    failing = FailingDateTransport(FakeJQuants(n_codes=10), "/fins/summary", days[1])
+    service = _service(httpx.MockTransport(failing.handle))
+
+    failed = service.sync_all_historical_data(days[0], days[-1], max_concurrency=2)
+
+    assert [(u.dataset, u.target_date) for u in failed] == [(DATASET_FIN_SUMMARY, days[1])]
+    job = _journal(DATASET_FIN_SUMMARY, days[1])
+    assert job.status == JOB_FAILED
+    assert job.attempts == 1
+    assert "500" in job.last_error
+    assert _journal(DATASET_DAILY_PRICES, days[1]).status == JOB_DONE
+
+    failing.healed = True
+    assert service.retry_failed() == []
+    job = _journal(DATASET_FIN_SUMMARY, days[1])
+    assert job.status == JOB_DONE
+    assert job.attempts == 2
+
+
+def test_each_run_returns_only_its_own_failures(clean_db):
+    days = [date(2024, 5, 1), date(2024, 5, 2)]
+    failing = FailingDateTransport(FakeJQuants(n_codes=10), "/fins/summary", days[0])
+    service = _service(httpx.MockTransport(failing.handle))
+
+    failed = service.sync_all_historical_data(days[0], days[0], max_concurrency=2)
+    assert [(u.dataset, u.target_date) for u in failed] == [(DATASET_FIN_SUMMARY, days[0])]
+
+    # 次の実行は前の実行の失敗を返さず、ジョブジャーナルにも重ねて記録しない
+    assert service.sync_all_historical_data(days[1], days[1], max_concurrency=2) == []
+    assert service.retry_queue == []
+    assert _journal(DATASET_FIN_SUMMARY, days[0]).attempts == 1
+
+    failing.healed = True
+    assert service.incremental_sync(from_date=days[0], to_date=days[1], max_concurrency=2) == []
+    assert _journal(DATASET_FIN_SUMMARY, days[0]).status == JOB_DONE
@@ -0,0 +1,142 @@
+"""スクリーニング結果のキャッシュのテスト"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from db.database import get_session
+from models.schemas import LatestSnapshot, Stock
+from services.data_version import DATASET_FUNDAMENTALS, DATASET_LATEST_SNAPSHOT, bump_versions
+from services.screen_cache import ScreenCache
+from services.screener import ScreeningEngine, screen_definition
+
+
+def frame(n: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {"code": [f"{1300 + i:04d}0" for i in range(n)], "per": [float(i) for i in range(n)], "name": "銘柄"}
+    )
+
+
+# ─── キー ───
+
+
+def test_key_ignores_order_and_spelling_of_conditions(tmp_path):
+    engine = ScreeningEngine(cache=ScreenCache(tmp_path))
+    a = screen_definition(engine.compile("per < 15 and market == 0111 and market in (0112, 0111)"))
+    b = screen_definition(engine.compile("market in ('0111', '0112') and market = '0111' and per<15.0"))
+
+    assert a == b
+    assert ScreenCache.key(a, {"stocks": 1}) == ScreenCache.key(b, {"stocks": 1})
+
+
+def test_key_changes_with_versions_and_output():
+    engine = ScreeningEngine(use_cache=False)
+    screen = engine.compile("per < 15")
+    key = ScreenCache.key(screen_definition(screen), {"latest_snapshot": 1, "stocks": 1})
+
+    assert key != ScreenCache.key(screen_definition(screen), {"latest_snapshot": 2, "stocks": 1})
+    assert key != ScreenCache.key(screen_definition(screen, limit=10), {"latest_snapshot": 1, "stocks": 1})
+    assert key != ScreenCache.key(screen_definition(screen, order_by="per"), {"latest_snapshot": 1, "stocks": 1})
+    # 並べ替えがなければ昇順・降順の指定はキーに含めない
+    assert key == ScreenCache.key(screen_definition(screen, ascending=False), {"latest_snapshot": 1, "stocks": 1})
+
+
+# ─── 版数による無効化 ───
+
+
+@pytest.fixture
+def stocks(clean_db):
+    session = get_session()
+    try:
+        for i in range(20):
+            code = f"{1300 + i * 2:04d}0"
+            session.add(Stock(code=code, company_name=f"銘柄{code}", market_code="0111", is_active=True))
+            session.add(LatestSnapshot(code=code, per=float(i)))
+        session.commit()
+    finally:
+        session.close()
+
+
+def test_result_is_recomputed_after_version_bump(stocks, tmp_path):
+    engine = ScreeningEngine(cache=ScreenCache(tmp_path))
+
+    first = engine.run("per < 10")
+    assert not first.cached
+    assert engine.run("per < 10").cached
+
+    # 条件が参照しないデータセットの書き込みでは無効にならない
+    bump_versions([DATASET_FUNDAMENTALS])
+    assert engine.run("per < 10").cached
+
+    session = get_session()
+    try:
+        session.add(Stock(code="99990", company_name="新規", market_code="0111", is_active=True))
+        session.add(LatestSnapshot(code="99990", per=1.0))
+        session.commit()
+    finally:
+        session.close()
+    bump_versions([DATASET_LATEST_SNAPSHOT])
+
+    again = engine.run("per < 10")
+    assert not again.cached
+    assert again.codes == sorted([*first.codes, "99990"])
+
+
+# ─── 上限（LRU） ───
+
+
+def test_memory_is_bounded_by_entries_in_lru_order(tmp_path):
+    cache = ScreenCache(tmp_path, max_entries=2)
+    for key in ("a", "b"):
+        cache.put(key, frame(3), {"key": key})
+    cache.get("a")  # a を最近使った側へ
+    cache.put("c", frame(3), {"key": "c"})
+
+    stats = cache.stats()
+    assert stats["memory_entries"] == 2
+    assert stats["memory_evictions"] == 1
+    # 最近使った a は残り、b はメモリから追い出されてディスクから読み直す
+    cache.get("a")
+    assert cache.stats()["memory_hits"] == 2
+    cache.get("b")
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_memory_is_bounded_by_size(tmp_path):
+    size = int(frame(100).memory_usage(deep=True).sum())
+    cache = ScreenCache(tmp_path, max_memory_bytes=int(size * 2.5))
+    for key in ("a", "b", "c"):
+        cache.put(key, frame(100), {})
+
+    assert cache.stats()["memory_entries"] == 2
+    assert cache.stats()["memory_bytes"] <= int(size * 2.5)
+
+
+def test_disk_is_bounded_in_lru_order(tmp_path):
+    probe = ScreenCache(tmp_path / "probe")
+    probe.put("probe", frame(50), {})
+    size = probe.stats()["disk_bytes"]
+
+    cache = ScreenCache(tmp_path / "screens", max_entries=0, max_disk_bytes=int(size * 3.5))
+    for i, key in enumerate(("a", "b", "c")):
+        cache.put(key, frame(50), {})
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    os.utime(cache._path("a"), (2000, 2000))  # a を最近使った側へ
+    cache.put("d", frame(50), {})
+
+    assert cache.stats()["disk_evictions"] >= 1
+    assert cache.stats()["disk_bytes"] <= int(size * 3.5)
+    assert not cache._path("b").exists()  # 最終アクセスの最も古いエントリから削除
+    assert cache._path("a").exists() and cache._path("d").exists()
+
+
+def test_disk_entries_survive_a_new_instance(tmp_path):
+    meta = {"stats": [{"predicate": "per < 15.0", "rows_in": 10}], "versions": {"stocks": 3}}
+    ScreenCache(tmp_path).put("k", frame(5), meta)
+
+    cached = ScreenCache(tmp_path).get("k")
+
+    assert cached is not None
+    pd.testing.assert_frame_equal(cached[0], frame(5))
+    assert cached[1] == meta
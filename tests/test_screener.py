@@ -0,0 +1,195 @@
+"""スクリーニングエンジンのテスト
+
+SQLに任せた条件・NumPyのマスクで評価した条件のどちらも、同じデータに対する
+メモリ上の条件の評価と同じ銘柄を返さなければならない。
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from db.database import get_session
+from models.schemas import LatestSnapshot, Stock
+from services.screener import (
+    DEFAULT_SELECTIVITY,
+    Predicate,
+    ScreeningEngine,
+    SelectivityEstimator,
+    parse_conditions,
+)
+
+N_CODES = 200
+
+
+def universe() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "code": [f"{1300 + i * 2:04d}0" for i in range(N_CODES)],
+            "market": [("0111", "0112", "0113")[i % 3] for i in range(N_CODES)],
+            "per": rng.uniform(3, 40, N_CODES),
+            "pbr": rng.uniform(0.3, 5, N_CODES),
+            "market_cap": rng.lognormal(24, 1.5, N_CODES),
+            "roe": rng.uniform(-0.1, 0.3, N_CODES),
+            "is_active": np.arange(N_CODES) % 10 != 0,
+        }
+    )
+    df.loc[::7, "per"] = np.nan  # 赤字などで欠損
+    return df
+
+
+@pytest.fixture
+def stocks(clean_db):
+    df = universe()
+    session = get_session()
+    try:
+        for row in df.itertuples():
+            session.add(
+                Stock(code=row.code, company_name=f"銘柄{row.code}", market_code=row.market, is_active=row.is_active)
+            )
+            session.add(
+                LatestSnapshot(
+                    code=row.code,
+                    per=None if np.isnan(row.per) else row.per,
+                    pbr=row.pbr,
+                    market_cap=row.market_cap,
+                )
+            )
+        session.commit()
+    finally:
+        session.close()
+    return df
+
+
+class FakeFundamentalsEngine(ScreeningEngine):
+    """ファンダメンタル指標のパネルの代わりに固定の値を使う"""
+
+    def __init__(self, fundamentals: pd.DataFrame, **kwargs):
+        super().__init__(use_cache=False, **kwargs)
+        self.fundamentals = fundamentals
+
+    def load_fundamentals(self) -> pd.DataFrame:
+        return self.fundamentals
+
+
+def engine_for(df: pd.DataFrame, **kwargs) -> FakeFundamentalsEngine:
+    return FakeFundamentalsEngine(df.set_index("code")[["roe"]], estimator=SelectivityEstimator(), **kwargs)
+
+
+# ─── 条件の解析 ───
+
+
+def test_parse_conditions():
+    predicates = parse_conditions(
+        "market IN ('0111', 0112) and per < 15 AND pbr between (0.5, 1) and market_name = 'プライム'"
+    )
+    assert predicates == [
+        Predicate("market", "in", ("0111", "0112")),
+        Predicate("per", "<", 15.0),
+        Predicate("pbr", "between", (0.5, 1.0)),
+        Predicate("market_name", "==", "プライム"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        ("per ~ 15", "条件を解釈できません"),
+        ("unknown < 1", "未対応の項目"),
+        ("PER < 15", "未対応の項目"),  # 項目名は大文字小文字を区別する
+        ("per < abc", "数値ではありません"),
+        ("market in ()", "値が空です"),
+    ],
+)
+def test_parse_conditions_rejects_invalid(text, message):
+    with pytest.raises(ValueError, match=message):
+        parse_conditions(text)
+
+
+# ─── SQLへの押し下げ ───
+
+
+@pytest.mark.parametrize(
+    "conditions, mask",
+    [
+        ("per < 15", lambda df: df["per"] < 15),
+        ("market in (0111, 0113) and pbr <= 1.5",
+         lambda df: df["market"].isin(["0111", "0113"]) & (df["pbr"] <= 1.5)),
+        ("per between (8, 20) and market != 0112",
+         lambda df: df["per"].between(8, 20) & (df["market"] != "0112")),
+        ("roe > 0.1 and per < 25", lambda df: (df["roe"] > 0.1) & (df["per"] < 25)),
+        ("roe between (0, 0.2) and market == 0111",
+         lambda df: df["roe"].between(0, 0.2) & (df["market"] == "0111")),
+    ],
+)
+def test_pushdown_matches_in_memory_mask(stocks, conditions, mask):
+    result = engine_for(stocks).run(conditions)
+
+    active = stocks[stocks["is_active"]]
+    expected = sorted(active.loc[mask(active), "code"])
+    assert sorted(result.codes) == expected
+
+
+def test_sql_stats_counts_match_in_memory_masks(stocks):
+    result = engine_for(stocks, sql_stats=True).run("market == 0111 and per < 15")
+
+    active = stocks[stocks["is_active"]]
+    stats = {s.predicate: s for s in result.stats}
+    market = active["market"] == "0111"
+    per = active["per"] < 15
+    # 推定の通過率の小さい順（== が先）に加えたときの累積件数
+    assert [s.predicate for s in result.stats] == ["market == 0111", "per < 15.0"]
+    assert (stats["market == 0111"].rows_in, stats["market == 0111"].rows_out) == (len(active), market.sum())
+    assert (stats["per < 15.0"].rows_in, stats["per < 15.0"].rows_out) == (market.sum(), (market & per).sum())
+
+
+def test_default_stats_report_the_sql_stage(stocks):
+    engine = engine_for(stocks)
+    result = engine.run("market == 0111 and per < 15 and roe > 0.1")
+
+    active = stocks[stocks["is_active"]]
+    sql, numpy_ = result.stats
+    assert sql.stage == "sql"
+    assert sql.predicate == "market == 0111 and per < 15.0"
+    assert sql.rows_in == len(active)
+    assert sql.rows_out == ((active["market"] == "0111") & (active["per"] < 15)).sum()
+    assert sql.seconds is not None
+    assert sql.estimated_selectivity == pytest.approx(DEFAULT_SELECTIVITY["=="] * DEFAULT_SELECTIVITY["<"])
+    assert numpy_.stage == "numpy" and numpy_.rows_in == sql.rows_out
+
+
+def test_single_sql_predicate_is_learned_by_default(stocks):
+    engine = engine_for(stocks)
+    predicate = Predicate("per", "<", 15.0)
+    assert engine.estimator.estimate(predicate) == DEFAULT_SELECTIVITY["<"]
+
+    result = engine.run("per < 15")
+
+    active = stocks[stocks["is_active"]]
+    assert result.stats[0].rows_out == len(result.codes)
+    assert engine.estimator.estimate(predicate) == pytest.approx((active["per"] < 15).mean())
+
+
+# ─── 評価順 ───
+
+
+def test_stored_predicates_are_pushed_down_and_derived_are_ranked(stocks):
+    engine = engine_for(stocks)
+    screen = engine.compile("roe > 0.1 and per_actual < 20 and return_20 > 0 and market == 0111 and pbr < 1")
+
+    assert [p.field for p in screen.sql] == ["market", "pbr"]  # 推定の通過率の小さい順
+    # 同じ通過率なら安い順（ファンダメンタル指標 → 株価の履歴）
+    assert [p.field for p in screen.derived][-1] == "return_20"
+
+
+def test_observed_selectivity_reorders_derived_predicates(stocks):
+    estimator = SelectivityEstimator(smoothing=1.0)
+    roe = Predicate("roe", ">", 0.1)
+    per_actual = Predicate("per_actual", "<", 20.0)
+    estimator.observe(roe, 100, 90)          # ほとんど絞れない
+    estimator.observe(per_actual, 100, 10)   # よく絞れる
+    engine = FakeFundamentalsEngine(stocks.set_index("code")[["roe"]], estimator=estimator)
+
+    screen = engine.compile("roe > 0.1 and per_actual < 20")
+
+    assert screen.derived == [per_actual, roe]
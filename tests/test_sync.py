@@ -0,0 +1,160 @@
+"""同期（SyncService）の書き込みのテスト
+
+同じ期間を何度同期し直しても、行は重複せず最後に取得した値になる。
+"""
+
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import func, select
+
+from benchmarks.synthetic import financial_summary_records, listed_stock_records, universe
+from db.database import get_session
+from models.schemas import FinancialSummary, Stock
+from services.decoding import decode_records
+from services.sync import SyncService
+
+DISCLOSED = date(2024, 5, 8)
+
+
+def fin_summary(**overrides) -> pd.DataFrame:
+    records = financial_summary_records(universe(4000), DISCLOSED)[:5]
+    for r in records:
+        r.update(overrides)
+    return decode_records(records, "fins_summary")
+
+
+def stored_summaries() -> pd.DataFrame:
+    session = get_session()
+    try:
+        return pd.read_sql(
+            select(FinancialSummary).order_by(FinancialSummary.code, FinancialSummary.type_of_document),
+            session.connection(),
+        )
+    finally:
+        session.close()
+
+
+def test_financial_summary_resync_is_idempotent(clean_db):
+    service = SyncService(client=object())
+    service._save_financial_summary(fin_summary())
+    first = stored_summaries()
+
+    service._save_financial_summary(fin_summary())
+
+    again = stored_summaries()
+    assert len(again) == len(first) == 5
+    pd.testing.assert_frame_equal(
+        again.drop(columns=["updated_at"]), first.drop(columns=["updated_at"])
+    )
+    assert again["shares_outstanding"].notna().all()
+    assert again["treasury_shares"].notna().all()
+
+
+def test_financial_summary_resync_updates_in_place(clean_db):
+    service = SyncService(client=object())
+    service._save_financial_summary(fin_summary())
+    first = stored_summaries()
+
+    # 訂正された株式数・利益を取り直す
+    service._save_financial_summary(fin_summary(ShOutFY="123000000", TrShFY="1000000", NP="42"))
+
+    again = stored_summaries()
+    assert again["id"].tolist() == first["id"].tolist()
+    assert (again["shares_outstanding"] == 123_000_000).all()
+    assert (again["treasury_shares"] == 1_000_000).all()
+    assert (again["profit"] == 42).all()
+
+
+def test_financial_summary_without_time_and_type_is_not_duplicated(clean_db):
+    service = SyncService(client=object())
+    for _ in range(3):
+        service._save_financial_summary(fin_summary(DiscTime=None, DocType=None))
+
+    session = get_session()
+    try:
+        n = session.execute(select(func.count()).select_from(FinancialSummary)).scalar()
+    finally:
+        session.close()
+    assert n == 5
+
+
+# ─── 銘柄マスタの差分同期 ───
+
+
+class MasterClient:
+    """銘柄マスタだけを返すクライアント"""
+
+    def __init__(self, records):
+        self.records = records
+
+    def get_listed_stocks(self) -> pd.DataFrame:
+        return decode_records(self.records, "equities_master")
+
+
+def master(n: int = 5) -> list:
+    return listed_stock_records(universe(n), DISCLOSED)
+
+
+def stored_stocks() -> dict:
+    session = get_session()
+    try:
+        return {
+            code: (content_hash, is_active, updated_at)
+            for code, content_hash, is_active, updated_at in session.execute(
+                select(Stock.code, Stock.content_hash, Stock.is_active, Stock.updated_at)
+            )
+        }
+    finally:
+        session.close()
+
+
+def test_sync_stocks_skips_unchanged_rows(clean_db):
+    records = master()
+    first = SyncService(client=MasterClient(records)).sync_stocks()
+    assert sorted(first.inserted) == sorted(r["Code"] for r in records)
+    before = stored_stocks()
+
+    report = SyncService(client=MasterClient(master())).sync_stocks()
+
+    assert report.changed_codes == []
+    assert report.unchanged == len(records)
+    assert stored_stocks() == before
+
+
+def test_sync_stocks_updates_only_changed_rows(clean_db):
+    records = master()
+    SyncService(client=MasterClient(records)).sync_stocks()
+    before = stored_stocks()
+
+    renamed = master()
+    code = renamed[2]["Code"]
+    renamed[2]["CoName"] = "社名変更"
+    report = SyncService(client=MasterClient(renamed)).sync_stocks()
+
+    assert (report.inserted, report.updated, report.delisted) == ([], [code], [])
+    assert report.unchanged == len(records) - 1
+    after = stored_stocks()
+    assert after[code][0] != before[code][0]
+    assert after[code][2] > before[code][2]
+    assert {c: v for c, v in after.items() if c != code} == {c: v for c, v in before.items() if c != code}
+
+
+def test_sync_stocks_marks_delisted_and_reactivates_relisted(clean_db):
+    records = master()
+    SyncService(client=MasterClient(records)).sync_stocks()
+    before = stored_stocks()
+    code = records[0]["Code"]
+
+    report = SyncService(client=MasterClient(records[1:])).sync_stocks()
+
+    assert (report.inserted, report.updated, report.delisted) == ([], [], [code])
+    after = stored_stocks()
+    assert after[code][:2] == (before[code][0], False)
+    assert all(after[c][1] for c in after if c != code)
+
+    # 再上場すると内容が同じでも有効に戻す
+    report = SyncService(client=MasterClient(master())).sync_stocks()
+
+    assert (report.inserted, report.updated, report.delisted) == ([], [code], [])
+    assert stored_stocks()[code][:2] == (before[code][0], True)